@@ -0,0 +1,166 @@
+"""
+Admission control for the conversion endpoints: a bounded number of requests
+in flight, a bounded wait for a slot, and request bodies cut off as soon as
+they pass the upload limit
+"""
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+from fastapi import HTTPException
+
+
+class OverloadedError(Exception):
+    """Raised when every slot is taken and too many requests are already waiting"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is busy, retry later")
+        self.retry_after = retry_after
+
+
+class BodyTooLargeError(HTTPException):
+    """Raised while a request body is being received, as soon as it passes the limit.
+
+    An ``HTTPException`` so that FastAPI's form parsing lets it through
+    instead of reporting a generic 400.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Request body larger than {max_bytes} bytes")
+
+
+class AdmissionController:
+    """At most ``max_active`` requests hold a slot; up to ``max_waiting`` more wait for one.
+
+    Anything beyond that is rejected with a ``Retry-After`` estimated from
+    how long recent jobs took (see ``observe``) and how many requests are
+    ahead, divided by ``parallelism`` (jobs the model runs at once).
+    """
+
+    def __init__(self, max_active: int, max_waiting: int, parallelism: int = 1, metrics: Optional[Any] = None):
+        self.max_active = max(1, max_active)
+        self.max_waiting = max(0, max_waiting)
+        self.parallelism = max(1, parallelism)
+        self.metrics = metrics
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(self.max_active)
+        # Exponential moving average of seconds per job, None until the first one finishes
+        self._job_seconds: Optional[float] = None
+
+    def observe(self, seconds: float):
+        """Record how long a job took to run, for ``Retry-After`` estimates"""
+        if self._job_seconds is None:
+            self._job_seconds = seconds
+        else:
+            self._job_seconds += 0.2 * (seconds - self._job_seconds)
+
+    def retry_after(self, ahead: Optional[int] = None) -> int:
+        """Seconds until a slot is likely free, with ``ahead`` requests in front (default: all current ones)"""
+        if ahead is None:
+            ahead = self.active + self.waiting
+        seconds = (self._job_seconds or 1.0) * (ahead + 1) / self.parallelism
+        return max(1, min(600, math.ceil(seconds)))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            if self.metrics is not None:
+                self.metrics.inc("requests_rejected_total")
+            raise OverloadedError(self.retry_after())
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+
+async def _send_json(send: Callable, status: int, body: Any, headers: Iterable = ()):
+    data = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+class AdmissionMiddleware:
+    """Holds an admission slot for the whole of a ``POST`` to one of ``paths``.
+
+    The slot is taken before the body is read, so a rejected request never
+    uploads its image.
+    """
+
+    def __init__(self, app: Callable, controller: AdmissionController, paths: Iterable[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+        try:
+            async with self.controller.slot():
+                await self.app(scope, receive, send)
+        except OverloadedError as e:
+            await _send_json(send, 429, {"detail": str(e)}, [(b"retry-after", str(e.retry_after).encode())])
+
+
+class BodySizeLimitMiddleware:
+    """Rejects request bodies over ``max_bytes`` with 413 while they stream in.
+
+    A declared ``Content-Length`` over the limit is rejected before anything
+    is read; otherwise the bytes received are counted chunk by chunk.
+    Paths starting with one of ``exempt`` (e.g. bulk archive uploads) are
+    not limited.
+    """
+
+    def __init__(self, app: Callable, max_bytes: int, exempt: Iterable[str] = ()):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.exempt = tuple(exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_bytes <= 0 or scope["path"].startswith(self.exempt):
+            return await self.app(scope, receive, send)
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                error = BodyTooLargeError(self.max_bytes)
+                return await _send_json(send, error.status_code, {"detail": error.detail})
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise BodyTooLargeError(self.max_bytes)
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except BodyTooLargeError as e:
+            # Usually turned into a response by FastAPI already; this covers reads outside a route
+            if started:
+                raise
+            await _send_json(send, e.status_code, {"detail": e.detail})
@@ -0,0 +1,259 @@
+"""
+Persistent store of exported meshes: content-addressed files plus a SQLite
+index of job id, parameters, sizes and timestamps
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_last_used ON blobs (last_used);
+CREATE TABLE IF NOT EXISTS artifacts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL UNIQUE,
+    digest TEXT NOT NULL REFERENCES blobs (digest),
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_digest ON artifacts (digest);
+CREATE INDEX IF NOT EXISTS artifacts_format ON artifacts (format, id);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Seeds the counters from the tables, for an index written before they existed
+SEED_COUNTERS = """
+INSERT INTO counters (name, value) SELECT 'artifacts', COUNT(*) FROM artifacts;
+INSERT INTO counters (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM blobs;
+INSERT INTO counters (name, value) VALUES ('evictions', 0);
+INSERT INTO counters (name, value) SELECT 'format:' || format, COUNT(*) FROM artifacts GROUP BY format;
+"""
+
+# Serving a blob refreshes its last use at most this often, so reads rarely write
+TOUCH_INTERVAL = 60.0
+
+
+class ArtifactStore:
+    """Exported meshes on disk, indexed by job id in SQLite.
+
+    Files are named by the SHA-256 of their contents, so identical exports
+    (e.g. repeated cache hits) share one file. Once the files pass
+    ``max_bytes``, the least recently served ones are removed along with
+    every artifact that points at them. Listing pages through the index by
+    id, newest first, so a page costs the same however large the catalog is.
+
+    Several processes (e.g. HTTP workers) may share one directory: totals
+    live in a ``counters`` table updated in the same transaction as the
+    rows they count, so GC and stats see every process's writes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 10 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        # Autocommit, so _transaction can take the write lock up front with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.db"), timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._transaction():
+            seeded = self._db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counters'"
+            ).fetchone()
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    self._db.execute(statement)
+            if seeded is None:
+                for statement in SEED_COUNTERS.split(";"):
+                    if statement.strip():
+                        self._db.execute(statement)
+            self._collect()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold this process's lock and the database write lock, committing on success"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _counter(self, name: str) -> int:
+        row = self._db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row["value"] if row is not None else 0
+
+    def _add(self, name: str, delta: int):
+        if delta:
+            self._db.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+                (name, delta),
+            )
+
+    def _blob_path(self, digest: str, format: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.{format}")
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["job_id"],
+            "digest": row["digest"],
+            "format": row["format"],
+            "size": row["size"],
+            "params": json.loads(row["params"]),
+            "created_at": row["created_at"],
+        }
+
+    def put(self, job_id: str, data: bytes, format: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Store ``data`` as the artifact of ``job_id``; a job that already has one keeps it.
+
+        Returns ``None`` if the file alone is over ``max_bytes`` and was collected right away.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest, format)
+        now = time.time()
+        # In the transaction, so no process's GC can remove the file between writing and indexing it
+        with self._transaction():
+            row = self._db.execute("SELECT * FROM artifacts WHERE job_id = ?", (job_id,)).fetchone()
+            if row is not None:
+                return self._record(row)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            if self._db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone() is None:
+                self._db.execute(
+                    "INSERT INTO blobs (digest, format, size, last_used) VALUES (?, ?, ?, ?)",
+                    (digest, format, len(data), now),
+                )
+                self._add("bytes", len(data))
+            else:
+                self._db.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (now, digest))
+            self._db.execute(
+                "INSERT INTO artifacts (job_id, digest, format, size, params, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, digest, format, len(data), json.dumps(params, sort_keys=True), now),
+            )
+            self._add("artifacts", 1)
+            self._add(f"format:{format}", 1)
+            self._collect()
+            row = self._db.execute("SELECT * FROM artifacts WHERE job_id = ?", (job_id,)).fetchone()
+        return self._record(row) if row is not None else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM artifacts WHERE job_id = ?", (job_id,)).fetchone()
+        return self._record(row) if row is not None else None
+
+    def open(self, job_id: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """The artifact of ``job_id`` and the path of its file, counting as a use for GC"""
+        record = self.get(job_id)
+        if record is None:
+            return None
+        path = self._blob_path(record["digest"], record["format"])
+        if not os.path.exists(path):
+            return None
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE blobs SET last_used = ? WHERE digest = ? AND last_used < ?",
+                (now, record["digest"], now - TOUCH_INTERVAL),
+            )
+        return record, path
+
+    def list(
+        self, limit: int = 50, cursor: Optional[int] = None, format: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """One page of artifacts, newest first, and the cursor of the next page (None on the last)"""
+        query = "SELECT * FROM artifacts WHERE id < ?"
+        args: List[Any] = [cursor if cursor is not None else 2 ** 63 - 1]
+        if format is not None:
+            query += " AND format = ?"
+            args.append(format)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit + 1)
+        with self._lock:
+            rows = self._db.execute(query, args).fetchall()
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return [self._record(row) for row in rows[:limit]], next_cursor
+
+    def count(self, format: Optional[str] = None) -> int:
+        """Number of artifacts, optionally only those in ``format``"""
+        with self._lock:
+            return self._counter("artifacts" if format is None else f"format:{format}")
+
+    def delete(self, job_id: str) -> bool:
+        """Remove one artifact, and its file once no other artifact uses it"""
+        with self._transaction():
+            row = self._db.execute("SELECT digest, format FROM artifacts WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return False
+            self._db.execute("DELETE FROM artifacts WHERE job_id = ?", (job_id,))
+            self._add("artifacts", -1)
+            self._add(f"format:{row['format']}", -1)
+            if self._db.execute("SELECT 1 FROM artifacts WHERE digest = ? LIMIT 1", (row["digest"],)).fetchone() is None:
+                self._remove_blob(row["digest"], row["format"])
+        return True
+
+    def _remove_blob(self, digest: str, format: str):
+        size = self._db.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()["size"]
+        self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        self._add("bytes", -size)
+        try:
+            os.remove(self._blob_path(digest, format))
+        except FileNotFoundError:
+            pass
+
+    def _collect(self):
+        """Drop least recently used files (and their artifacts) until under ``max_bytes``"""
+        while self._counter("bytes") > self.max_bytes:
+            row = self._db.execute("SELECT digest, format FROM blobs ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            for format, removed in self._db.execute(
+                "SELECT format, COUNT(*) FROM artifacts WHERE digest = ? GROUP BY format", (row["digest"],)
+            ).fetchall():
+                self._add("artifacts", -removed)
+                self._add(f"format:{format}", -removed)
+            self._db.execute("DELETE FROM artifacts WHERE digest = ?", (row["digest"],))
+            self._remove_blob(row["digest"], row["format"])
+            self._add("evictions", 1)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(
+                self._db.execute(
+                    "SELECT name, value FROM counters WHERE name IN ('artifacts', 'bytes', 'evictions')"
+                ).fetchall()
+            )
+        return {
+            "artifacts": counters.get("artifacts", 0),
+            "bytes": counters.get("bytes", 0),
+            "max_bytes": self.max_bytes,
+            "evictions": counters.get("evictions", 0),
+        }
@@ -0,0 +1,100 @@
+"""
+Dynamic micro-batching of queued requests that can share one pipeline call
+"""
+import queue
+import time
+from collections import deque
+from typing import Any, Callable, Hashable, List, Optional
+
+# Batch key of an item whose key function raised
+_INVALID = object()
+
+
+class BatchCollector:
+    """Pulls items off a queue and groups those with the same batch key.
+
+    The first item blocks until available; after that the collector waits at
+    most ``max_wait`` seconds for up to ``max_batch_size - 1`` compatible items.
+    Items with a different key are held back, in order, for the next batch;
+    once ``max_batch_size`` items are held back, collection stops early.
+    A ``None`` item is treated as a stop sentinel. An item whose key can't be
+    computed is dropped and handed to ``on_error`` with the exception.
+    """
+
+    def __init__(
+        self,
+        source: "queue.Queue[Any]",
+        key: Callable[[Any], Hashable],
+        max_batch_size: int = 4,
+        max_wait: float = 0.05,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+    ):
+        self.source = source
+        self.key = key
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.on_error = on_error
+        self._pending: "deque[Any]" = deque()
+
+    def __len__(self) -> int:
+        return self.source.qsize() + sum(1 for item in self._pending if item is not None)
+
+    def _key(self, item: Any) -> Hashable:
+        """The item's batch key, or ``_INVALID`` (after reporting it) if computing it fails"""
+        try:
+            return self.key(item)
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(item, e)
+            return _INVALID
+
+    def _take_pending(self, batch_key: Hashable, batch: List[Any]):
+        kept: "deque[Any]" = deque()
+        while self._pending:
+            item = self._pending.popleft()
+            if item is None or len(batch) >= self.max_batch_size:
+                kept.append(item)
+                continue
+            item_key = self._key(item)
+            if item_key == batch_key:
+                batch.append(item)
+            elif item_key is not _INVALID:
+                kept.append(item)
+        self._pending = kept
+
+    def next_batch(self) -> Optional[List[Any]]:
+        """Return the next batch, or ``None`` once the stop sentinel is reached"""
+        while True:
+            first = self._pending.popleft() if self._pending else self.source.get()
+            if first is None:
+                return None
+            batch_key = self._key(first)
+            if batch_key is not _INVALID:
+                break
+
+        batch = [first]
+        self._take_pending(batch_key, batch)
+
+        deadline = time.monotonic() + self.max_wait
+        # Held-back items have left the bounded source queue; capping them keeps the source's
+        # maxsize (and its backpressure) a real limit on the backlog
+        while len(batch) < self.max_batch_size and len(self._pending) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.source.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._pending.append(None)
+                break
+            item_key = self._key(item)
+            if item_key is _INVALID:
+                continue
+            if item_key == batch_key:
+                batch.append(item)
+            else:
+                self._pending.append(item)
+
+        return batch
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark micro-batching throughput against a stub TripoSG pipeline on CPU
+"""
+import argparse
+import time
+from concurrent.futures import wait
+
+import torch
+from PIL import Image
+
+from job_queue import JobQueue
+from triposg_stub import StubTripoSGPipeline
+
+
+def run(pipe: StubTripoSGPipeline, batch_size: int, requests: int, steps: int, wait_ms: float) -> dict:
+    """Submit ``requests`` jobs at once and time until they all finish"""
+    image = Image.new("RGB", (512, 512), "white")
+    batches = []
+
+    def handler(jobs):
+        batches.append(len(jobs))
+        samples = pipe(
+            image=[image] * len(jobs),
+            generator=[torch.Generator().manual_seed(job.params["seed"]) for job in jobs],
+            num_inference_steps=steps,
+            guidance_scale=7.0,
+        ).samples
+        return samples
+
+    queue = JobQueue(
+        handler=handler,
+        maxsize=requests,
+        max_batch_size=batch_size,
+        max_wait=wait_ms / 1000,
+        batch_key=lambda job: (job.params["num_inference_steps"], job.params["guidance_scale"]),
+    )
+    queue.start()
+    t0 = time.time()
+    jobs = [
+        queue.submit({"seed": i, "num_inference_steps": steps, "guidance_scale": 7.0}, image)
+        for i in range(requests)
+    ]
+    wait([job.future for job in jobs])
+    elapsed = time.time() - t0
+    queue.stop()
+
+    latencies = sorted(job.finished_at - job.created_at for job in jobs)
+    return {
+        "batch_size": batch_size,
+        "elapsed": elapsed,
+        "throughput": requests / elapsed,
+        "mean_batch": sum(batches) / len(batches),
+        "p50_latency": latencies[len(latencies) // 2],
+        "max_latency": latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--wait-ms", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=1024)
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--step-overhead-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    pipe = StubTripoSGPipeline(tokens=args.tokens, width=args.width, step_overhead=args.step_overhead_ms / 1000)
+
+    print("🚀 Micro-batching Benchmark (stub pipeline)")
+    print("=" * 72)
+    print(f"{'batch':>5} {'elapsed':>9} {'req/s':>8} {'speedup':>8} {'avg batch':>10} {'p50 lat':>9} {'max lat':>9}")
+
+    baseline = None
+    for batch_size in range(1, args.max_batch + 1):
+        result = run(pipe, batch_size, args.requests, args.steps, args.wait_ms)
+        baseline = baseline or result["throughput"]
+        print(
+            f"{batch_size:>5} {result['elapsed']:>8.2f}s {result['throughput']:>8.2f} "
+            f"{result['throughput'] / baseline:>7.2f}x {result['mean_batch']:>10.1f} "
+            f"{result['p50_latency']:>8.2f}s {result['max_latency']:>8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Compare CPU profiles for speed and mesh accuracy.
+
+Every profile runs the same images and seeds. Its meshes are compared to the
+fp32 baseline's with the Chamfer distance, relative to the object's size.
+Use this to pick the fastest profile whose error you can accept.
+
+    python benchmark_cpu_profiles.py --stub --profiles fp32 bf16 int8
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import trimesh
+
+from benchmark_suite import find_images, percentile
+from cpu_profile import COMPILE_MODES, PROFILES, CPUProfile
+from image_preprocess import decode_image, synthetic_image
+from mesh_quality import chamfer_distance
+
+
+def run_profile(name: str, compile_mode: str, args: argparse.Namespace, images: Dict[str, Any]) -> Dict[str, Any]:
+    import inference
+
+    profile = CPUProfile(threads=args.threads, compile=compile_mode, **PROFILES[name])
+    pipe, rmbg = inference.load_models(stub=args.stub, profile=profile)
+
+    def generate(image, seed):
+        (vertices, faces), = inference.generate_samples(pipe, [image], rmbg, [seed], args.steps, args.guidance_scale)
+        return trimesh.Trimesh(vertices, faces)
+
+    # Warmup also triggers compilation, so it isn't counted
+    generate(next(iter(images.values())), 0)
+
+    times: List[float] = []
+    meshes = {}
+    for image_name, image in images.items():
+        for i in range(args.repeats):
+            t0 = time.perf_counter()
+            meshes[image_name] = generate(image, args.seed)
+            times.append(time.perf_counter() - t0)
+    return {"times": times, "meshes": meshes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--compile", nargs="+", choices=COMPILE_MODES, default=["none"])
+    parser.add_argument("--stub", action="store_true", help="Use the CPU stub models (no weights needed)")
+    parser.add_argument("--images", nargs="*", default=[])
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--guidance-scale", type=float, default=7.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--samples", type=int, default=50000, help="Surface samples for the Chamfer distance")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    paths = find_images(args.images)
+    images = {path.name: decode_image(path.read_bytes()) for path in paths}
+    if not images:
+        images = {"synthetic.png": synthetic_image()}
+
+    # The fp32 eager run is the accuracy reference
+    runs = [("fp32", "none")] + [
+        (name, mode) for name in args.profiles for mode in args.compile if (name, mode) != ("fp32", "none")
+    ]
+    results = {}
+    for name, mode in runs:
+        label = name if mode == "none" else f"{name}+{mode}"
+        print(f"\n🔄 {label}")
+        results[label] = run_profile(name, mode, args, images)
+
+    reference = results["fp32"]
+    baseline_p50 = percentile(reference["times"], 0.5)
+    report = {}
+    for label, result in results.items():
+        errors = [
+            chamfer_distance(mesh, reference["meshes"][image_name], samples=args.samples)
+            for image_name, mesh in result["meshes"].items()
+        ]
+        p50 = percentile(result["times"], 0.5)
+        report[label] = {
+            "p50": p50,
+            "speedup": baseline_p50 / p50,
+            "chamfer_mean": sum(e["chamfer"] for e in errors) / len(errors),
+            "chamfer_max": max(e["chamfer"] for e in errors),
+            "hausdorff_max": max(e["hausdorff"] for e in errors),
+        }
+
+    print("\n" + "=" * 72)
+    print(f"{'profile':<16} {'p50':>9} {'speedup':>8} {'chamfer mean':>13} {'chamfer max':>12} {'hausdorff':>10}")
+    for label, row in report.items():
+        print(
+            f"{label:<16} {row['p50']:>8.2f}s {row['speedup']:>7.2f}x {row['chamfer_mean']:>13.2e} "
+            f"{row['chamfer_max']:>12.2e} {row['hausdorff_max']:>10.2e}"
+        )
+    print("Distances are relative to the bounding box diagonal of the fp32 mesh.")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"📁 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark LOD chain generation: time and file size per level
+"""
+import argparse
+import time
+
+import numpy as np
+import trimesh
+
+from mesh_export import export_glb, export_mesh
+from mesh_simplify import parse_lods, simplify_mesh
+
+
+def load_mesh(path: str, subdivisions: int) -> trimesh.Trimesh:
+    if path:
+        return trimesh.load(path, force="mesh")
+    # A bumpy sphere stands in for a generated mesh when no file is given
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    rng = np.random.default_rng(0)
+    mesh.vertices *= 1 + 0.02 * rng.standard_normal((len(mesh.vertices), 1))
+    return mesh
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mesh", default="", help="Mesh file to decimate (default: synthetic sphere)")
+    parser.add_argument("--subdivisions", type=int, default=8)
+    parser.add_argument("--lods", default="200000,50000,10000")
+    args = parser.parse_args()
+
+    targets = sorted(parse_lods(args.lods), reverse=True)
+    mesh = load_mesh(args.mesh, args.subdivisions)
+
+    print("🚀 LOD Benchmark")
+    print("=" * 78)
+    print(f"📐 Source: {len(mesh.vertices):,} vertices, {len(mesh.faces):,} faces")
+
+    # Chained: each level decimated from the previous one
+    chained = []
+    current = mesh
+    for target in targets:
+        t0 = time.time()
+        if current.faces.shape[0] > target:
+            current = simplify_mesh(current, target)
+        chained.append((target, current, time.time() - t0))
+
+    # Independent: each level decimated from the full mesh
+    independent = []
+    for target in targets:
+        t0 = time.time()
+        level = simplify_mesh(mesh, target) if mesh.faces.shape[0] > target else mesh
+        independent.append(time.time() - t0)
+
+    print(f"{'target':>8} {'faces':>9} {'chained':>9} {'direct':>9} {'glb':>10} {'glb q+c':>10} {'ply':>10}")
+    for (target, level, dt_chain), dt_direct in zip(chained, independent):
+        v, f = level.vertices, level.faces
+        glb = len(export_mesh(v, f, "glb"))
+        compact = len(export_mesh(v, f, "glb", quantize=True, compress=True))
+        ply = len(export_mesh(v, f, "ply"))
+        print(
+            f"{target:>8,} {len(f):>9,} {dt_chain:>8.2f}s {dt_direct:>8.2f}s "
+            f"{glb / 1024:>8.0f}KB {compact / 1024:>8.0f}KB {ply / 1024:>8.0f}KB"
+        )
+
+    total_chain = sum(dt for _, _, dt in chained)
+    total_direct = sum(independent)
+    combined = export_glb([(level.vertices, level.faces) for _, level, _ in chained], quantize=True, compress=True)
+    print("=" * 78)
+    print(f"🎯 Chain total: {total_chain:.2f}s vs independent: {total_direct:.2f}s ({total_direct / max(total_chain, 1e-9):.2f}x)")
+    print(f"📦 Multi-LOD GLB (quantized + meshopt): {len(combined) / 1024:.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark mesh post-processing: NumPy clean-up vs the previous trimesh/pymeshlab path.
+
+The previous path built a processed ``trimesh.Trimesh`` from the raw
+samples, copied it into pymeshlab to merge vertices and decimate, and built
+another processed ``Trimesh`` from the result; normals for export came from
+yet another ``Trimesh``. The new path welds and cleans the raw arrays with
+``mesh_postprocess`` and hands pymeshlab only the decimation.
+
+    python benchmark_mesh_postprocess.py --subdivisions 8 --soup --faces 100000
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import trimesh
+
+from mesh_postprocess import clean_mesh, to_trimesh, vertex_normals
+from mesh_simplify import decimate
+
+Arrays = Tuple[np.ndarray, np.ndarray]
+
+
+def synthetic_samples(subdivisions: int, soup: bool, floaters: int) -> Arrays:
+    """A bumpy sphere shaped like raw pipeline samples (float32 vertices, int64 faces)"""
+    sphere = trimesh.creation.icosphere(subdivisions=subdivisions)
+    rng = np.random.default_rng(0)
+    vertices = sphere.vertices * (1 + 0.02 * rng.standard_normal((len(sphere.vertices), 1)))
+    faces = np.asarray(sphere.faces, dtype=np.int64)
+    pieces = [(vertices, faces)]
+    for i in range(floaters):
+        blob = trimesh.creation.icosphere(subdivisions=2, radius=0.02)
+        pieces.append((blob.vertices + rng.uniform(-1.5, 1.5, 3), np.asarray(blob.faces, dtype=np.int64)))
+    offset = np.cumsum([0] + [len(v) for v, _ in pieces[:-1]])
+    vertices = np.concatenate([v for v, _ in pieces]).astype(np.float32)
+    faces = np.concatenate([f + o for (_, f), o in zip(pieces, offset)])
+    if soup:
+        # Every face gets its own three vertices, the worst case for welding
+        vertices = vertices[faces].reshape(-1, 3)
+        faces = np.arange(len(vertices), dtype=np.int64).reshape(-1, 3)
+    return vertices, faces
+
+
+def previous_path(vertices: np.ndarray, faces: np.ndarray, n_faces: int) -> Arrays:
+    mesh = trimesh.Trimesh(vertices.astype(np.float32), faces)
+    if n_faces > 0 and mesh.faces.shape[0] > n_faces:
+        import pymeshlab
+
+        ms = pymeshlab.MeshSet()
+        ms.add_mesh(pymeshlab.Mesh(vertex_matrix=mesh.vertices, face_matrix=mesh.faces))
+        ms.meshing_merge_close_vertices()
+        ms.meshing_decimation_quadric_edge_collapse(targetfacenum=n_faces)
+        simplified = ms.current_mesh()
+        mesh = trimesh.Trimesh(vertices=simplified.vertex_matrix(), faces=simplified.face_matrix())
+    # Only timed, like the normals new_path computes, so both paths do the same work
+    trimesh.Trimesh(mesh.vertices, mesh.faces, process=False).vertex_normals
+    return np.asarray(mesh.vertices), np.asarray(mesh.faces)
+
+
+def new_path(vertices: np.ndarray, faces: np.ndarray, n_faces: int, min_component_fraction: float = 0.0) -> Arrays:
+    vertices, faces = clean_mesh(vertices, faces, min_component_fraction=min_component_fraction)
+    if n_faces > 0 and len(faces) > n_faces:
+        vertices, faces = decimate(vertices, faces, n_faces)
+    normals = vertex_normals(vertices, faces)
+    to_trimesh(vertices, faces, normals)
+    return vertices, faces
+
+
+def measure(fn: Callable[[], Arrays], repeats: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    # NumPy registers its buffers with tracemalloc; pymeshlab's own allocations are not counted
+    tracemalloc.start()
+    vertices, faces = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"best": min(times), "mean": sum(times) / len(times), "peak_mb": peak / 1024 ** 2,
+            "vertices": len(vertices), "faces": len(faces)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mesh", default="", help="Mesh file to use as raw samples (default: synthetic sphere)")
+    parser.add_argument("--subdivisions", type=int, default=8, help="Synthetic sphere detail; 8 gives 1.3M faces")
+    parser.add_argument("--soup", action="store_true", help="Unshare all vertices, like an unwelded marching cubes output")
+    parser.add_argument("--floaters", type=int, default=20, help="Small disconnected blobs added to the synthetic mesh")
+    parser.add_argument("--faces", type=int, nargs="+", default=[-1, 100000], help="Face targets to run (-1 = no decimation)")
+    parser.add_argument("--min-component-fraction", type=float, default=0.01)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.mesh:
+        mesh = trimesh.load(args.mesh, force="mesh", process=False)
+        vertices, faces = np.asarray(mesh.vertices, dtype=np.float32), np.asarray(mesh.faces, dtype=np.int64)
+    else:
+        vertices, faces = synthetic_samples(args.subdivisions, args.soup, args.floaters)
+
+    print("🚀 Mesh Post-processing Benchmark")
+    print("=" * 84)
+    print(f"📐 Raw samples: {len(vertices):,} vertices, {len(faces):,} faces")
+    print(f"{'path':<28} {'target':>8} {'best':>8} {'mean':>8} {'peak MB':>9} {'vertices':>10} {'faces':>10}")
+
+    for n_faces in args.faces:
+        runs = {
+            "trimesh + pymeshlab": lambda: previous_path(vertices, faces, n_faces),
+            "numpy": lambda: new_path(vertices, faces, n_faces),
+            "numpy + floater removal": lambda: new_path(vertices, faces, n_faces, args.min_component_fraction),
+        }
+        results = {name: measure(fn, args.repeats) for name, fn in runs.items()}
+        baseline = results["trimesh + pymeshlab"]["best"]
+        for name, r in results.items():
+            print(
+                f"{name:<28} {n_faces:>8} {r['best']:>7.2f}s {r['mean']:>7.2f}s {r['peak_mb']:>9.1f} "
+                f"{r['vertices']:>10,} {r['faces']:>10,}  {baseline / r['best']:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
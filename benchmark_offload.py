@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark low-memory mode: peak memory during inference and per-request
+latency with every model resident vs stage-wise offloading.
+
+Each mode runs in a fresh process. The peak RSS high-water mark is reset
+after the models are loaded, so the peak reflects inference rather than
+loading.
+
+    python benchmark_offload.py --stub
+    python benchmark_offload.py --budgets -1 0 --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+
+def reset_peak_rss():
+    """Reset the kernel's RSS high-water mark (Linux), so later peaks exclude model loading"""
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+
+
+def peak_rss() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def child(args: argparse.Namespace) -> Dict[str, Any]:
+    """Load the models (offloaded when ``args.budget`` is given), run inference and measure it"""
+    if args.budget is not None:
+        os.environ["TRIPOSG_OFFLOAD"] = "1"
+        os.environ["TRIPOSG_OFFLOAD_BUDGET_BYTES"] = str(args.budget)
+    import torch
+
+    import inference
+    from image_preprocess import synthetic_image
+    from metrics import rss_bytes
+
+    t0 = time.perf_counter()
+    if args.stub:
+        from offload import StageOffloader, pipeline_components
+        from triposg_stub import StubRMBG, StubTripoSGPipeline
+
+        pipe = StubTripoSGPipeline(tokens=args.stub_tokens, width=args.stub_width, vae_width=args.stub_vae_width, step_overhead=0)
+        rmbg = StubRMBG().eval()
+        if args.budget is not None:
+            inference.offloader = StageOffloader(pipeline_components(pipe, rmbg), inference.device, budget_bytes=args.budget, metrics=inference.metrics)
+    else:
+        pipe, rmbg = inference.load_models()
+    load_seconds = time.perf_counter() - t0
+
+    image = synthetic_image()
+    inference.generate_samples(pipe, [image], rmbg, [0], num_inference_steps=2)
+    reset_peak_rss()
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+    latencies = []
+    for i in range(args.runs):
+        t0 = time.perf_counter()
+        inference.generate_samples(pipe, [image] * args.batch_size, rmbg, list(range(args.batch_size)), num_inference_steps=args.steps)
+        latencies.append(time.perf_counter() - t0)
+
+    result = {
+        "load_seconds": load_seconds,
+        "mean_latency": sum(latencies) / len(latencies),
+        "peak_rss_bytes": peak_rss(),
+        "rss_bytes": rss_bytes(),
+        "accelerator_peak_bytes": torch.cuda.max_memory_allocated() if torch.cuda.is_available() else None,
+    }
+    if inference.offloader is not None:
+        stats = inference.offloader.stats()
+        result.update(weights_bytes=stats["total_bytes"], peak_resident_bytes=stats["peak_resident_bytes"])
+    return result
+
+
+def run_mode(budget: Optional[int], argv: List[str]) -> Dict[str, Any]:
+    command = [sys.executable, __file__, "--child", *argv]
+    if budget is not None:
+        command += ["--budget", str(budget)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="Use the CPU stub pipeline instead of the real weights")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[-1, 0], help="Offload budgets to compare (bytes; -1 auto, 0 one component)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--stub-tokens", type=int, default=32)
+    parser.add_argument("--stub-width", type=int, default=300000, help="Stub denoiser width; 300000 is ~150 MB of weights")
+    parser.add_argument("--stub-vae-width", type=int, default=200000, help="Stub VAE width; 200000 is ~50 MB of weights")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--budget", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args)))
+        return
+
+    argv = [
+        f"--runs={args.runs}", f"--steps={args.steps}", f"--batch-size={args.batch_size}",
+        f"--stub-tokens={args.stub_tokens}", f"--stub-width={args.stub_width}", f"--stub-vae-width={args.stub_vae_width}",
+    ] + (["--stub"] if args.stub else [])
+
+    print(f"🚀 Offload Benchmark{' (stub models)' if args.stub else ''}")
+    print("=" * 92)
+    print(f"{'mode':<22} {'load':>7} {'latency':>9} {'peak RSS':>10} {'saved':>9} {'accel peak':>11} {'resident':>10}")
+    baseline = None
+    for budget in [None, *args.budgets]:
+        r = run_mode(budget, argv)
+        name = "all resident" if budget is None else f"offload, budget {'auto' if budget < 0 else budget >> 20}{'' if budget < 0 else ' MB'}"
+        baseline = baseline or r
+        mb = lambda value: f"{value / 1024 ** 2:.0f} MB" if value is not None else "-"
+        print(
+            f"{name:<22} {r['load_seconds']:>6.1f}s {r['mean_latency']:>8.2f}s {mb(r['peak_rss_bytes']):>10} "
+            f"{mb(baseline['peak_rss_bytes'] - r['peak_rss_bytes']):>9} {mb(r['accelerator_peak_bytes']):>11} "
+            f"{mb(r.get('peak_resident_bytes')):>10}  {r['mean_latency'] / baseline['mean_latency']:.2f}x latency"
+        )
+
+
+if __name__ == "__main__":
+    main()
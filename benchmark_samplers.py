@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Compare samplers, step counts and quality tiers for speed and mesh accuracy.
+
+Every configuration runs the same images and seeds. Its meshes are compared
+to those of the pipeline's own scheduler at --reference-steps (50) with the
+Chamfer distance, relative to the object's size. Use this to pick tiers
+with known trade-offs.
+
+    python benchmark_samplers.py --stub
+    python benchmark_samplers.py --schedulers dpmpp_2m unipc --steps 8 12 16 --guidance-cutoff 0.7
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import trimesh
+
+from benchmark_suite import find_images, percentile
+from image_preprocess import decode_image, synthetic_image
+from mesh_quality import chamfer_distance
+from samplers import QUALITY_TIERS, SAMPLERS
+
+
+def run_config(pipe: Any, rmbg: Any, sampling: Dict[str, Any], args: argparse.Namespace, images: Dict[str, Any]) -> Dict[str, Any]:
+    import inference
+
+    def generate(image, seed):
+        (vertices, faces), = inference.generate_samples(pipe, [image], rmbg, [seed], **sampling)
+        return trimesh.Trimesh(vertices, faces)
+
+    times: List[float] = []
+    meshes = {}
+    for image_name, image in images.items():
+        for i in range(args.repeats):
+            t0 = time.perf_counter()
+            meshes[image_name] = generate(image, args.seed)
+            times.append(time.perf_counter() - t0)
+    return {"times": times, "meshes": meshes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="Use the CPU stub models (no weights needed)")
+    parser.add_argument("--tiers", nargs="*", choices=list(QUALITY_TIERS), default=list(QUALITY_TIERS))
+    parser.add_argument("--schedulers", nargs="*", choices=SAMPLERS, default=list(SAMPLERS))
+    parser.add_argument("--steps", type=int, nargs="*", default=[10, 20])
+    parser.add_argument("--guidance-cutoff", type=float, default=1.0, help="For the --schedulers x --steps grid")
+    parser.add_argument("--reference-steps", type=int, default=50)
+    parser.add_argument("--guidance-scale", type=float, default=7.0)
+    parser.add_argument("--images", nargs="*", default=[])
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--samples", type=int, default=50000, help="Surface samples for the Chamfer distance")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    import inference
+
+    paths = find_images(args.images)
+    images = {path.name: decode_image(path.read_bytes()) for path in paths}
+    if not images:
+        images = {"synthetic.png": synthetic_image()}
+
+    pipe, rmbg = inference.load_models(stub=args.stub)
+    inference.generate_samples(pipe, [next(iter(images.values()))], rmbg, [0], num_inference_steps=2)
+
+    # The pipeline's own scheduler at full steps is the accuracy reference
+    configs = {"reference": {"num_inference_steps": args.reference_steps, "guidance_scale": args.guidance_scale}}
+    for name in args.tiers:
+        configs[name] = dict(QUALITY_TIERS[name])
+    for scheduler in args.schedulers:
+        for steps in args.steps:
+            configs[f"{scheduler}/{steps}"] = {
+                "scheduler": scheduler,
+                "num_inference_steps": steps,
+                "guidance_scale": args.guidance_scale,
+                "guidance_cutoff": args.guidance_cutoff,
+            }
+
+    results = {}
+    for label, sampling in configs.items():
+        print(f"\n🔄 {label}: {sampling}")
+        results[label] = run_config(pipe, rmbg, sampling, args, images)
+
+    reference = results["reference"]
+    baseline_p50 = percentile(reference["times"], 0.5)
+    report = {}
+    for label, result in results.items():
+        errors = [
+            chamfer_distance(mesh, reference["meshes"][image_name], samples=args.samples)
+            for image_name, mesh in result["meshes"].items()
+        ]
+        p50 = percentile(result["times"], 0.5)
+        report[label] = {
+            **configs[label],
+            "p50": p50,
+            "speedup": baseline_p50 / p50,
+            "chamfer_mean": sum(e["chamfer"] for e in errors) / len(errors),
+            "chamfer_max": max(e["chamfer"] for e in errors),
+            "hausdorff_max": max(e["hausdorff"] for e in errors),
+        }
+
+    print("\n" + "=" * 72)
+    print(f"{'config':<16} {'p50':>9} {'speedup':>8} {'chamfer mean':>13} {'chamfer max':>12} {'hausdorff':>10}")
+    for label, row in report.items():
+        print(
+            f"{label:<16} {row['p50']:>8.2f}s {row['speedup']:>7.2f}x {row['chamfer_mean']:>13.2e} "
+            f"{row['chamfer_max']:>12.2e} {row['hausdorff_max']:>10.2e}"
+        )
+    print(f"Distances are relative to the bounding box diagonal of the {args.reference_steps}-step reference mesh.")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"📁 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
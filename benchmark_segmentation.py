@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark background removal: per-image segmentation throughput at several
+batch sizes, and the compositing step before and after vectorizing it.
+
+    python benchmark_segmentation.py --batch-sizes 1 2 4 8
+    python benchmark_segmentation.py --stub   # CPU stub matte, no weights
+"""
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import torch
+
+from image_preprocess import composite, to_float_array
+from segmentation import RMBGSegmenter, SessionPool
+from triposg_stub import StubRMBG
+
+
+def load_rmbg(stub: bool) -> Any:
+    if stub:
+        return StubRMBG().eval()
+    import os
+
+    from TripoSG.scripts.briarmbg import BriaRMBG
+
+    weights_dir = "TripoSG/pretrained_weights/RMBG-1.4"
+    if not os.path.exists(weights_dir):
+        from huggingface_hub import snapshot_download
+        snapshot_download(repo_id="briaai/RMBG-1.4", local_dir=weights_dir)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return BriaRMBG.from_pretrained(weights_dir).to(device).eval()
+
+
+def test_images(count: int, size: int) -> List[np.ndarray]:
+    """Photo-sized noisy images, so nothing about them is trivially compressible"""
+    rng = np.random.default_rng(0)
+    return [rng.random((size, size, 3), dtype=np.float32) for _ in range(count)]
+
+
+def throughput(segmenter: Callable, images: List[np.ndarray], batch_size: int, repeats: int) -> Dict[str, float]:
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    segmenter(batches[0])
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for batch in batches:
+            segmenter(batch)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        best = min(best, time.perf_counter() - t0)
+    return {"images_per_second": len(images) / best, "ms_per_image": 1000 * best / len(images)}
+
+
+def previous_composite(rgb: np.ndarray, alpha: np.ndarray, bg_color: Any) -> np.ndarray:
+    bg = np.asarray(bg_color, dtype=np.float32).reshape(1, 1, 3)
+    a = alpha[:, :, None]
+    return np.clip((rgb * a + bg * (1 - a)) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stub", action="store_true", help="Use the stub matte instead of BriaRMBG weights")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--size", type=int, default=1024, help="Input image side in pixels")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    segmenter = RMBGSegmenter(SessionPool(lambda: load_rmbg(args.stub)))
+    images = test_images(args.images, args.size)
+
+    print(f"🚀 Segmentation Benchmark{' (stub matte)' if args.stub else ''}")
+    print("=" * 60)
+    print(f"📷 {args.images} images of {args.size}x{args.size}")
+    print(f"{'batch':>6} {'images/s':>10} {'ms/image':>10} {'speedup':>9}")
+    baseline = None
+    for batch_size in args.batch_sizes:
+        r = throughput(segmenter, images, batch_size, args.repeats)
+        baseline = baseline or r["images_per_second"]
+        print(f"{batch_size:>6} {r['images_per_second']:>10.2f} {r['ms_per_image']:>10.1f} {r['images_per_second'] / baseline:>8.2f}x")
+
+    rgb = to_float_array(images[0])
+    alpha = np.clip(np.random.default_rng(1).random(rgb.shape[:2], dtype=np.float32), 0, 1)
+    print("\n🎨 Compositing one image")
+    for name, fn in (("previous", previous_composite), ("vectorized", composite)):
+        t0 = time.perf_counter()
+        for _ in range(args.repeats * 5):
+            fn(rgb, alpha, (1.0, 1.0, 1.0))
+        print(f"  {name:<11} {1000 * (time.perf_counter() - t0) / (args.repeats * 5):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
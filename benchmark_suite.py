@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the TripoSG server path and TripoSR.
+
+Runs warmup iterations, then N timed repeats per image and reports p50/p95
+per stage, throughput under concurrency, peak memory and mesh stats. Results
+are written as JSON and can be compared against a stored baseline, failing
+(exit code 1) when a stage or throughput regresses beyond the tolerance.
+
+    python benchmark_suite.py --backend triposg --stub --output bench.json
+    python benchmark_suite.py --backend triposg --stub --baseline bench.json
+
+benchmark_baseline_stub.json is a reference run of the stub backend with the
+default settings. Timings depend on the machine, so regenerate it with
+--output when comparing on different hardware.
+"""
+import argparse
+import io
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "mean": sum(values) / len(values),
+            "n": len(values),
+        }
+        for stage, values in samples.items()
+        if values
+    }
+
+
+def mesh_stats(vertices: np.ndarray, faces: np.ndarray) -> Dict[str, Any]:
+    vertices = np.asarray(vertices)
+    extent = vertices.max(axis=0) - vertices.min(axis=0) if len(vertices) else np.zeros(3)
+    return {"vertices": int(len(vertices)), "faces": int(len(faces)), "extent": extent.round(4).tolist()}
+
+
+def peak_memory() -> Dict[str, int]:
+    from metrics import accelerator_memory, peak_rss_bytes
+
+    memory = {"peak_rss_bytes": peak_rss_bytes()}
+    accelerator = accelerator_memory()
+    if "peak" in accelerator:
+        memory["accelerator_peak_bytes"] = int(accelerator["peak"])
+    return memory
+
+
+def find_images(patterns: List[str]) -> List[Path]:
+    if patterns:
+        images = []
+        for pattern in patterns:
+            matches = sorted(Path().glob(pattern)) if any(c in pattern for c in "*?[") else [Path(pattern)]
+            images += [p for p in matches if p.is_file()]
+        return images
+
+    # Same discovery as the original TripoSR benchmark, without the 3-image cap
+    images = []
+    examples_dir = ROOT / "TripoSR" / "examples"
+    if examples_dir.exists():
+        images += sorted(examples_dir.glob("*.png")) + sorted(examples_dir.glob("*.jpg"))
+    images += sorted(ROOT.glob("test*.jpeg"))
+    return images
+
+
+def synthetic_png() -> bytes:
+    from image_preprocess import synthetic_image
+
+    buffer = io.BytesIO()
+    synthetic_image().save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TripoSGBackend:
+    """Benchmarks the server path from generate_3d_model"""
+
+    name = "triposg"
+
+    def __init__(self, stub: bool, steps: int, guidance_scale: float, faces: int):
+        import generate_3d_model as server
+
+        self.server = server
+        self.steps = steps
+        self.guidance_scale = guidance_scale
+        self.faces = faces
+        t0 = time.perf_counter()
+        server.pipe, server.rmbg_net = server.load_models(stub=stub)
+        self.load_time = time.perf_counter() - t0
+
+    def run_once(self, contents: bytes, seed: int = 42) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        from image_preprocess import decode_image
+        from mesh_export import export_mesh
+        from mesh_postprocess import clean_mesh
+        from mesh_simplify import decimate
+
+        server = self.server
+        timings: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        image = decode_image(contents, max_size=server.MAX_INPUT_SIZE)
+        timings["decode"] = time.perf_counter() - t0
+
+        (vertices, faces), = server.generate_samples(
+            server.pipe, [image], server.rmbg_net, [seed], self.steps, self.guidance_scale, timings=timings
+        )
+
+        t0 = time.perf_counter()
+        vertices, faces = clean_mesh(vertices, faces)
+        timings["meshing"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        if self.faces > 0 and len(faces) > self.faces:
+            vertices, faces = decimate(vertices, faces, self.faces)
+        timings["simplify"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        data = export_mesh(vertices, faces, "glb")
+        timings["export"] = time.perf_counter() - t0
+
+        stats = mesh_stats(vertices, faces)
+        stats["glb_bytes"] = len(data)
+        return timings, stats
+
+    def run_concurrent(self, images: List[bytes], concurrency: int, requests: int) -> float:
+        """Submit ``requests`` jobs through the server's queue, ``concurrency`` at a time"""
+        from image_preprocess import decode_image
+
+        server = self.server
+        server.job_queue.start()
+        decoded = [decode_image(contents, max_size=server.MAX_INPUT_SIZE) for contents in images]
+        params = {
+            "num_inference_steps": self.steps,
+            "guidance_scale": self.guidance_scale,
+            "scheduler": "default",
+            "guidance_cutoff": 1.0,
+            "faces": self.faces,
+            "lods": None,
+        }
+        slots = threading.Semaphore(concurrency)
+        futures = []
+        t0 = time.perf_counter()
+        for i in range(requests):
+            slots.acquire()
+            job = server.job_queue.submit(dict(params, seed=i), decoded[i % len(decoded)])
+            job.future.add_done_callback(lambda _: slots.release())
+            futures.append(job.future)
+        wait(futures)
+        elapsed = time.perf_counter() - t0
+        for future in futures:
+            # A failed job would otherwise count as a (very fast) success
+            future.result()
+        return requests / elapsed
+
+    def close(self):
+        self.server.job_queue.stop()
+        self.server.postprocess_pool.shutdown()
+
+
+class TripoSRBackend:
+    """Benchmarks TripoSR with a pool of reused rembg sessions"""
+
+    name = "triposr"
+
+    def __init__(self, chunk_size: int = 0, resolution: int = 256, sessions: int = 1):
+        import torch
+
+        from segmentation import rembg_pool
+
+        sys.path.insert(0, str(ROOT / "TripoSR"))
+        sys.path.insert(0, str(ROOT / "TripoSR" / "tsr"))
+        from tsr.system import TSR
+        from triposr_mesh import configure_chunk_size
+
+        if torch.cuda.is_available():
+            self.device = "cuda:0"
+        elif hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+            self.device = "mps"
+        else:
+            self.device = "cpu"
+
+        t0 = time.perf_counter()
+        self.model = TSR.from_pretrained("stabilityai/TripoSR", config_name="config.yaml", weight_name="model.ckpt")
+        self.model.to(self.device)
+        self.chunk_size = configure_chunk_size(self.model, chunk_size)
+        self.resolution = resolution
+        # Sessions are created once, one per concurrent run; creating them per image used to be counted as preprocessing
+        self.rembg_sessions = rembg_pool(size=sessions)
+        self.load_time = time.perf_counter() - t0
+
+    def run_once(self, contents: bytes, seed: int = 42) -> Tuple[Dict[str, float], Dict[str, Any]]:
+        import torch
+
+        from segmentation import remove_background
+
+        timings: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        image = remove_background(Image.open(io.BytesIO(contents)), self.rembg_sessions)
+        timings["preprocess"] = time.perf_counter() - t0
+
+        from triposr_mesh import extract_mesh
+
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            scene_codes = self.model([image], device=self.device)
+        timings["inference"] = time.perf_counter() - t0
+
+        # The model stays on its device, so concurrent runs can overlap
+        t0 = time.perf_counter()
+        mesh = extract_mesh(self.model, scene_codes, has_vertex_color=True, resolution=self.resolution)[0]
+        timings["extract"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        data = mesh.export(file_type="obj")
+        timings["export"] = time.perf_counter() - t0
+
+        stats = mesh_stats(np.asarray(mesh.vertices), np.asarray(mesh.faces))
+        stats["obj_bytes"] = len(data)
+        return timings, stats
+
+    def run_concurrent(self, images: List[bytes], concurrency: int, requests: int) -> float:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda i: self.run_once(images[i % len(images)], seed=i), range(requests)))
+        return requests / (time.perf_counter() - t0)
+
+    def close(self):
+        pass
+
+
+def run_benchmark(backend: Any, images: Dict[str, bytes], warmup: int, repeats: int, concurrency: int, requests: int) -> Dict[str, Any]:
+    samples: Dict[str, List[float]] = {}
+    per_image = {}
+
+    for name, contents in images.items():
+        print(f"\n🔄 {name}")
+        for _ in range(warmup):
+            backend.run_once(contents)
+
+        for i in range(repeats):
+            t0 = time.perf_counter()
+            timings, stats = backend.run_once(contents, seed=42 + i)
+            timings["total"] = time.perf_counter() - t0
+            for stage, seconds in timings.items():
+                samples.setdefault(stage, []).append(seconds)
+            per_image[name] = stats
+        print(f"  📊 {per_image[name]}")
+
+    throughput = None
+    if concurrency > 0 and requests > 0:
+        print(f"\n🔄 Throughput: {requests} requests, concurrency {concurrency}")
+        throughput = backend.run_concurrent(list(images.values()), concurrency, requests)
+
+    return {
+        "backend": backend.name,
+        "load_time": backend.load_time,
+        "stages": summarize(samples),
+        "throughput": {"concurrency": concurrency, "requests": requests, "requests_per_s": throughput},
+        "memory": peak_memory(),
+        "meshes": per_image,
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta: float) -> List[str]:
+    """Return a description of every regression beyond ``tolerance`` (relative) and ``min_delta`` seconds"""
+    regressions = []
+    for stage, current in result["stages"].items():
+        reference = baseline.get("stages", {}).get(stage)
+        if not reference:
+            continue
+        for key in ("p50", "p95"):
+            if current[key] > reference[key] * (1 + tolerance) and current[key] - reference[key] > min_delta:
+                regressions.append(f"{stage} {key}: {reference[key]:.3f}s -> {current[key]:.3f}s")
+
+    current_rps = result["throughput"].get("requests_per_s")
+    reference_rps = baseline.get("throughput", {}).get("requests_per_s")
+    if current_rps and reference_rps and current_rps < reference_rps * (1 - tolerance):
+        regressions.append(f"throughput: {reference_rps:.2f} -> {current_rps:.2f} req/s")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]):
+    print("\n" + "=" * 60)
+    print(f"📊 BENCHMARK SUMMARY ({result['backend']})")
+    print("=" * 60)
+    print(f"{'stage':<16} {'p50':>10} {'p95':>10} {'mean':>10}")
+    for stage, summary in result["stages"].items():
+        print(f"{stage:<16} {summary['p50']:>9.3f}s {summary['p95']:>9.3f}s {summary['mean']:>9.3f}s")
+    rps = result["throughput"]["requests_per_s"]
+    if rps:
+        print(f"🎯 Throughput: {rps:.2f} req/s at concurrency {result['throughput']['concurrency']}")
+    print(f"🧠 Peak RSS: {result['memory']['peak_rss_bytes'] / 1024 ** 2:.0f} MB")
+    if "accelerator_peak_bytes" in result["memory"]:
+        print(f"🧠 Peak accelerator memory: {result['memory']['accelerator_peak_bytes'] / 1024 ** 2:.0f} MB")
+    print(f"⏱️  Model load: {result['load_time']:.1f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["triposg", "triposr"], default="triposg")
+    parser.add_argument("--stub", action="store_true", help="Use the CPU stub TripoSG models (no weights needed)")
+    parser.add_argument("--images", nargs="*", default=[], help="Image paths or globs (default: test images)")
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--guidance-scale", type=float, default=7.0)
+    parser.add_argument("--faces", type=int, default=-1)
+    parser.add_argument("--chunk-size", type=int, default=0, help="TripoSR renderer chunk size (0: from free memory)")
+    parser.add_argument("--mc-resolution", type=int, default=256, help="TripoSR marching cubes grid resolution")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Ignore slowdowns smaller than this (seconds)")
+    args = parser.parse_args(argv)
+
+    if args.stub and args.backend != "triposg":
+        parser.error("--stub is only available for the triposg backend")
+
+    paths = find_images(args.images)
+    images = {path.name: path.read_bytes() for path in paths}
+    if not images:
+        if not args.stub:
+            print("❌ No test images found!")
+            return 1
+        images = {"synthetic.png": synthetic_png()}
+
+    print(f"🚀 {args.backend} benchmark{' (stub models)' if args.stub else ''}")
+    print(f"📷 {len(images)} images, {args.warmup} warmup + {args.repeats} repeats each")
+
+    if args.backend == "triposg":
+        backend = TripoSGBackend(args.stub, args.steps, args.guidance_scale, args.faces)
+    else:
+        backend = TripoSRBackend(args.chunk_size, args.mc_resolution, sessions=max(1, args.concurrency))
+
+    try:
+        result = run_benchmark(backend, images, args.warmup, args.repeats, args.concurrency, args.requests)
+    finally:
+        backend.close()
+
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    print_report(result)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"📁 Results saved to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(result, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print("❌ Regressions against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("✅ No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory per HTTP worker and throughput scaling, with and without
+a shared model host.
+
+For each worker count the server is started under uvicorn, warmed up, and
+hit with concurrent /convert requests. Memory is the unique set size (USS)
+of each process, so pages shared copy-on-write are not counted twice.
+
+    python benchmark_workers.py --stub --workers 1 2 4
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import psutil
+
+from image_preprocess import synthetic_image
+
+
+def process_memory(process: psutil.Process) -> int:
+    try:
+        return process.memory_full_info().uss
+    except (psutil.AccessDenied, AttributeError):
+        return process.memory_info().rss
+
+
+def multipart(image: bytes) -> Dict[str, bytes]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="image.png"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return {"body": body, "content_type": f"multipart/form-data; boundary={boundary}"}
+
+
+def wait_ready(port: int, workers: int, timeout: float):
+    """Wait until the probe succeeds repeatedly; requests land on random workers, so one success isn't enough"""
+    deadline = time.monotonic() + timeout
+    ready = 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready", timeout=5):
+                ready += 1
+                if ready >= workers * 4:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            ready = 0
+        time.sleep(0.25)
+    raise TimeoutError("Server did not become ready")
+
+
+def run_load(port: int, image: bytes, requests: int, concurrency: int, steps: int) -> float:
+    form = multipart(image)
+    url = f"http://127.0.0.1:{port}/convert?num_inference_steps={steps}&seed="
+
+    def post(i: int):
+        request = urllib.request.Request(
+            url + str(i), data=form["body"], headers={"Content-Type": form["content_type"]}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=600) as response:
+            response.read()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(post, range(requests)))
+    return requests / (time.perf_counter() - t0)
+
+
+def run(mode: str, workers: int, args: argparse.Namespace, image: bytes) -> Dict[str, float]:
+    env = dict(
+        os.environ,
+        TRIPOSG_STUB_MODELS="1" if args.stub else "0",
+        # Every request is a distinct seed, but keep the cache out of the measurement anyway
+        TRIPOSG_CACHE_MAX_ENTRIES="0",
+        TRIPOSG_POSTPROCESS_WORKERS="0",
+    )
+    env.pop("TRIPOSG_MODEL_HOST", None)
+    host: Optional[subprocess.Popen] = None
+    if mode == "host":
+        address = f"127.0.0.1:{args.port + 1}"
+        env["TRIPOSG_MODEL_HOST"] = address
+        host = subprocess.Popen([sys.executable, "model_host.py", "--address", address], env=env)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "generate_3d_model:app",
+         "--port", str(args.port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        wait_ready(args.port, workers, args.timeout)
+        rps = run_load(args.port, image, args.requests, args.concurrency, args.steps)
+
+        # With one worker uvicorn serves in-process, so count the whole tree
+        server_process = psutil.Process(server.pid)
+        worker_bytes = sum(process_memory(p) for p in [server_process, *server_process.children(recursive=True)])
+        host_bytes = process_memory(psutil.Process(host.pid)) if host else 0
+        return {
+            "mode": mode,
+            "workers": workers,
+            "worker_mb": worker_bytes / 1024 ** 2,
+            "host_mb": host_bytes / 1024 ** 2,
+            "total_mb": (worker_bytes + host_bytes) / 1024 ** 2,
+            "rps": rps,
+        }
+    finally:
+        for process in (server, host):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["host", "independent"], default=["independent", "host"])
+    parser.add_argument("--stub", action="store_true", help="Use the CPU stub models (no weights needed)")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--timeout", type=float, default=900.0, help="Seconds to wait for readiness")
+    args = parser.parse_args()
+
+    buffer = io.BytesIO()
+    synthetic_image().save(buffer, "PNG")
+    image = buffer.getvalue()
+
+    print(f"🖥️  {os.cpu_count()} cores, {args.requests} requests at concurrency {args.concurrency}")
+    results: List[Dict[str, float]] = []
+    for mode in args.modes:
+        for workers in args.workers:
+            print(f"\n🔄 {mode}, {workers} worker(s)")
+            results.append(run(mode, workers, args, image))
+
+    print("\n" + "=" * 72)
+    print(f"{'mode':<12} {'workers':>7} {'workers MB':>11} {'host MB':>9} {'MB/worker':>10} {'req/s':>8}")
+    for mode in args.modes:
+        rows = [r for r in results if r["mode"] == mode]
+        for row in rows:
+            print(
+                f"{row['mode']:<12} {row['workers']:>7} {row['worker_mb']:>11.0f} {row['host_mb']:>9.0f} "
+                f"{row['worker_mb'] / row['workers']:>10.0f} {row['rps']:>8.2f}"
+            )
+        if len(rows) > 1:
+            added = (rows[-1]["total_mb"] - rows[0]["total_mb"]) / (rows[-1]["workers"] - rows[0]["workers"])
+            print(f"{'':<12} memory per added worker: {added:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
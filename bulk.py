@@ -0,0 +1,290 @@
+"""
+Bulk catalog conversion: inputs and results are spooled to disk and images
+are converted through a sliding window, so memory stays bounded however
+many images a request carries
+"""
+import asyncio
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def is_image_name(filename: str) -> bool:
+    """Whether a file (upload, zip member or manifest path) is taken as an input image"""
+    name = os.path.basename(filename)
+    return not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class BulkJob:
+    """One bulk conversion, stored under ``directory``.
+
+    ``manifest.json`` lists the items and conversion parameters,
+    ``status.ndjson`` gets one line per finished item, and meshes are
+    written to ``meshes/``. Everything needed to resume after a restart is
+    on disk.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.id = directory.name
+        self.inputs_dir = directory / "inputs"
+        self.meshes_dir = directory / "meshes"
+        self.manifest_path = directory / "manifest.json"
+        self.status_path = directory / "status.ndjson"
+        self._lock = threading.Lock()
+        self._items: List[Dict[str, str]] = []
+        self.params: Dict[str, Any] = {}
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            self._items = manifest["items"]
+            self.params = manifest["params"]
+
+    @property
+    def items(self) -> List[Dict[str, str]]:
+        return self._items
+
+    def _unique_name(self, filename: str) -> str:
+        stem = Path(filename).stem or "image"
+        return f"{len(self._items):05d}_{stem}"
+
+    def add_path(self, path: str):
+        """Reference an image on local disk without copying it"""
+        self._items.append({"name": self._unique_name(path), "path": str(path)})
+
+    def add_file(self, filename: str, fileobj: BinaryIO):
+        """Spool an uploaded image to disk"""
+        self.inputs_dir.mkdir(parents=True, exist_ok=True)
+        name = self._unique_name(filename)
+        path = self.inputs_dir / (name + Path(filename).suffix.lower())
+        with open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        self._items.append({"name": name, "path": str(path)})
+
+    def add_zip(self, fileobj: BinaryIO):
+        """Spool every image in a zip archive, one member at a time"""
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in archive.infolist():
+                filename = os.path.basename(member.filename)
+                if member.is_dir() or not is_image_name(filename):
+                    continue
+                with archive.open(member) as f:
+                    self.add_file(filename, f)
+
+    def save_manifest(self, params: Dict[str, Any]):
+        self.params = params
+        self.manifest_path.write_text(json.dumps({"params": params, "items": self._items}))
+
+    def append_status(self, line: Dict[str, Any]):
+        with self._lock:
+            with open(self.status_path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+
+    def status_lines(self) -> List[Dict[str, Any]]:
+        if not self.status_path.exists():
+            return []
+        with self._lock:
+            text = self.status_path.read_text()
+        return [json.loads(line) for line in text.splitlines() if line]
+
+    def finished_names(self) -> set:
+        return {line["name"] for line in self.status_lines() if "name" in line}
+
+    def summary(self) -> Dict[str, Any]:
+        lines = [line for line in self.status_lines() if "name" in line]
+        done = sum(1 for line in lines if line["status"] == "done")
+        return {
+            "bulk_id": self.id,
+            "total": len(self._items),
+            "done": done,
+            "failed": len(lines) - done,
+            "complete": len(lines) >= len(self._items),
+        }
+
+
+class BulkRunner:
+    """Creates bulk jobs and converts their items in the background.
+
+    ``convert(contents, params, stopped)`` queues one image and returns a
+    future for the encoded mesh; it goes through the regular batched
+    inference path, and should give up waiting for queue space once
+    ``stopped()`` is true. At most ``window`` images are decoded or in
+    flight at a time. When a bulk job is stopped (or deleted), its in-flight
+    futures are cancelled, which ``convert`` should pass on to the work.
+    """
+
+    def __init__(
+        self, root: str, convert: Callable[[bytes, Dict[str, Any], Callable[[], bool]], Future], window: int = 8
+    ):
+        self.root = Path(root)
+        self.convert = convert
+        self.window = window
+        self._threads: Dict[str, threading.Thread] = {}
+        self._stopped: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def create(self) -> BulkJob:
+        directory = self.root / uuid.uuid4().hex
+        directory.mkdir(parents=True)
+        return BulkJob(directory)
+
+    def get(self, bulk_id: str) -> Optional[BulkJob]:
+        directory = self.root / bulk_id
+        if not bulk_id.isalnum() or not (directory / "manifest.json").exists():
+            return None
+        return BulkJob(directory)
+
+    def running(self, bulk_id: str) -> bool:
+        with self._lock:
+            thread = self._threads.get(bulk_id)
+            return thread is not None and thread.is_alive()
+
+    def start(self, bulk: BulkJob) -> bool:
+        """Convert every item that has no status line yet; False if already running"""
+        with self._lock:
+            thread = self._threads.get(bulk.id)
+            if thread is not None and thread.is_alive():
+                return False
+            stopped = self._stopped[bulk.id] = threading.Event()
+            thread = self._threads[bulk.id] = threading.Thread(
+                target=self._run, args=(bulk, stopped), name=f"bulk-{bulk.id[:8]}", daemon=True
+            )
+        thread.start()
+        return True
+
+    def delete(self, bulk: BulkJob):
+        with self._lock:
+            stopped = self._stopped.pop(bulk.id, None)
+            thread = self._threads.pop(bulk.id, None)
+        if stopped is not None:
+            stopped.set()
+        if thread is not None:
+            thread.join()
+        shutil.rmtree(bulk.directory, ignore_errors=True)
+
+    def _run(self, bulk: BulkJob, stopped: threading.Event):
+        inflight: Dict[Future, Dict[str, Any]] = {}
+        error: Optional[Exception] = None
+        try:
+            self._convert_items(bulk, stopped, inflight)
+        except Exception as e:
+            error = e
+            print(f"Bulk job {bulk.id} stopped: {e}")
+        finally:
+            # Nobody will record these any more; drop their jobs rather than leave them running
+            for future in inflight:
+                future.cancel()
+        if stopped.is_set():
+            return
+        # Always end with a terminal line, so followers know the run is over
+        line: Dict[str, Any] = {"status": "complete" if error is None else "error", **bulk.summary()}
+        if error is not None:
+            line["error"] = str(error)
+        try:
+            bulk.append_status(line)
+        except OSError as e:
+            print(f"Failed to record the end of bulk job {bulk.id}: {e}")
+
+    def _convert_items(self, bulk: BulkJob, stopped: threading.Event, inflight: Dict[Future, Dict[str, Any]]):
+        finished = bulk.finished_names()
+        pending = [item for item in bulk.items if item["name"] not in finished]
+        extension = bulk.params.get("output_format", "glb")
+        bulk.meshes_dir.mkdir(parents=True, exist_ok=True)
+
+        def finish(future: Future, item: Dict[str, Any]):
+            line: Dict[str, Any] = {"name": item["name"], "seconds": round(time.time() - item["started"], 3)}
+            try:
+                data = future.result()
+                path = bulk.meshes_dir / f"{item['name']}.{extension}"
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except Exception as e:
+                # Conversion or writing the mesh (e.g. a full disk) failed; only this item fails
+                line.update(status="failed", error=str(e))
+            else:
+                line.update(status="done", file=f"meshes/{path.name}", bytes=len(data))
+            bulk.append_status(line)
+
+        while (pending or inflight) and not stopped.is_set():
+            while pending and len(inflight) < self.window:
+                item = dict(pending.pop(0), started=time.time())
+                try:
+                    contents = Path(item["path"]).read_bytes()
+                    future = self.convert(contents, bulk.params, stopped.is_set)
+                except Exception as e:
+                    future = Future()
+                    future.set_exception(e)
+                inflight[future] = item
+
+            done, _ = wait(list(inflight), timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future, inflight.pop(future))
+
+
+async def follow_status(bulk: BulkJob, runner: BulkRunner, offset: int = 0, interval: float = 0.5) -> AsyncIterator[bytes]:
+    """NDJSON status lines from ``offset`` on, following the file until the bulk job is complete"""
+    while True:
+        lines = await asyncio.to_thread(bulk.status_lines)
+        for line in lines[offset:]:
+            yield (json.dumps(line) + "\n").encode()
+        offset = max(offset, len(lines))
+        if any(line.get("status") == "complete" for line in lines) or not runner.running(bulk.id):
+            return
+        await asyncio.sleep(interval)
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only sink that hands out what has been written so far"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def follow_meshes(bulk: BulkJob, runner: BulkRunner, offset: int = 0, interval: float = 0.5) -> AsyncIterator[bytes]:
+    """A streamed tar of finished meshes, in completion order from the ``offset``-th one, as they appear"""
+    sink = _Chunks()
+    tar = tarfile.open(fileobj=sink, mode="w|")
+
+    def add(line: Dict[str, Any]) -> bytes:
+        path = bulk.directory / line["file"]
+        info = tarfile.TarInfo(line["file"])
+        info.size = path.stat().st_size
+        info.mtime = int(path.stat().st_mtime)
+        with open(path, "rb") as f:
+            tar.addfile(info, f)
+        return sink.drain()
+
+    sent = 0
+    while True:
+        lines = await asyncio.to_thread(bulk.status_lines)
+        finished = [line for line in lines if line.get("status") == "done"]
+        for line in finished[max(offset, sent):]:
+            yield await asyncio.to_thread(add, line)
+        sent = max(offset, len(finished))
+        if any(line.get("status") == "complete" for line in lines) or not runner.running(bulk.id):
+            break
+        await asyncio.sleep(interval)
+    tar.close()
+    yield sink.drain()
@@ -6,6 +6,7 @@ import { cn } from '@/lib/utils';
 import * as THREE from 'three';
 import { OrbitControls } from 'three/examples/jsm/controls/OrbitControls.js';
 import { GLTFLoader } from 'three/examples/jsm/loaders/GLTFLoader.js';
+import { MeshoptDecoder } from 'three/examples/jsm/libs/meshopt_decoder.module.js';
 import { useWebSocket } from '@/lib/hooks/use-websocket';
 import { use3DControls } from '@/lib/hooks/use-3d-controls';
 import { VapiChat } from '@/components/vapi/vapi-chat';
@@ -228,8 +229,9 @@ export function Product3DViewer({ product, className }: Product3DViewerProps) {
     controls.enableZoom = true;
     controls.enablePan = true;
 
-    // Create loader
+    // Create loader (meshopt decoder handles GLBs exported with compress=true)
     const loader = new GLTFLoader();
+    loader.setMeshoptDecoder(MeshoptDecoder);
 
     sceneRef.current = {
       scene,
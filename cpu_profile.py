@@ -0,0 +1,208 @@
+"""
+CPU inference profile: thread counts, core pinning, bf16 autocast and
+compilation for the TripoSG denoiser and BriaRMBG, int8 dynamic quantization
+for the denoiser, and TorchScript tracing for RMBG
+"""
+import functools
+import os
+import tempfile
+from typing import Any, List, Optional, Tuple
+
+import torch
+
+# Presets for TRIPOSG_CPU_PROFILE; individual TRIPOSG_CPU_* variables override them
+PROFILES = {
+    "fp32": {"bf16": False, "quantize": False},
+    "bf16": {"bf16": True, "quantize": False},
+    "int8": {"bf16": False, "quantize": True},
+}
+
+COMPILE_MODES = ("none", "compile", "trace")
+
+# Lock files are kept open for the life of the process to hold a core slot
+_slot_locks: List[Any] = []
+
+
+def bf16_supported() -> bool:
+    """Whether this CPU has native bf16 matmuls (AVX512-BF16 or AMX); emulated bf16 is slower than fp32"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def parse_cores(spec: str) -> List[int]:
+    """Parse a core list like ``0-3,8,10-11``"""
+    cores: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cores.extend(range(int(first), int(last or first) + 1))
+    return cores
+
+
+def claim_slot(slots: int) -> Optional[int]:
+    """Claim one of ``slots`` core partitions for this process, or None if all are taken.
+
+    Slots are held with advisory file locks, so independent worker processes
+    (e.g. ``uvicorn --workers``) each get a distinct partition without any
+    coordination, and a slot frees up when its process exits.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    for slot in range(slots):
+        lock = open(os.path.join(tempfile.gettempdir(), f"triposg-cpu-slot-{slot}.lock"), "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        _slot_locks.append(lock)
+        return slot
+    return None
+
+
+def autocast_forward(module: torch.nn.Module, dtype: torch.dtype = torch.bfloat16):
+    """Run ``module``'s forward under CPU autocast"""
+    forward = module.forward
+
+    @functools.wraps(forward)
+    def wrapped(*args, **kwargs):
+        with torch.autocast("cpu", dtype=dtype):
+            return forward(*args, **kwargs)
+
+    module.forward = wrapped
+
+
+def quantize_linear(module: torch.nn.Module) -> torch.nn.Module:
+    """Dynamic int8 quantization of every ``nn.Linear``, in place"""
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class CPUProfile:
+    """How TripoSG and BriaRMBG run on CPU.
+
+    ``threads``/``interop_threads`` set torch's thread pools (None keeps the
+    defaults). ``cores`` pins the process to a core list, or with ``"auto"``
+    to one of ``slots`` equal partitions of the available cores. ``bf16``
+    autocasts the denoiser and RMBG when the CPU supports bf16 natively.
+    ``quantize`` applies int8 dynamic quantization to the denoiser's linear
+    layers instead; BriaRMBG is convolutional, with no ``nn.Linear`` to
+    quantize, so it stays fp32. ``compile`` is ``none``, ``compile``
+    (torch.compile, both models) or ``trace`` (TorchScript-traced and frozen
+    RMBG only: the denoiser's inputs change shape with batch size and
+    guidance, which a trace would freeze).
+    """
+
+    def __init__(
+        self,
+        threads: Optional[int] = None,
+        interop_threads: Optional[int] = None,
+        cores: str = "",
+        slots: int = 1,
+        bf16: bool = False,
+        quantize: bool = False,
+        compile: str = "none",
+    ):
+        if compile not in COMPILE_MODES:
+            raise ValueError(f"compile must be one of {', '.join(COMPILE_MODES)}")
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.cores = cores
+        self.slots = slots
+        self.bf16 = bf16
+        self.quantize = quantize
+        self.compile = compile
+
+    @classmethod
+    def from_env(cls) -> "CPUProfile":
+        name = os.environ.get("TRIPOSG_CPU_PROFILE", "fp32")
+        if name not in PROFILES:
+            raise ValueError(f"Unknown TRIPOSG_CPU_PROFILE {name!r}; expected one of {', '.join(PROFILES)}")
+        preset = PROFILES[name]
+
+        def flag(var: str, default: bool) -> bool:
+            value = os.environ.get(var)
+            return default if value is None else value == "1"
+
+        def number(var: str) -> Optional[int]:
+            value = os.environ.get(var)
+            return int(value) if value else None
+
+        return cls(
+            threads=number("TRIPOSG_CPU_THREADS"),
+            interop_threads=number("TRIPOSG_CPU_INTEROP_THREADS"),
+            cores=os.environ.get("TRIPOSG_CPU_CORES", ""),
+            slots=int(os.environ.get("TRIPOSG_CPU_SLOTS", "1")),
+            bf16=flag("TRIPOSG_CPU_BF16", preset["bf16"]),
+            quantize=flag("TRIPOSG_CPU_QUANTIZE", preset["quantize"]),
+            compile=os.environ.get("TRIPOSG_CPU_COMPILE", "none"),
+        )
+
+    def describe(self) -> str:
+        parts = ["int8 denoiser" if self.quantize else "bf16" if self.bf16 else "fp32"]
+        if self.compile != "none":
+            parts.append("traced RMBG" if self.compile == "trace" else self.compile)
+        parts.append(f"{torch.get_num_threads()} threads")
+        if hasattr(os, "sched_getaffinity"):
+            parts.append(f"{len(os.sched_getaffinity(0))} cores")
+        return ", ".join(parts)
+
+    def configure_process(self):
+        """Pin cores and size the thread pools for the current process"""
+        cores: List[int] = []
+        if self.cores and hasattr(os, "sched_setaffinity"):
+            if self.cores == "auto":
+                available = sorted(os.sched_getaffinity(0))
+                slot = claim_slot(self.slots) if self.slots > 1 else None
+                if slot is not None:
+                    per_slot = max(1, len(available) // self.slots)
+                    cores = available[slot * per_slot:(slot + 1) * per_slot]
+            else:
+                cores = parse_cores(self.cores)
+            if cores:
+                os.sched_setaffinity(0, cores)
+
+        threads = self.threads or (len(cores) if cores else None)
+        if threads:
+            torch.set_num_threads(threads)
+        if self.interop_threads:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                # Only allowed before any inter-op parallel work has started
+                print(f"Could not set inter-op threads: {e}")
+
+    def apply(self, pipe: Any, rmbg: torch.nn.Module) -> Tuple[Any, torch.nn.Module]:
+        """Configure the process and optimize the denoiser and RMBG; returns the (possibly wrapped) models"""
+        self.configure_process()
+        denoiser = getattr(pipe, "transformer", None)
+        modules = [m for m in (denoiser, rmbg) if isinstance(m, torch.nn.Module)]
+
+        if self.quantize:
+            # Quantized linears take fp32 activations, so this replaces bf16 autocast.
+            # Only the denoiser has linear layers; RMBG would come back unchanged.
+            if isinstance(denoiser, torch.nn.Module):
+                quantize_linear(denoiser)
+        elif self.bf16:
+            if bf16_supported():
+                for module in modules:
+                    autocast_forward(module)
+            else:
+                print("bf16 requested but this CPU has no native bf16 support; staying in fp32")
+
+        if self.compile == "compile":
+            if denoiser is not None:
+                pipe.transformer = torch.compile(denoiser)
+            rmbg = torch.compile(rmbg)
+        elif self.compile == "trace":
+            example = torch.zeros(1, 3, 1024, 1024)
+            with torch.no_grad():
+                rmbg = torch.jit.freeze(torch.jit.trace(rmbg.eval(), example, strict=False))
+
+        print(f"CPU profile: {self.describe()}")
+        return pipe, rmbg
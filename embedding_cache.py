@@ -0,0 +1,177 @@
+"""
+Cache of segmented images and image-conditioning embeddings, so re-running
+the same photo with a different seed or guidance scale skips RMBG and the
+image encoder and goes straight to denoising
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+Entry = Tuple[torch.Tensor, ...]
+
+
+def image_key(image: Union[Image.Image, np.ndarray], *params: Any) -> str:
+    """Hash of the pixels (plus any parameters that change the result)"""
+    array = np.ascontiguousarray(np.asarray(image))
+    h = hashlib.sha256()
+    h.update(repr((array.shape, array.dtype.str, params)).encode())
+    h.update(array.data)
+    return h.hexdigest()
+
+
+def _nbytes(value: Entry) -> int:
+    return sum(t.numel() * t.element_size() for t in value)
+
+
+class EmbeddingCache:
+    """LRU of small tensor tuples, bounded by ``max_bytes``.
+
+    Entries evicted from memory are written to ``spill_dir`` (when set),
+    which is itself trimmed to ``spill_max_bytes``, oldest first. Every
+    entry remembers how long it took to compute, so each hit adds that
+    to the ``saved_seconds`` of its kind.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 ** 2, spill_dir: Optional[str] = None, spill_max_bytes: int = 2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.spill_max_bytes = spill_max_bytes
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # (kind, key) -> (value, seconds to compute)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Entry, float]]" = OrderedDict()
+        self._bytes = 0
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _count(self, kind: str, name: str, value: float = 1):
+        stats = self._stats.setdefault(kind, {"hits": 0, "misses": 0, "saved_seconds": 0.0})
+        stats[name] += value
+
+    def _spill_path(self, kind: str, key: str) -> Path:
+        return self.spill_dir / f"{kind}-{key}.pt"
+
+    def get(self, kind: str, key: str) -> Optional[Entry]:
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries.move_to_end((kind, key))
+        if entry is None and self.spill_dir is not None:
+            entry = self._load_spilled(kind, key)
+            if entry is not None:
+                self._insert(kind, key, *entry)
+
+        with self._lock:
+            if entry is None:
+                self._count(kind, "misses")
+                return None
+            self._count(kind, "hits")
+            self._count(kind, "saved_seconds", entry[1])
+        return entry[0]
+
+    def put(self, kind: str, key: str, value: Entry, seconds: float):
+        """Store ``value`` (moved to the CPU) along with the ``seconds`` it took to compute"""
+        if not self.enabled:
+            return
+        self._insert(kind, key, tuple(t.detach().cpu() for t in value), seconds)
+
+    def _insert(self, kind: str, key: str, value: Entry, seconds: float):
+        evicted = []
+        with self._lock:
+            old = self._entries.pop((kind, key), None)
+            if old is not None:
+                self._bytes -= _nbytes(old[0])
+            self._entries[(kind, key)] = (value, seconds)
+            self._bytes += _nbytes(value)
+            while self._entries and self._bytes > self.max_bytes:
+                (old_kind, old_key), old = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(old[0])
+                evicted.append((old_kind, old_key, old))
+        if self.spill_dir is not None:
+            for old_kind, old_key, (old_value, old_seconds) in evicted:
+                self._spill(old_kind, old_key, old_value, old_seconds)
+
+    def _spill(self, kind: str, key: str, value: Entry, seconds: float):
+        path = self._spill_path(kind, key)
+        tmp = path.with_suffix(".tmp")
+        try:
+            torch.save({"value": list(value), "seconds": seconds}, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"Failed to spill {kind} embedding: {e}")
+            return
+        files = sorted(self.spill_dir.glob("*.pt"), key=lambda p: p.stat().st_mtime)
+        total = sum(p.stat().st_size for p in files)
+        for old in files:
+            if total <= self.spill_max_bytes:
+                break
+            total -= old.stat().st_size
+            old.unlink(missing_ok=True)
+
+    def _load_spilled(self, kind: str, key: str) -> Optional[Tuple[Entry, float]]:
+        path = self._spill_path(kind, key)
+        try:
+            data = torch.load(path, weights_only=True)
+        except (OSError, RuntimeError, EOFError):
+            return None
+        path.unlink(missing_ok=True)  # Back in memory; re-spilled if evicted again
+        return tuple(data["value"]), float(data["seconds"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {kind: dict(values) for kind, values in self._stats.items()}
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        return stats
+
+
+def cache_image_encoder(pipe: Any, cache: EmbeddingCache) -> bool:
+    """Route ``pipe.encode_image`` through ``cache``, one entry per image.
+
+    Only images that miss are encoded (together, in one call); cached
+    embeddings are moved back to the pipeline's device and concatenated in
+    order. Returns False if the pipeline has no ``encode_image``.
+    """
+    encode_image = getattr(pipe, "encode_image", None)
+    if encode_image is None or not cache.enabled:
+        return False
+
+    @functools.wraps(encode_image)
+    def cached_encode_image(image: Any, device: Any, num_images_per_prompt: int, *args, **kwargs):
+        images: List[Any] = image if isinstance(image, list) else [image]
+        if not all(isinstance(im, (Image.Image, np.ndarray)) for im in images):
+            return encode_image(image, device, num_images_per_prompt, *args, **kwargs)
+
+        keys = [image_key(im) for im in images]
+        entries: List[Optional[Entry]] = [cache.get("encoder", key) for key in keys]
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        if missing:
+            t0 = time.perf_counter()
+            embeds, uncond = encode_image([images[i] for i in missing], device, 1, *args, **kwargs)
+            seconds = (time.perf_counter() - t0) / len(missing)
+            for j, i in enumerate(missing):
+                entries[i] = (embeds[j:j + 1], uncond[j:j + 1])
+                cache.put("encoder", keys[i], entries[i], seconds)
+
+        image_embeds = torch.cat([entry[0].to(device) for entry in entries])
+        uncond_embeds = torch.cat([entry[1].to(device) for entry in entries])
+        return (
+            image_embeds.repeat_interleave(num_images_per_prompt, dim=0),
+            uncond_embeds.repeat_interleave(num_images_per_prompt, dim=0),
+        )
+
+    pipe.encode_image = cached_encode_image
+    return True
@@ -1,29 +1,449 @@
+import asyncio
+import hashlib
+import json
 import os
 import sys
 import tempfile
-import uuid
-import io
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import torch
 import trimesh
 import numpy as np
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-# Add TripoSG to path
-sys.path.append(os.path.join(os.path.dirname(__file__), "TripoSG"))
+from admission import AdmissionController, AdmissionMiddleware, BodySizeLimitMiddleware
+from artifact_store import ArtifactStore
+from job_queue import DeadlineExceededError, Job, JobCancelledError, JobQueue, QueueFullError
+from mesh_cache import MeshCache
+from mesh_export import MEDIA_TYPES
+from mesh_postprocess import WELD_TOLERANCE, clean_mesh, to_trimesh
+from mesh_simplify import MERGE_PERCENT, decimate, parse_lods
+from bulk import BulkRunner, follow_meshes, follow_status, is_image_name
+from embedding_cache import cache_image_encoder
+from metrics import server_timing
+from model_host import ModelHostClient
+from postprocess_pool import PostprocessPool, spawn_from_worker_module
+from profiling import ProfileSampler, RequestProfiler, TraceStore, stage as profile_stage
+from samplers import can_skip_guidance, resolve_sampling
+from segmentation import SegmentationWorker
 
-from triposg.pipelines.pipeline_triposg import TripoSGPipeline
-from TripoSG.scripts.image_process import prepare_image
-from TripoSG.scripts.briarmbg import BriaRMBG
+from image_preprocess import decode_image, synthetic_image
+import inference
+from inference import (
+    BATCH_WAIT_MS, MAX_BATCH_SIZE, WARMUP_RUNS, WARMUP_STEPS, batch_key, device, generate_samples, load_models,
+    make_embedding_cache, metrics, start_segmentation_worker,
+)
 
 app = FastAPI(title="TripoSG API", version="1.0.0")
 
-# Add CORS middleware
+# Global variables for models
+pipe = None
+rmbg_net = None
+model_host: Optional[ModelHostClient] = None
+segmentation_worker: Optional[SegmentationWorker] = None
+# Whether the pipeline (here or on the model host) can drop guidance partway through a run
+guidance_skipping = False
+
+# Maximum number of jobs waiting for the inference worker
+JOB_QUEUE_SIZE = int(os.environ.get("TRIPOSG_JOB_QUEUE_SIZE", "16"))
+
+# Uploads larger than this are downscaled while decoding
+MAX_INPUT_SIZE = int(os.environ.get("TRIPOSG_MAX_INPUT_SIZE", "1024"))
+
+# Generated meshes are cached on disk, keyed by image bytes and parameters
+CACHE_DIR = os.environ.get("TRIPOSG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "triposg_mesh_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("TRIPOSG_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CACHE_MAX_ENTRIES = int(os.environ.get("TRIPOSG_CACHE_MAX_ENTRIES", "1000"))
+
+# Exported meshes are kept here, indexed in SQLite and served from /artifacts; the least
+# recently served files are removed past ARTIFACT_MAX_BYTES (0 disables the store)
+ARTIFACT_DIR = os.environ.get("TRIPOSG_ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "triposg_artifacts"))
+ARTIFACT_MAX_BYTES = int(os.environ.get("TRIPOSG_ARTIFACT_MAX_BYTES", str(10 * 1024 ** 3)))
+
+# Worker processes for decimation and export (0 runs them inline)
+POSTPROCESS_WORKERS = int(os.environ.get("TRIPOSG_POSTPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Drop connected pieces smaller than this fraction of the largest one (0 keeps everything)
+MIN_COMPONENT_FRACTION = float(os.environ.get("TRIPOSG_MIN_COMPONENT_FRACTION", "0"))
+
+# Allow /convert?profile=true, and profile one in every PROFILE_EVERY requests regardless (0 for never)
+PROFILING = os.environ.get("TRIPOSG_PROFILING", "0") == "1"
+PROFILE_EVERY = int(os.environ.get("TRIPOSG_PROFILE_EVERY", "0"))
+
+# Where profiles are kept (oldest removed past either limit), and the Python sampling interval
+PROFILE_DIR = os.environ.get("TRIPOSG_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "triposg_profiles"))
+PROFILE_MAX_JOBS = int(os.environ.get("TRIPOSG_PROFILE_MAX_JOBS", "50"))
+PROFILE_MAX_BYTES = int(os.environ.get("TRIPOSG_PROFILE_MAX_BYTES", str(512 * 1024 ** 2)))
+PROFILE_INTERVAL_MS = float(os.environ.get("TRIPOSG_PROFILE_INTERVAL_MS", "5"))
+
+# Attach per-stage timings to /convert responses as a Server-Timing header
+SERVER_TIMING = os.environ.get("TRIPOSG_SERVER_TIMING", "1") == "1"
+
+# Progressive jobs first run a quick preview with fewer steps, decimated to this many faces
+PREVIEW_STEPS = int(os.environ.get("TRIPOSG_PREVIEW_STEPS", "10"))
+PREVIEW_FACES = int(os.environ.get("TRIPOSG_PREVIEW_FACES", "20000"))
+
+# How often /jobs/{id}/events checks for progress
+EVENTS_INTERVAL = float(os.environ.get("TRIPOSG_EVENTS_INTERVAL", "0.25"))
+
+# Largest request body accepted outside /bulk; bigger uploads are cut off while streaming in
+MAX_UPLOAD_BYTES = int(os.environ.get("TRIPOSG_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# /convert and POST /jobs requests handled at once, and how many more may wait before getting 429
+MAX_ACTIVE_REQUESTS = int(os.environ.get("TRIPOSG_MAX_ACTIVE_REQUESTS", str(JOB_QUEUE_SIZE)))
+MAX_WAITING_REQUESTS = int(os.environ.get("TRIPOSG_MAX_WAITING_REQUESTS", str(JOB_QUEUE_SIZE)))
+
+# Default seconds a request may take before its job is cancelled (0 for no deadline)
+REQUEST_TIMEOUT = float(os.environ.get("TRIPOSG_REQUEST_TIMEOUT", "600"))
+
+# How often /convert checks whether its client is still connected, in seconds
+DISCONNECT_POLL = float(os.environ.get("TRIPOSG_DISCONNECT_POLL", "0.5"))
+
+# Bulk conversions are spooled here; at most BULK_WINDOW images per bulk job are in flight
+BULK_DIR = os.environ.get("TRIPOSG_BULK_DIR", os.path.join(tempfile.gettempdir(), "triposg_bulk"))
+BULK_WINDOW = int(os.environ.get("TRIPOSG_BULK_WINDOW", str(2 * MAX_BATCH_SIZE)))
+# Seconds a bulk image waits for queue space (or for warm-up) before it is failed
+BULK_SUBMIT_TIMEOUT = float(os.environ.get("TRIPOSG_BULK_SUBMIT_TIMEOUT", "600"))
+
+# Directory that /bulk manifests may reference by local path (manifests are disabled when unset)
+BULK_ROOT = os.environ.get("TRIPOSG_BULK_ROOT", "")
+
+# Address of a shared model host (model_host.py). When set, this process loads
+# no weights and sends inference to the host, so several HTTP workers share one copy
+MODEL_HOST = os.environ.get("TRIPOSG_MODEL_HOST", "")
+
+# uvicorn worker processes when run as a script; more than one starts a model host
+HTTP_WORKERS = int(os.environ.get("TRIPOSG_HTTP_WORKERS", "1"))
+PORT = int(os.environ.get("TRIPOSG_PORT", "8001"))
+
+# Serve with the CPU stub models from triposg_stub.py (no weights needed)
+STUB_MODELS = os.environ.get("TRIPOSG_STUB_MODELS", "0") == "1"
+
+# Cold-start progress: starting -> warming_up -> ready (or failed), with per-phase seconds
+startup: Dict[str, Any] = {"status": "starting", "phases": {}, "error": None}
+
+
+def warmup(runs: int, steps: int):
+    """Run a synthetic image through every stage so the first request doesn't pay for lazy initialization"""
+    image = synthetic_image()
+    for i in range(runs):
+        if model_host is not None:
+            vertices, faces = model_host.generate(image, i, steps, 7.0).result()
+        else:
+            (vertices, faces), = generate_samples(pipe, [image], rmbg_net, [i], num_inference_steps=steps)
+        # One task per worker, so every post-processing process is spawned and has imported its modules
+        futures = [
+            postprocess_pool.simplify(vertices, faces, n_faces=len(faces) // 2)
+            for _ in range(max(1, postprocess_pool.workers))
+        ]
+        levels = futures[0].result()
+        for future in futures[1:]:
+            future.result()
+        postprocess_pool.export(levels, "glb").result()
+
+
+def initialize():
+    """Load models, warm up and start the inference worker; readiness is reported once this finishes"""
+    global pipe, rmbg_net, model_host, segmentation_worker, guidance_skipping
+    
+    t_start = time.perf_counter()
+    phases = startup["phases"]
+    try:
+        if MODEL_HOST:
+            print(f"Connecting to model host at {MODEL_HOST}...")
+            client = ModelHostClient(MODEL_HOST)
+            client.connect()
+            model_host = client
+            guidance_skipping = client.info.get("guidance_skipping", False)
+            phases["connect_model_host"] = time.perf_counter() - t_start
+        else:
+            print("Loading models...")
+            pipe, rmbg_net = load_models(stub=STUB_MODELS, timings=phases)
+            guidance_skipping = can_skip_guidance(pipe)
+            print(f"Models loaded successfully on {device}")
+        
+        if WARMUP_RUNS > 0:
+            startup["status"] = "warming_up"
+            t0 = time.perf_counter()
+            warmup(WARMUP_RUNS, WARMUP_STEPS)
+            phases["warmup"] = time.perf_counter() - t0
+            metrics.reset_stages()
+        
+        # After warmup, so warmup runs the real encoder and its images aren't cached
+        if pipe is not None:
+            cache_image_encoder(pipe, embedding_cache)
+        segmentation_worker = start_segmentation_worker(rmbg_net, embedding_cache)
+        job_queue.start()
+        phases["total"] = time.perf_counter() - t_start
+    except Exception as e:
+        startup["status"] = "failed"
+        startup["error"] = str(e)
+        print(f"Startup failed: {e}")
+        raise
+    
+    for phase in phases:
+        metrics.gauge(
+            f"cold_start_{phase}_seconds", f"Cold start time spent in {phase}", lambda phase=phase: phases[phase]
+        )
+    startup["status"] = "ready"
+    print("Ready: " + ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in phases.items()))
+
+
+@app.on_event("startup")
+async def startup_event():
+    # Load in the background so the liveness probe answers while models load
+    threading.Thread(target=initialize, name="model-startup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    job_queue.stop()
+    if segmentation_worker is not None:
+        segmentation_worker.stop()
+    postprocess_pool.shutdown()
+    if model_host is not None:
+        model_host.close()
+    if artifact_store is not None:
+        artifact_store.close()
+
+
+def run_triposg_batch(
+    pipe: Any,
+    images: List[Union[Image.Image, np.ndarray]],
+    rmbg_net: Any,
+    seeds: List[int],
+    num_inference_steps: int = 50,
+    guidance_scale: float = 7.0,
+    faces: Optional[List[int]] = None,
+    progress: Optional[Callable[..., None]] = None,
+    scheduler: str = "default",
+    guidance_cutoff: float = 1.0,
+) -> List[trimesh.Trimesh]:
+    """Run TripoSG inference on several images and build (optionally simplified) meshes inline"""
+    faces = faces or [-1] * len(images)
+    samples = generate_samples(
+        pipe, images, rmbg_net, seeds, num_inference_steps, guidance_scale, progress,
+        scheduler=scheduler, guidance_cutoff=guidance_cutoff,
+    )
+    
+    meshes = []
+    for sample, n_faces in zip(samples, faces):
+        if isinstance(sample, Exception):
+            raise sample
+        vertices, mesh_faces = sample
+        # Create mesh
+        if progress is not None:
+            progress("meshing")
+        vertices, mesh_faces = clean_mesh(vertices, mesh_faces, min_component_fraction=MIN_COMPONENT_FRACTION)
+        
+        # Optionally simplify mesh
+        if n_faces > 0 and len(mesh_faces) > n_faces:
+            if progress is not None:
+                progress("simplifying")
+            vertices, mesh_faces = decimate(vertices, mesh_faces, n_faces)
+        meshes.append(to_trimesh(vertices, mesh_faces))
+    
+    return meshes
+
+
+def run_triposg(
+    pipe: Any,
+    image: Union[Image.Image, np.ndarray],
+    rmbg_net: Any,
+    seed: int = 42,
+    num_inference_steps: int = 50,
+    guidance_scale: float = 7.0,
+    faces: int = -1,
+    progress: Optional[Callable[..., None]] = None,
+    scheduler: str = "default",
+    guidance_cutoff: float = 1.0,
+) -> trimesh.Trimesh:
+    """Run TripoSG inference"""
+    return run_triposg_batch(
+        pipe=pipe,
+        images=[image],
+        rmbg_net=rmbg_net,
+        seeds=[seed],
+        num_inference_steps=num_inference_steps,
+        guidance_scale=guidance_scale,
+        faces=[faces],
+        progress=progress,
+        scheduler=scheduler,
+        guidance_cutoff=guidance_cutoff,
+    )[0]
+
+
+def process_jobs(jobs: List[Job]) -> List[Future]:
+    """Run a batch of queued jobs on the inference worker thread.
+    
+    Only diffusion runs here. Decimation (or the LOD chain) is handed to
+    the post-processing pool, so the next batch can start while this one is
+    still being simplified. Each job resolves to a list of meshes: a single
+    mesh, or one per requested LOD level.
+    """
+    
+    def progress(stage: str, step: int = 0, total_steps: int = 0):
+        for job in jobs:
+            job.set_stage(stage, step, total_steps)
+    
+    for job in jobs:
+        metrics.observe("queue_wait", job.started_at - job.created_at, job.timings)
+    if model_host is not None:
+        return [process_remote_job(job) for job in jobs]
+    if len(jobs) == 1 and jobs[0].params.get("profile"):
+        return [process_profiled_job(jobs[0])]
+    metrics.inc("batches_total")
+    metrics.inc("batched_jobs_total", len(jobs))
+    
+    timings: Dict[str, float] = {}
+    samples = generate_samples(
+        pipe=pipe,
+        images=[job.payload for job in jobs],
+        rmbg_net=rmbg_net,
+        seeds=[job.params["seed"] for job in jobs],
+        num_inference_steps=jobs[0].params["num_inference_steps"],
+        guidance_scale=jobs[0].params["guidance_scale"],
+        progress=progress,
+        timings=timings,
+        cancelled=lambda: job_queue.expire(jobs),
+        cache=embedding_cache,
+        scheduler=jobs[0].params.get("scheduler", "default"),
+        guidance_cutoff=jobs[0].params.get("guidance_cutoff", 1.0),
+    )
+    
+    futures = []
+    for job, sample in zip(jobs, samples):
+        if isinstance(sample, Exception):
+            # This job's image couldn't be prepared; the rest of the batch went ahead
+            futures.append(sample)
+            continue
+        vertices, faces = sample
+        job.timings.update(timings)
+        futures.append(postprocess_pool.simplify(
+            vertices, faces, n_faces=job.params["faces"], lods=job.params["lods"], timings=job.timings
+        ))
+    return futures
+
+
+def process_profiled_job(job: Job) -> List[trimesh.Trimesh]:
+    """Run one job under a ``RequestProfiler`` and save its traces under the job id.
+    
+    torch.profiler has to stop on the thread it started on, so meshing and
+    export run inline here instead of in the post-processing pool; the
+    exported file is left in ``job.output`` for the response.
+    """
+    profiler = RequestProfiler(f"job {job.id}", interval=PROFILE_INTERVAL_MS / 1000)
+    metrics.inc("jobs_profiled_total")
+    params = job.params
+    try:
+        with profiler:
+            (vertices, faces), = generate_samples(
+                pipe=pipe,
+                images=[job.payload],
+                rmbg_net=rmbg_net,
+                seeds=[params["seed"]],
+                num_inference_steps=params["num_inference_steps"],
+                guidance_scale=params["guidance_scale"],
+                progress=job.set_stage,
+                timings=job.timings,
+                cancelled=lambda: job_queue.expire([job]),
+                cache=embedding_cache,
+                profiler=profiler,
+                scheduler=params.get("scheduler", "default"),
+                guidance_cutoff=params.get("guidance_cutoff", 1.0),
+            )
+            with profile_stage(profiler, "meshing"):
+                levels = postprocess_pool.simplify(
+                    vertices, faces, n_faces=params["faces"], lods=params["lods"], timings=job.timings, inline=True
+                ).result()
+            with profile_stage(profiler, "export"), metrics.timed("export", job.timings):
+                job.output = postprocess_pool.export(
+                    levels,
+                    params["output_format"],
+                    quantize=params["quantize"],
+                    compress=params["compress"],
+                    names=[f"LOD{i}" for i in range(len(levels))],
+                    inline=True,
+                ).result()
+    finally:
+        # Failed and cancelled runs are often the interesting ones
+        try:
+            trace_store.save(job.id, profiler)
+        except Exception as e:
+            print(f"Failed to save profile for job {job.id}: {e}")
+    return levels
+
+
+def process_remote_job(job: Job) -> Future:
+    """Send a job to the model host and post-process its samples here.
+    
+    The host batches requests from every HTTP worker, so jobs are sent as
+    soon as they are dequeued rather than batched locally.
+    """
+    result: Future = Future()
+    host_timings: Dict[str, float] = {}
+    
+    def simplified(done: Future):
+        if done.exception() is not None:
+            result.set_exception(done.exception())
+        else:
+            result.set_result(done.result())
+    
+    def generated(done: Future):
+        if done.cancelled():
+            result.cancel()
+            return
+        if done.exception() is not None:
+            result.set_exception(done.exception())
+            return
+        for stage, seconds in host_timings.items():
+            metrics.observe(stage, seconds, job.timings)
+        vertices, faces = done.result()
+        postprocess_pool.simplify(
+            vertices, faces, n_faces=job.params["faces"], lods=job.params["lods"], timings=job.timings
+        ).add_done_callback(simplified)
+    
+    host_future = model_host.generate(
+        job.payload,
+        job.params["seed"],
+        job.params["num_inference_steps"],
+        job.params["guidance_scale"],
+        progress=job.set_stage,
+        timings=host_timings,
+        scheduler=job.params.get("scheduler", "default"),
+        guidance_cutoff=job.params.get("guidance_cutoff", 1.0),
+        deadline=job.deadline,
+    )
+    # A job cancelled (or expired) here stops denoising on the host too
+    job.future.add_done_callback(lambda done: host_future.cancel())
+    host_future.add_done_callback(generated)
+    return result
+
+
+job_queue = JobQueue(
+    handler=process_jobs,
+    maxsize=JOB_QUEUE_SIZE,
+    max_batch_size=1 if MODEL_HOST else MAX_BATCH_SIZE,
+    max_wait=0.0 if MODEL_HOST else BATCH_WAIT_MS / 1000,
+    batch_key=batch_key,
+)
+
+admission = AdmissionController(
+    max_active=MAX_ACTIVE_REQUESTS,
+    max_waiting=MAX_WAITING_REQUESTS,
+    parallelism=MAX_BATCH_SIZE,
+    metrics=metrics,
+)
+app.add_middleware(AdmissionMiddleware, controller=admission, paths=["/convert", "/jobs"])
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, exempt=["/bulk"])
+
+# Add CORS middleware last, so it is outermost and the 429 and 413 responses above get its headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,193 +452,931 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for models
-pipe = None
-rmbg_net = None
-device = "cuda" if torch.cuda.is_available() else "cpu"
-dtype = torch.float16 if device == "cuda" else torch.float32
+mesh_cache = MeshCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES)
 
+artifact_store = ArtifactStore(ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES) if ARTIFACT_MAX_BYTES > 0 else None
 
-@app.on_event("startup")
-async def startup_event():
-    global pipe, rmbg_net
+profile_sampler = ProfileSampler(allow_requests=PROFILING, every=PROFILE_EVERY)
+trace_store = TraceStore(PROFILE_DIR, max_jobs=PROFILE_MAX_JOBS, max_bytes=PROFILE_MAX_BYTES)
+
+embedding_cache = make_embedding_cache()
+
+postprocess_pool = PostprocessPool(
+    workers=POSTPROCESS_WORKERS, metrics=metrics, min_component_fraction=MIN_COMPONENT_FRACTION
+)
+
+def convert_bulk_item(contents: bytes, params: Dict[str, Any], stopped: Callable[[], bool] = lambda: False) -> Future:
+    """Queue one bulk image through the batched path; resolves to the encoded mesh.
+    
+    Cancelling the returned future releases the job (cancelling it unless
+    another request shares it). Waiting for queue space ends once ``stopped()``.
+    """
+    image = decode_image(contents, max_size=MAX_INPUT_SIZE)
+    give_up = time.monotonic() + BULK_SUBMIT_TIMEOUT
+    while True:
+        if stopped():
+            raise JobCancelledError("Bulk job was stopped")
+        try:
+            job = submit_job(contents, image, **params)
+            break
+        except HTTPException as e:
+            if startup["status"] == "failed":
+                raise RuntimeError(f"Models failed to load: {startup['error']}")
+            if e.status_code not in (429, 503):
+                raise
+            if time.monotonic() > give_up:
+                raise RuntimeError(f"Gave up after {BULK_SUBMIT_TIMEOUT:.0f}s: {e.detail}")
+            # Queue full or still warming up: wait rather than fail the item. This blocks
+            # the bulk job's runner thread, which is what holds it to BULK_WINDOW items;
+            # its finished items are recorded once a slot frees up
+            time.sleep(0.5)
     
-    print("Loading models...")
+    result: Future = Future()
+    result.add_done_callback(lambda done: done.cancelled() and release_job(job.id))
     
-    # Set up paths
-    triposg_weights_dir = "TripoSG/pretrained_weights/TripoSG"
-    rmbg_weights_dir = "TripoSG/pretrained_weights/RMBG-1.4"
+    def settle(done: Future):
+        try:
+            if done.exception() is not None:
+                result.set_exception(done.exception())
+            else:
+                result.set_result(done.result())
+        except InvalidStateError:
+            # The bulk job was stopped and cancelled this item meanwhile
+            pass
     
-    # Download weights if they don't exist
-    if not os.path.exists(triposg_weights_dir):
-        print("Downloading TripoSG weights...")
-        from huggingface_hub import snapshot_download
-        snapshot_download(repo_id="VAST-AI/TripoSG", local_dir=triposg_weights_dir)
+    def exported(done: Future):
+        if done.exception() is None and not result.cancelled():
+            save_artifact(job.id, job.params, done.result())
+        settle(done)
     
-    if not os.path.exists(rmbg_weights_dir):
-        print("Downloading RMBG weights...")
-        from huggingface_hub import snapshot_download
-        snapshot_download(repo_id="briaai/RMBG-1.4", local_dir=rmbg_weights_dir)
+    def generated(done: Future):
+        if result.cancelled():
+            return
+        if done.exception() is not None:
+            settle(done)
+            return
+        postprocess_pool.export(
+            done.result(), params["output_format"], params["quantize"], params["compress"]
+        ).add_done_callback(exported)
     
-    # Initialize background removal model
-    rmbg_net = BriaRMBG.from_pretrained(rmbg_weights_dir).to(device)
-    rmbg_net.eval()
+    job.future.add_done_callback(generated)
+    return result
+
+
+bulk_runner = BulkRunner(BULK_DIR, convert_bulk_item, window=BULK_WINDOW)
+
+metrics.gauge("ready", "1 once models are loaded and warmed up", lambda: startup["status"] == "ready")
+metrics.gauge("queue_depth", "Jobs waiting for the inference worker", lambda: job_queue.depth)
+metrics.gauge("inflight_jobs", "Jobs in diffusion or post-processing", lambda: job_queue.running)
+for _name in ("total_bytes", "resident_bytes", "peak_resident_bytes"):
+    metrics.gauge(
+        f"offload_{_name}", f"Offloaded model weights: {_name.replace('_', ' ')}",
+        lambda name=_name: inference.offloader.stats()[name] if inference.offloader is not None else 0,
+    )
+metrics.gauge(
+    "segmentation_queue_depth", "Images waiting for background removal",
+    lambda: segmentation_worker.depth if segmentation_worker is not None else 0,
+)
+metrics.gauge("profiles_stored_bytes", "Disk used by saved profiles", lambda: trace_store.stats()["bytes"])
+metrics.gauge("admission_active", "Conversion requests holding an admission slot", lambda: admission.active)
+metrics.gauge("admission_waiting", "Conversion requests waiting for an admission slot", lambda: admission.waiting)
+for _name in ("hits", "misses", "coalesced", "evictions", "entries", "bytes"):
+    metrics.gauge(f"cache_{_name}", f"Mesh cache {_name}", lambda name=_name: mesh_cache.stats()[name])
+for _kind in ("rmbg", "encoder"):
+    for _name in ("hits", "misses", "saved_seconds"):
+        metrics.gauge(
+            f"embedding_cache_{_kind}_{_name}", f"Embedding cache {_kind} {_name}",
+            lambda kind=_kind, name=_name: embedding_cache.stats().get(kind, {}).get(name, 0),
+        )
+for _name in ("entries", "bytes"):
+    metrics.gauge(f"embedding_cache_{_name}", f"Embedding cache {_name}", lambda name=_name: embedding_cache.stats()[name])
+if artifact_store is not None:
+    for _name in ("artifacts", "bytes", "evictions"):
+        metrics.gauge(f"artifact_store_{_name}", f"Artifact store {_name}", lambda name=_name: artifact_store.stats()[name])
+
+
+async def read_upload(file: UploadFile) -> Tuple[bytes, Image.Image]:
+    """Validate an uploaded image and decode it, downscaled to MAX_INPUT_SIZE"""
+    if not file.filename or not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        raise HTTPException(status_code=400, detail="Only PNG and JPEG images are supported")
+    
+    # Read in chunks so an oversized upload is rejected without loading all of it
+    chunks = []
+    size = 0
+    while chunk := await file.read(1024 * 1024):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        chunks.append(chunk)
+    contents = b"".join(chunks)
     
-    # Initialize TripoSG pipeline
-    pipe = TripoSGPipeline.from_pretrained(triposg_weights_dir).to(device, dtype)
+    try:
+        image = decode_image(contents, max_size=MAX_INPUT_SIZE)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {str(e)}")
     
-    print(f"Models loaded successfully on {device}")
+    print(f"Processing image: {image.size}, mode: {image.mode}")
+    return contents, image
 
 
-@torch.no_grad()
-def run_triposg(
-    pipe: Any,
-    image_path: str,
-    rmbg_net: Any,
+def submit_job(
+    contents: bytes,
+    image: Image.Image,
+    seed: int,
+    num_inference_steps: int,
+    guidance_scale: float,
+    faces: int,
+    output_format: str,
+    quantize: bool = False,
+    compress: bool = False,
+    lods: Optional[List[int]] = None,
+    deadline: Optional[float] = None,
+    detached: bool = True,
+    profile: bool = False,
+    scheduler: str = "default",
+    guidance_cutoff: float = 1.0,
+) -> Job:
+    """Queue a job, or reuse a cached or in-flight result for the same request.
+    
+    A ``detached`` job runs to completion (or its ``deadline``) whether or
+    not anyone waits for it; otherwise the caller is expected to wait with
+    ``wait_for_job``, which cancels it once every waiting client is gone.
+    A ``profile`` job always runs, even if its result is cached.
+    """
+    if startup["status"] != "ready":
+        raise HTTPException(status_code=503, detail="Models not loaded yet")
+    if not guidance_skipping:
+        # Every step runs with guidance, so report (and cache) the job as what it is
+        guidance_cutoff = 1.0
+    
+    params = {
+        "seed": seed,
+        "num_inference_steps": num_inference_steps,
+        "guidance_scale": guidance_scale,
+        "faces": faces,
+        "output_format": output_format,
+        "quantize": quantize,
+        "compress": compress,
+        "lods": lods,
+        "profile": profile,
+        "scheduler": scheduler,
+        "guidance_cutoff": guidance_cutoff,
+    }
+    # Every LOD level is its own cache entry, keyed by its face target
+    cache_keys = [
+        MeshCache.make_key(
+            contents,
+            seed=seed,
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            scheduler=scheduler,
+            guidance_cutoff=guidance_cutoff,
+            faces=n_faces,
+            # Mesh cleanup settings change the stored mesh too
+            min_component_fraction=MIN_COMPONENT_FRACTION,
+            weld_tolerance=WELD_TOLERANCE,
+            merge_percent=MERGE_PERCENT,
+        )
+        for n_faces in (lods or [faces])
+    ]
+    cache_key = ",".join(cache_keys)
+    
+    cached = None if profile else mesh_cache.get_many(cache_keys)
+    if cached is not None:
+        levels = [to_trimesh(v, f) for v, f in cached]
+        metrics.inc("jobs_cached_total")
+        return job_queue.add_finished(params, levels)
+    
+    def start() -> Job:
+        # Segmentation starts now, overlapping whatever the inference worker is running
+        payload = segmentation_worker.submit(image) if segmentation_worker is not None else image
+        try:
+            return job_queue.submit(params, payload, deadline=deadline)
+        except QueueFullError as e:
+            if isinstance(payload, Future):
+                payload.cancel()
+            raise HTTPException(
+                status_code=429, detail=str(e), headers={"Retry-After": str(admission.retry_after(job_queue.depth))}
+            )
+    
+    if profile:
+        job = start()
+        mesh_cache.track(cache_key, job)
+    else:
+        job, started = mesh_cache.coalesce(cache_key, start)
+        if not started:
+            # Shared with an earlier request: keep it alive as long as either wants it
+            job.deadline = None if deadline is None or job.deadline is None else max(job.deadline, deadline)
+            if detached:
+                job.waiters += 1
+            return job
+    if detached:
+        job.waiters += 1
+    
+    def store(future):
+        try:
+            if future.exception() is None:
+                for level_key, mesh in zip(cache_keys, future.result()):
+                    mesh_cache.put(level_key, np.asarray(mesh.vertices), np.asarray(mesh.faces))
+        except Exception as e:
+            print(f"Failed to cache mesh: {e}")
+        finally:
+            mesh_cache.release(cache_key)
+    
+    def record(future):
+        if isinstance(future.exception(), DeadlineExceededError):
+            metrics.inc("jobs_expired_total")
+            return
+        if isinstance(future.exception(), JobCancelledError):
+            metrics.inc("jobs_cancelled_total")
+            return
+        metrics.inc("jobs_failed_total" if future.exception() else "jobs_completed_total")
+        metrics.observe("total", job.finished_at - job.created_at)
+        if future.exception() is None:
+            admission.observe(job.finished_at - job.started_at)
+    
+    metrics.inc("jobs_submitted_total")
+    job.future.add_done_callback(store)
+    job.future.add_done_callback(record)
+    return job
+
+
+def request_deadline(timeout: Optional[float]) -> Optional[float]:
+    """Absolute deadline for a request's ``timeout`` in seconds (REQUEST_TIMEOUT if not given, 0 for none)"""
+    timeout = REQUEST_TIMEOUT if timeout is None else timeout
+    return time.time() + timeout if timeout > 0 else None
+
+
+async def wait_for_job(job: Job, request: Request) -> Any:
+    """Wait for a job's result while the client stays connected.
+    
+    Returns ``None`` if the client disconnects first. The job is cancelled
+    (stopping denoising at the next step) once no request waits for it any
+    more, and as soon as it passes its deadline.
+    """
+    job.waiters += 1
+    result = asyncio.wrap_future(job.future)
+    try:
+        while True:
+            done, _ = await asyncio.wait({result}, timeout=DISCONNECT_POLL)
+            if done:
+                return result.result()
+            if await request.is_disconnected():
+                print(f"Client disconnected from job {job.id}")
+                return None
+            # Covers jobs the worker isn't watching, e.g. while on a model host
+            job_queue.expire([job])
+    finally:
+        job.waiters -= 1
+        if job.waiters == 0 and not job.future.done():
+            job_queue.cancel(job.id)
+
+
+def release_job(job_id: str) -> Optional[Job]:
+    """Drop one detached submitter's interest in a job, cancelling it when nobody else wants it"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return None
+    job.waiters = max(0, job.waiters - 1)
+    if job.waiters == 0:
+        job_queue.cancel(job_id)
+    return job
+
+
+def save_artifact(job_id: str, params: Dict[str, Any], data: bytes):
+    """Keep a job's export, made with the job's own ``params``, in the artifact store"""
+    if artifact_store is None:
+        return
+    try:
+        artifact_store.put(
+            job_id, data, params["output_format"], {k: v for k, v in params.items() if k != "profile"}
+        )
+    except Exception as e:
+        print(f"Failed to store artifact: {e}")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+async def artifact_response(request: Request, job_id: str) -> Response:
+    """Serve a stored mesh with its content hash as ETag.
+    
+    ``If-None-Match`` is answered with 304 and ``Range`` with the requested
+    bytes, so viewers can revalidate and stream large GLBs cheaply.
+    """
+    found = await asyncio.to_thread(artifact_store.open, job_id) if artifact_store is not None else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    record, path = found
+    etag = f'"{record["digest"]}"'
+    # A job's artifact never changes, so clients may cache it indefinitely
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[record["format"]],
+        headers=headers,
+        filename=f"mesh_{job_id}.{record['format']}",
+    )
+
+
+def bytes_response(request: Optional[Request], data: bytes, media_type: str, headers: Dict[str, str]) -> Response:
+    """Serve an in-memory export like a stored one: content-hash ETag, 304 on a match, single byte ranges"""
+    # The artifact store names blobs by the same hash, so the tag stays valid once the export is stored
+    etag = f'"{hashlib.sha256(data).hexdigest()}"'
+    headers = dict(headers, ETag=etag)
+    headers["Accept-Ranges"] = "bytes"
+    if request is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    byte_range = request.headers.get("range")
+    if not byte_range or not byte_range.startswith("bytes=") or "," in byte_range:
+        # Multi-range requests may be answered with the whole body
+        return Response(content=data, media_type=media_type, headers=headers)
+    start_text, _, end_text = byte_range[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start, end = int(start_text), int(end_text) if end_text else len(data) - 1
+            if end < start:
+                # An invalid range is ignored (RFC 9110, 14.1.1), not unsatisfiable
+                return Response(content=data, media_type=media_type, headers=headers)
+        else:
+            # A suffix range: the last N bytes
+            start, end = max(0, len(data) - int(end_text)), len(data) - 1
+    except ValueError:
+        return Response(content=data, media_type=media_type, headers=headers)
+    end = min(end, len(data) - 1)
+    if start >= len(data):
+        return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{len(data)}"}))
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+
+def artifact_info(record: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(record, url=f"/artifacts/{record['job_id']}/file")
+
+
+def check_output_format(output_format: str) -> str:
+    output_format = output_format.lower()
+    if output_format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Unsupported output format. Use 'glb', 'obj', or 'ply'")
+    return output_format
+
+
+async def mesh_response(
+    levels: List[trimesh.Trimesh],
+    job_id: str,
+    output_format: str,
+    quantize: bool = False,
+    compress: bool = False,
+    lod: Optional[int] = None,
+    timings: Optional[Dict[str, float]] = None,
+    data: Optional[bytes] = None,
+    artifact: Optional[Dict[str, Any]] = None,
+    request: Optional[Request] = None,
+) -> Response:
+    """Serialize a mesh, or all LOD levels as one multi-mesh GLB, in memory.
+    
+    When ``timings`` is given it is returned as a Server-Timing header.
+    ``data`` is an export the job already made, which is sent as is.
+    ``artifact`` is the job's params when this is the export the job asked
+    for; it is then kept in the artifact store under ``job_id``. The
+    response carries the content hash as ETag, and with ``request``
+    answers ``If-None-Match`` and ``Range`` like a stored artifact.
+    """
+    if lod is not None:
+        if not 0 <= lod < len(levels):
+            raise HTTPException(status_code=400, detail=f"lod must be between 0 and {len(levels) - 1}")
+        levels = [levels[lod]]
+    
+    if len(levels) > 1 and output_format != "glb":
+        raise HTTPException(status_code=400, detail="Multiple LODs can only be returned together as GLB; pass lod to select one")
+    
+    timings = dict(timings) if timings is not None else None
+    if data is None:
+        with metrics.timed("export", timings):
+            data = await asyncio.wrap_future(postprocess_pool.export(
+                levels,
+                output_format,
+                quantize=quantize,
+                compress=compress,
+                names=[f"LOD{i}" for i in range(len(levels))],
+            ))
+    
+    print(f"Generated mesh {job_id}.{output_format}, size: {len(data)} bytes")
+    if artifact is not None:
+        await asyncio.to_thread(save_artifact, job_id, artifact, data)
+    
+    headers = {"Content-Disposition": f'attachment; filename="mesh_{job_id}.{output_format}"'}
+    if timings and SERVER_TIMING:
+        headers["Server-Timing"] = server_timing(timings)
+    return bytes_response(request, data, MEDIA_TYPES[output_format], headers)
+
+
+def check_sampling(
+    quality: Optional[str], scheduler: str, num_inference_steps: int, guidance_scale: float, guidance_cutoff: float
+) -> Dict[str, Any]:
+    """Sampler, steps and guidance for a request; a ``quality`` tier overrides the individual settings"""
+    try:
+        return resolve_sampling(quality, scheduler, num_inference_steps, guidance_scale, guidance_cutoff)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def check_faces(faces: int) -> int:
+    if faces != -1 and faces < 1:
+        raise HTTPException(status_code=400, detail="faces must be -1 (no simplification) or at least 1")
+    return faces
+
+
+def check_lods(lods: Optional[str], output_format: str) -> Optional[List[int]]:
+    if lods is None:
+        return None
+    try:
+        targets = parse_lods(lods)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if output_format != "glb":
+        # Levels are only ever returned together, as one GLB
+        raise HTTPException(status_code=400, detail="lods requires output_format=glb")
+    return targets
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "device": device,
+        "models_loaded": (pipe is not None and rmbg_net is not None) or model_host is not None,
+        "ready": startup["status"] == "ready",
+        "queue_depth": job_queue.depth,
+    }
+
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up, even while models are still loading"""
+    if startup["status"] == "failed":
+        return JSONResponse({"status": "failed", "error": startup["error"]}, status_code=503)
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: models are loaded and warmed up"""
+    body = {"status": startup["status"], "cold_start_seconds": startup["phases"]}
+    return JSONResponse(body, status_code=200 if startup["status"] == "ready" else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    stats = {**mesh_cache.stats(), "embeddings": embedding_cache.stats()}
+    if artifact_store is not None:
+        stats["artifacts"] = artifact_store.stats()
+    return stats
+
+
+def require_artifact_store() -> ArtifactStore:
+    if artifact_store is None:
+        raise HTTPException(status_code=404, detail="The artifact store is disabled")
+    return artifact_store
+
+
+@app.get("/artifacts")
+async def list_artifacts(limit: int = 50, cursor: Optional[int] = None, format: Optional[str] = None):
+    """Stored meshes, newest first; pass ``next_cursor`` back as ``cursor`` for the next page"""
+    store = require_artifact_store()
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    items, next_cursor = await asyncio.to_thread(
+        store.list, limit, cursor, check_output_format(format) if format else None
+    )
+    total = await asyncio.to_thread(store.count, check_output_format(format) if format else None)
+    return {"items": [artifact_info(record) for record in items], "next_cursor": next_cursor, "total": total}
+
+
+@app.get("/artifacts/{job_id}")
+async def get_artifact(job_id: str):
+    record = await asyncio.to_thread(require_artifact_store().get, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return artifact_info(record)
+
+
+@app.api_route("/artifacts/{job_id}/file", methods=["GET", "HEAD"])
+async def get_artifact_file(request: Request, job_id: str):
+    require_artifact_store()
+    return await artifact_response(request, job_id)
+
+
+@app.delete("/artifacts/{job_id}")
+async def delete_artifact(job_id: str):
+    if not await asyncio.to_thread(require_artifact_store().delete, job_id):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return {"job_id": job_id, "deleted": True}
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
     seed: int = 42,
     num_inference_steps: int = 50,
     guidance_scale: float = 7.0,
     faces: int = -1,
-) -> trimesh.Scene:
-    """Run TripoSG inference"""
+    output_format: str = "glb",  # glb, obj, ply
+    quantize: bool = False,  # GLB only: uint16 positions, int8 normals
+    compress: bool = False,  # GLB only: meshopt compression
+    lods: Optional[str] = None,  # e.g. 200000,50000,10000
+    preview: bool = False,  # Also run a quick low-step preview; follow both on /jobs/{id}/events
+    timeout: Optional[float] = None,  # Seconds before the job is cancelled; defaults to TRIPOSG_REQUEST_TIMEOUT, 0 for none
+    scheduler: str = "default",  # default (the pipeline's), dpmpp_2m, unipc
+    guidance_cutoff: float = 1.0,  # Fraction of steps with classifier-free guidance; the rest cost half
+    quality: Optional[str] = None,  # draft, standard or high; overrides scheduler, steps and guidance
+):
+    """Queue an image for 3D conversion and return immediately"""
+    output_format = check_output_format(output_format)
+    sampling = check_sampling(quality, scheduler, num_inference_steps, guidance_scale, guidance_cutoff)
+    faces = check_faces(faces)
+    num_inference_steps, guidance_scale = sampling["num_inference_steps"], sampling["guidance_scale"]
+    scheduler, guidance_cutoff = sampling["scheduler"], sampling["guidance_cutoff"]
+    lod_targets = check_lods(lods, output_format)
+    deadline = request_deadline(timeout)
+    with metrics.timed("upload_decode"):
+        contents, image = await read_upload(file)
     
-    # Prepare image (remove background, etc.) - this expects a file path
-    img_pil = prepare_image(image_path, bg_color=np.array([1.0, 1.0, 1.0]), rmbg_net=rmbg_net)
+    preview_job = None
+    if preview and PREVIEW_STEPS < num_inference_steps:
+        # Queued first, so the worker picks it up before the full-quality job
+        preview_faces = PREVIEW_FACES if faces <= 0 else min(faces, PREVIEW_FACES)
+        preview_job = submit_job(
+            contents, image, seed, PREVIEW_STEPS, guidance_scale, preview_faces, output_format, quantize, compress,
+            deadline=deadline, scheduler=scheduler, guidance_cutoff=guidance_cutoff,
+        )
+    job = submit_job(
+        contents, image, seed, num_inference_steps, guidance_scale, faces, output_format, quantize, compress, lod_targets,
+        deadline=deadline, scheduler=scheduler, guidance_cutoff=guidance_cutoff,
+    )
+    if preview_job is not None:
+        job.preview_id = preview_job.id
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Withdraw this request from a job (and its preview).
     
-    # Run inference
-    outputs = pipe(
-        image=img_pil,
-        generator=torch.Generator(device=pipe.device).manual_seed(seed),
-        num_inference_steps=num_inference_steps,
-        guidance_scale=guidance_scale,
-    ).samples[0]
+    Identical requests share one job, so it is only cancelled once no other
+    submitter or waiting /convert request wants it; then queued jobs never
+    run and running ones stop at the next denoising step.
+    """
+    job = release_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.preview_id:
+        release_job(job.preview_id)
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/profile")
+async def job_profile(job_id: str, format: str = "speedscope"):
+    """Traces of a profiled job: ``speedscope`` (Python samples) or ``chrome`` (torch.profiler)"""
+    path = trace_store.path(job_id, format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No profile for this job")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events for a job and its preview.
     
-    # Create mesh
-    mesh = trimesh.Trimesh(outputs[0].astype(np.float32), np.ascontiguousarray(outputs[1]))
+    ``progress`` reports the stage and denoising step of each phase
+    (``preview`` or ``final``), ``preview`` fires when the preview mesh is
+    ready, and the stream ends with ``done``, ``failed`` or ``cancelled``.
+    Meshes are fetched from the ``result_url`` in the event.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    preview_job = job_queue.get(job.preview_id) if job.preview_id else None
     
-    # Optionally simplify mesh
-    if faces > 0 and mesh.faces.shape[0] > faces:
-        mesh = simplify_mesh(mesh, faces)
+    async def stream():
+        phases = [("preview", preview_job), ("final", job)] if preview_job is not None else [("final", job)]
+        last_state: Dict[str, Any] = {}
+        preview_sent = preview_job is None
+        idle = 0.0
+        while True:
+            sent = False
+            for phase, phase_job in phases:
+                state = (phase_job.status, phase_job.stage, phase_job.step, phase_job.total_steps)
+                if last_state.get(phase) != state:
+                    last_state[phase] = state
+                    sent = True
+                    yield sse("progress", {
+                        "phase": phase,
+                        "job_id": phase_job.id,
+                        "status": phase_job.status,
+                        "stage": phase_job.stage,
+                        "step": phase_job.step,
+                        "total_steps": phase_job.total_steps,
+                    })
+            
+            if not preview_sent and preview_job.status == "done" and job.status != "done":
+                preview_sent = True
+                yield sse("preview", {"job_id": preview_job.id, "result_url": f"/jobs/{preview_job.id}/result"})
+            
+            if job.finished_at is not None:
+                body = {"job_id": job.id, "timings": job.timings}
+                if job.status == "done":
+                    body["result_url"] = f"/jobs/{job.id}/result"
+                else:
+                    body["error"] = job.error
+                yield sse(job.status, body)
+                return
+            
+            # Comment lines keep proxies from closing an idle stream
+            idle = 0.0 if sent else idle + EVENTS_INTERVAL
+            if idle >= 15:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(EVENTS_INTERVAL)
     
-    return mesh
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
-def simplify_mesh(mesh: trimesh.Trimesh, n_faces: int) -> trimesh.Trimesh:
-    """Simplify mesh using pymeshlab"""
+@app.post("/bulk", status_code=202)
+async def create_bulk(
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),  # A zip of images
+    manifest: Optional[str] = Form(None),  # JSON list of image paths under TRIPOSG_BULK_ROOT
+    seed: int = 42,
+    num_inference_steps: int = 50,
+    guidance_scale: float = 7.0,
+    faces: int = -1,
+    output_format: str = "glb",  # glb, obj, ply
+    quantize: bool = False,  # GLB only: uint16 positions, int8 normals
+    compress: bool = False,  # GLB only: meshopt compression
+    scheduler: str = "default",  # default (the pipeline's), dpmpp_2m, unipc
+    guidance_cutoff: float = 1.0,  # Fraction of steps with classifier-free guidance; the rest cost half
+    quality: Optional[str] = None,  # draft, standard or high; overrides scheduler, steps and guidance
+):
+    """Convert many images; follow /bulk/{id}/status (NDJSON) and /bulk/{id}/meshes.tar"""
+    output_format = check_output_format(output_format)
+    sampling = check_sampling(quality, scheduler, num_inference_steps, guidance_scale, guidance_cutoff)
+    faces = check_faces(faces)
+    paths: List[str] = []
+    if manifest:
+        if not BULK_ROOT:
+            raise HTTPException(status_code=400, detail="Manifests are disabled (TRIPOSG_BULK_ROOT is not set)")
+        try:
+            paths = [str(p) for p in json.loads(manifest)]
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="manifest must be a JSON list of paths")
+        root = os.path.realpath(BULK_ROOT)
+        for path in paths:
+            real = os.path.realpath(os.path.join(root, path))
+            if os.path.commonpath([root, real]) != root or not os.path.isfile(real) or not is_image_name(real):
+                raise HTTPException(status_code=400, detail=f"Not an image under TRIPOSG_BULK_ROOT: {path}")
+        paths = [os.path.realpath(os.path.join(root, path)) for path in paths]
+    
+    bulk = bulk_runner.create()
+    
+    def spool():
+        for path in paths:
+            bulk.add_path(path)
+        for upload in files or []:
+            if upload.filename and is_image_name(upload.filename):
+                bulk.add_file(upload.filename, upload.file)
+        if archive is not None:
+            bulk.add_zip(archive.file)
+    
     try:
-        import pymeshlab
-        
-        # Convert to pymeshlab mesh
-        ms = pymeshlab.MeshSet()
-        ms.add_mesh(pymeshlab.Mesh(vertex_matrix=mesh.vertices, face_matrix=mesh.faces))
-        
-        # Simplify
-        ms.meshing_merge_close_vertices()
-        ms.meshing_decimation_quadric_edge_collapse(targetfacenum=n_faces)
-        
-        # Convert back to trimesh
-        simplified = ms.current_mesh()
-        return trimesh.Trimesh(vertices=simplified.vertex_matrix(), faces=simplified.face_matrix())
-    except ImportError:
-        print("pymeshlab not available, skipping mesh simplification")
-        return mesh
+        await asyncio.to_thread(spool)
     except Exception as e:
-        print(f"Mesh simplification failed: {e}")
-        return mesh
+        bulk_runner.delete(bulk)
+        raise HTTPException(status_code=400, detail=f"Invalid bulk upload: {str(e)}")
+    if not bulk.items:
+        bulk_runner.delete(bulk)
+        raise HTTPException(status_code=400, detail="No PNG or JPEG images in the request")
+    
+    bulk.save_manifest({
+        "seed": seed,
+        **sampling,
+        "faces": faces,
+        "output_format": output_format,
+        "quantize": quantize,
+        "compress": compress,
+    })
+    bulk_runner.start(bulk)
+    return bulk.summary()
 
 
-@app.get("/health")
-async def health():
-    return {"status": "ok", "device": device, "models_loaded": pipe is not None and rmbg_net is not None}
+def get_bulk(bulk_id: str):
+    bulk = bulk_runner.get(bulk_id)
+    if bulk is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found")
+    return bulk
+
+
+@app.get("/bulk/{bulk_id}")
+async def bulk_summary(bulk_id: str):
+    bulk = get_bulk(bulk_id)
+    return dict(bulk.summary(), running=bulk_runner.running(bulk_id))
+
+
+@app.get("/bulk/{bulk_id}/status")
+async def bulk_status(bulk_id: str, offset: int = 0):
+    """One NDJSON line per finished image, streamed as they finish; ``offset`` skips lines already seen"""
+    bulk = get_bulk(bulk_id)
+    return StreamingResponse(follow_status(bulk, bulk_runner, offset), media_type="application/x-ndjson")
+
+
+@app.get("/bulk/{bulk_id}/meshes.tar")
+async def bulk_meshes(bulk_id: str, offset: int = 0):
+    """A tar of finished meshes, streamed as they finish; ``offset`` skips meshes already received"""
+    bulk = get_bulk(bulk_id)
+    return StreamingResponse(follow_meshes(bulk, bulk_runner, offset), media_type="application/x-tar")
+
+
+@app.post("/bulk/{bulk_id}/resume")
+async def resume_bulk(bulk_id: str):
+    """Continue an interrupted bulk job (e.g. after a restart) from the images it hasn't finished"""
+    bulk = get_bulk(bulk_id)
+    if bulk.summary()["complete"]:
+        return bulk.summary()
+    if not bulk_runner.start(bulk):
+        raise HTTPException(status_code=409, detail="Bulk job is already running")
+    return bulk.summary()
+
+
+@app.delete("/bulk/{bulk_id}")
+async def delete_bulk(bulk_id: str):
+    bulk = get_bulk(bulk_id)
+    await asyncio.to_thread(bulk_runner.delete, bulk)
+    return {"bulk_id": bulk_id, "deleted": True}
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(
+    request: Request,
+    job_id: str,
+    output_format: Optional[str] = None,
+    quantize: Optional[bool] = None,
+    compress: Optional[bool] = None,
+    lod: Optional[int] = None,
+):
+    """The job's mesh; as the job asked for it, it comes from the artifact store once exported"""
+    job = job_queue.get(job_id)
+    if job is None:
+        # Long forgotten by the queue, but its export may still be stored
+        if artifact_store is not None and await asyncio.to_thread(artifact_store.get, job_id):
+            return await artifact_response(request, job_id)
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=f"Processing failed: {job.error}")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    
+    output_format = check_output_format(output_format or job.params["output_format"])
+    quantize = job.params["quantize"] if quantize is None else quantize
+    compress = job.params["compress"] if compress is None else compress
+    as_requested = lod is None and (output_format, quantize, compress) == (
+        job.params["output_format"], job.params["quantize"], job.params["compress"]
+    )
+    if as_requested and artifact_store is not None and await asyncio.to_thread(artifact_store.get, job_id):
+        return await artifact_response(request, job_id)
+    return await mesh_response(
+        job.future.result(),
+        job.id,
+        output_format,
+        quantize=quantize,
+        compress=compress,
+        lod=lod,
+        timings=job.timings,
+        artifact=job.params if as_requested else None,
+        request=request,
+    )
 
 
 @app.post("/convert")
 async def convert_image_to_3d(
+    request: Request,
     file: UploadFile = File(...),
     seed: int = 42,
     num_inference_steps: int = 50,
     guidance_scale: float = 7.0,
     faces: int = -1,
-    output_format: str = "glb"  # glb, obj, ply
+    output_format: str = "glb",  # glb, obj, ply
+    quantize: bool = False,  # GLB only: uint16 positions, int8 normals
+    compress: bool = False,  # GLB only: meshopt compression
+    lods: Optional[str] = None,  # e.g. 200000,50000,10000
+    timeout: Optional[float] = None,  # Seconds before the job is cancelled; defaults to TRIPOSG_REQUEST_TIMEOUT, 0 for none
+    profile: bool = False,  # Save traces, fetched from /jobs/{X-Job-Id}/profile; needs TRIPOSG_PROFILING=1
+    scheduler: str = "default",  # default (the pipeline's), dpmpp_2m, unipc
+    guidance_cutoff: float = 1.0,  # Fraction of steps with classifier-free guidance; the rest cost half
+    quality: Optional[str] = None,  # draft, standard or high; overrides scheduler, steps and guidance
 ):
-    """Convert an image to a 3D model"""
-    
-    if pipe is None or rmbg_net is None:
-        raise HTTPException(status_code=503, detail="Models not loaded yet")
+    """Convert an image to a 3D model.
     
-    # Validate file
-    if not file.filename or not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-        raise HTTPException(status_code=400, detail="Only PNG and JPEG images are supported")
+    If the client disconnects or the timeout passes, the job is cancelled
+    at the next denoising step (unless another request shares it).
+    """
+    output_format = check_output_format(output_format)
+    sampling = check_sampling(quality, scheduler, num_inference_steps, guidance_scale, guidance_cutoff)
+    faces = check_faces(faces)
+    try:
+        profile = profile_sampler.should_profile(profile)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if profile and model_host is not None:
+        # The pipeline runs in the model host, out of this process's reach
+        profile = False
+    lod_targets = check_lods(lods, output_format)
+    timings: Dict[str, float] = {}
+    with metrics.timed("upload_decode", timings):
+        contents, image = await read_upload(file)
+    job = submit_job(
+        contents, image, seed, sampling["num_inference_steps"], sampling["guidance_scale"], faces, output_format, quantize,
+        compress, lod_targets, deadline=request_deadline(timeout), detached=False, profile=profile,
+        scheduler=sampling["scheduler"], guidance_cutoff=sampling["guidance_cutoff"],
+    )
     
     try:
-        # Read and validate image
-        contents = await file.read()
-        if len(contents) > 50 * 1024 * 1024:  # 50MB limit
-            raise HTTPException(status_code=413, detail="Image too large")
-        
-        # Load image
-        image = Image.open(io.BytesIO(contents))
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        print(f"Processing image: {image.size}, mode: {image.mode}")
-        
-        # Save image to temporary file (TripoSG expects file path)
-        job_id = uuid.uuid4().hex[:8]
-        temp_dir = tempfile.gettempdir()
-        temp_image_path = os.path.join(temp_dir, f"input_{job_id}.jpg")
-        image.save(temp_image_path, "JPEG", quality=95)
-        
-        try:
-            # Run TripoSG
-            mesh = run_triposg(
-                pipe=pipe,
-                image_path=temp_image_path,
-                rmbg_net=rmbg_net,
-                seed=seed,
-                num_inference_steps=num_inference_steps,
-                guidance_scale=guidance_scale,
-                faces=faces
-            )
-        finally:
-            # Clean up temporary image file
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
-        
-        # Create temporary output file
-        job_id = uuid.uuid4().hex[:8]
-        temp_dir = tempfile.gettempdir()
-        
-        if output_format.lower() == "glb":
-            output_path = os.path.join(temp_dir, f"mesh_{job_id}.glb")
-            mesh.export(output_path)
-            media_type = "model/gltf-binary"
-        elif output_format.lower() == "obj":
-            output_path = os.path.join(temp_dir, f"mesh_{job_id}.obj")
-            mesh.export(output_path)
-            media_type = "application/octet-stream"
-        elif output_format.lower() == "ply":
-            output_path = os.path.join(temp_dir, f"mesh_{job_id}.ply")
-            mesh.export(output_path)
-            media_type = "application/octet-stream"
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported output format. Use 'glb', 'obj', or 'ply'")
-        
-        print(f"Generated mesh saved to {output_path}, size: {os.path.getsize(output_path)} bytes")
-        
-        # Return the file
-        return FileResponse(
-            path=output_path,
-            media_type=media_type,
-            filename=f"mesh_{job_id}.{output_format.lower()}",
-            background=None  # File will be cleaned up by OS temp cleanup
-        )
-        
+        levels = await wait_for_job(job, request)
+    except DeadlineExceededError:
+        raise HTTPException(status_code=504, detail="Job missed its deadline")
+    except JobCancelledError:
+        raise HTTPException(status_code=409, detail="Job was cancelled")
     except Exception as e:
         print(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    if levels is None:
+        # Nobody is listening; nginx's "client closed request"
+        return Response(status_code=499)
+    
+    timings.update(job.timings)
+    # A profiled job has already exported, for its own request's format
+    same_format = (job.params["output_format"], job.params["quantize"], job.params["compress"]) == (output_format, quantize, compress)
+    data = job.output if same_format else None
+    response = await mesh_response(
+        levels, job.id, output_format, quantize=quantize, compress=compress, timings=timings, data=data,
+        artifact=job.params if same_format else None, request=request,
+    )
+    response.headers["X-Job-Id"] = job.id
+    return response
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    
+    # Otherwise every pool worker would re-run this script, building the app again
+    spawn_from_worker_module()
+    
+    if HTTP_WORKERS > 1:
+        host_process = None
+        if not MODEL_HOST:
+            # One model host owns the weights; the HTTP workers inherit its address and connect to it.
+            # A separate interpreter, so the host doesn't import this module (and build the app) again
+            import secrets
+            import subprocess
+            import model_host as host
+            
+            os.environ["TRIPOSG_MODEL_HOST"] = host.DEFAULT_ADDRESS
+            # A fresh secret per launch, inherited by the host and every worker
+            os.environ.setdefault("TRIPOSG_MODEL_HOST_AUTHKEY", secrets.token_hex(32))
+            host_process = subprocess.Popen(
+                [sys.executable, host.__file__, "--address", host.DEFAULT_ADDRESS, *(["--stub"] if STUB_MODELS else [])]
+            )
+        try:
+            uvicorn.run("generate_3d_model:app", host="0.0.0.0", port=PORT, workers=HTTP_WORKERS)
+        finally:
+            if host_process is not None:
+                host_process.terminate()
+                host_process.wait()
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=PORT)
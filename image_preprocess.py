@@ -0,0 +1,169 @@
+"""
+In-memory image preprocessing for TripoSG (decode, background removal, crop and composite)
+"""
+import io
+from typing import Any, List, Optional, Union
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image, ImageOps
+
+# BriaRMBG-1.4 runs at a fixed 1024x1024 resolution
+RMBG_INPUT_SIZE = 1024
+
+
+def decode_image(contents: bytes, max_size: int = RMBG_INPUT_SIZE) -> Image.Image:
+    """Decode an upload, downscaling early when it is larger than ``max_size``.
+
+    JPEGs are decoded at a reduced DCT scale via ``draft()`` so oversized
+    photos never materialise at full resolution. EXIF orientation is applied,
+    so phone photos come out upright. An alpha channel is kept so images that
+    are already cut out can skip segmentation.
+    """
+    image = Image.open(io.BytesIO(contents))
+    if image.format == "JPEG" and max(image.size) > max_size:
+        image.draft("RGB", (max_size, max_size))
+    image = ImageOps.exif_transpose(image)
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+
+    if max(image.size) > max_size:
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return image
+
+
+def synthetic_image(size: int = 512) -> Image.Image:
+    """A centred object on a plain background, for warmup and benchmarks without test images"""
+    yy, xx = np.mgrid[-1:1:size * 1j, -1:1:size * 1j]
+    image = np.full((size, size, 3), 240, dtype=np.uint8)
+    image[(xx / 0.5) ** 2 + (yy / 0.7) ** 2 <= 1] = (180, 60, 40)
+    return Image.fromarray(image)
+
+
+def to_float_array(image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+    """Return an HxWxC float32 array in [0, 1] with 3 or 4 channels"""
+    if isinstance(image, Image.Image):
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image = np.asarray(image)
+
+    array = np.asarray(image)
+    if array.ndim == 2:
+        array = np.repeat(array[:, :, None], 3, axis=2)
+    if array.dtype == np.uint8:
+        return array.astype(np.float32) / 255.0
+    return array.astype(np.float32, copy=False)
+
+
+@torch.no_grad()
+def segment_batch(rmbg_net: Any, rgbs: List[np.ndarray]) -> List[np.ndarray]:
+    """Predict foreground alpha mattes (HxW, [0, 1]) for several images with one BriaRMBG forward pass.
+
+    Every image is resized to the network's fixed input size, so images of
+    any mix of sizes stack into one batch; each matte is scaled back to its
+    own image's size.
+    """
+    param = next(rmbg_net.parameters(), None)
+    device = param.device if param is not None else torch.device("cpu")
+    dtype = param.dtype if param is not None else torch.float32
+
+    x = torch.cat([
+        F.interpolate(
+            torch.from_numpy(np.ascontiguousarray(rgb)).to(device=device, dtype=dtype).permute(2, 0, 1).unsqueeze(0),
+            size=(RMBG_INPUT_SIZE, RMBG_INPUT_SIZE), mode="bilinear", align_corners=False,
+        )
+        for rgb in rgbs
+    ])
+    x -= 0.5  # Normalize(mean=0.5, std=1.0)
+
+    preds = rmbg_net(x)[0][0].float()
+    mattes = []
+    for i, rgb in enumerate(rgbs):
+        pred = F.interpolate(preds[i:i + 1], size=rgb.shape[:2], mode="bilinear", align_corners=False)[0, 0]
+        lo, hi = pred.min(), pred.max()
+        pred = (pred - lo) / (hi - lo).clamp_min(1e-6)
+        mattes.append(pred.cpu().numpy())
+    return mattes
+
+
+def segment(rmbg_net: Any, rgb: np.ndarray) -> np.ndarray:
+    """Predict a foreground alpha matte (HxW, [0, 1]) with BriaRMBG"""
+    return segment_batch(rmbg_net, [rgb])[0]
+
+
+def has_matte(array: np.ndarray) -> bool:
+    """Whether an RGBA float array already carries a (not fully opaque) alpha matte"""
+    return array.shape[2] == 4 and array[:, :, 3].min() < 1.0
+
+
+def composite(rgb: np.ndarray, alpha: np.ndarray, bg_color: Any, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """``rgb * alpha + bg * (1 - alpha)`` as uint8, written into ``out`` when given.
+
+    One fused ``torch.lerp`` over the whole image (sharing memory with the
+    NumPy inputs) instead of a chain of broadcast NumPy expressions, each
+    with its own image-sized temporary.
+    """
+    rgb = torch.from_numpy(np.asarray(rgb, dtype=np.float32))
+    bg = torch.tensor(np.asarray(bg_color, dtype=np.float32)).expand_as(rgb)
+    blended = torch.lerp(bg, rgb, torch.from_numpy(np.asarray(alpha, dtype=np.float32)).unsqueeze(-1))
+    blended = blended.mul_(255.0).add_(0.5).clamp_(0, 255).to(torch.uint8).numpy()
+    if out is None:
+        return blended
+    out[...] = blended
+    return out
+
+
+def crop_and_composite(
+    rgb: np.ndarray,
+    alpha: np.ndarray,
+    bg_color: Any,
+    padding_ratio: float = 0.1,
+    alpha_threshold: float = 0.5,
+) -> Image.Image:
+    """Crop to the foreground bounding box, pad to a square and composite onto ``bg_color``"""
+    foreground = alpha > alpha_threshold
+    rows = np.flatnonzero(foreground.any(axis=1))
+    cols = np.flatnonzero(foreground.any(axis=0))
+    if rows.size and cols.size:
+        y0, y1 = rows[0], rows[-1] + 1
+        x0, x1 = cols[0], cols[-1] + 1
+        rgb = rgb[y0:y1, x0:x1]
+        alpha = alpha[y0:y1, x0:x1]
+
+    # Only the foreground box is blended; the padding is filled with the background colour
+    h, w = alpha.shape
+    size = int(round(max(h, w) * (1 + 2 * padding_ratio)))
+    canvas = np.empty((size, size, 3), dtype=np.uint8)
+    canvas[:] = np.clip(np.asarray(bg_color, dtype=np.float32) * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    top = (size - h) // 2
+    left = (size - w) // 2
+    composite(rgb, alpha, bg_color, out=canvas[top:top + h, left:left + w])
+    return Image.fromarray(canvas)
+
+
+def prepare_image_array(
+    image: Union[Image.Image, np.ndarray],
+    bg_color: np.ndarray,
+    rmbg_net: Optional[Any] = None,
+    padding_ratio: float = 0.1,
+    alpha_threshold: float = 0.5,
+) -> Image.Image:
+    """Cut out the foreground, crop it to a padded square and composite onto ``bg_color``.
+
+    Takes a PIL image or array directly, so no file round trip is needed.
+    An existing alpha channel is used as the matte; otherwise ``rmbg_net``
+    segments the image.
+    """
+    array = to_float_array(image)
+    rgb = array[:, :, :3]
+
+    if has_matte(array):
+        alpha = array[:, :, 3]
+    elif rmbg_net is not None:
+        alpha = segment(rmbg_net, rgb)
+    else:
+        alpha = np.ones(rgb.shape[:2], dtype=np.float32)
+
+    return crop_and_composite(rgb, alpha, bg_color, padding_ratio, alpha_threshold)
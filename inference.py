@@ -0,0 +1,292 @@
+"""
+Model loading and TripoSG sampling, shared by the HTTP server
+(generate_3d_model) and the model host (model_host).
+
+Importing this module loads no weights and starts no threads or
+processes; the caller decides when to load models and what to serve.
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import torch
+import numpy as np
+from PIL import Image
+
+from cpu_profile import CPUProfile
+from embedding_cache import EmbeddingCache, image_key
+from image_preprocess import prepare_image_array
+from job_queue import Job, JobCancelledError
+from metrics import Metrics
+from offload import StageOffloader, pipeline_components
+from profiling import RequestProfiler, stage as profile_stage
+from samplers import can_skip_guidance, skip_guidance, use_scheduler
+from segmentation import RMBGSegmenter, SegmentationWorker, SessionPool
+
+# Add TripoSG to path
+sys.path.append(os.path.join(os.path.dirname(__file__), "TripoSG"))
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+dtype = torch.float16 if device == "cuda" else torch.float32
+
+# Set by load_models in low-memory mode
+offloader: Optional[StageOffloader] = None
+
+# Requests with matching sampling parameters that arrive within the wait
+# window are run together as one batched pipeline call
+MAX_BATCH_SIZE = int(os.environ.get("TRIPOSG_MAX_BATCH_SIZE", "4"))
+BATCH_WAIT_MS = float(os.environ.get("TRIPOSG_BATCH_WAIT_MS", "50"))
+
+# Background removal runs on its own thread, up to SEGMENTATION_BATCH_SIZE waiting images per
+# forward pass, so each request is segmented while the one before it denoises (0 runs it inline)
+SEGMENTATION_BATCH_SIZE = int(os.environ.get("TRIPOSG_SEGMENTATION_BATCH_SIZE", "4"))
+SEGMENTATION_WAIT_MS = float(os.environ.get("TRIPOSG_SEGMENTATION_WAIT_MS", "5"))
+
+# Low-memory mode: only the components of the running stage (RMBG, image encoder, denoiser,
+# VAE) keep their weights on the device; the rest wait in host memory (accelerators) or a
+# memory-mapped file (CPU) and are prefetched ahead of their stage
+OFFLOAD = os.environ.get("TRIPOSG_OFFLOAD", "0") == "1"
+
+# Weight bytes allowed resident at once (-1: the two largest components, room for one prefetch; 0: one at a time)
+OFFLOAD_BUDGET_BYTES = int(os.environ.get("TRIPOSG_OFFLOAD_BUDGET_BYTES", "-1"))
+OFFLOAD_DIR = os.environ.get("TRIPOSG_OFFLOAD_DIR", tempfile.gettempdir())
+
+# Warm-up inference runs on a synthetic image before the readiness probe turns green
+WARMUP_RUNS = int(os.environ.get("TRIPOSG_WARMUP_RUNS", "1"))
+WARMUP_STEPS = int(os.environ.get("TRIPOSG_WARMUP_STEPS", "2"))
+
+# Bytes of segmented images and image embeddings kept in memory (0 disables the cache)
+EMBEDDING_CACHE_BYTES = int(os.environ.get("TRIPOSG_EMBEDDING_CACHE_BYTES", str(512 * 1024 ** 2)))
+
+# Directory that entries evicted from memory spill to, and its size limit (empty disables spilling)
+EMBEDDING_SPILL_DIR = os.environ.get("TRIPOSG_EMBEDDING_SPILL_DIR", "")
+EMBEDDING_SPILL_BYTES = int(os.environ.get("TRIPOSG_EMBEDDING_SPILL_BYTES", str(2 * 1024 ** 3)))
+
+# Stage timings of this process; the server renders them on /metrics
+metrics = Metrics()
+
+
+def load_models(
+    stub: bool = False,
+    timings: Optional[Dict[str, float]] = None,
+    profile: Optional[CPUProfile] = None,
+) -> Tuple[Any, Any]:
+    """Load (and download if needed) the TripoSG pipeline and BriaRMBG.
+    
+    The two models are downloaded and loaded concurrently. Safetensors
+    weights are memory-mapped and loaded straight into the target dtype and
+    device, rather than materialised in fp32 on the CPU first. On CPU the
+    models are then optimized by ``profile`` (default: from the
+    ``TRIPOSG_CPU_*`` settings). Per-phase durations are added to ``timings``.
+    With TRIPOSG_OFFLOAD=1 the models are then handed to a ``StageOffloader``.
+    """
+    global offloader
+    timings = timings if timings is not None else {}
+    if stub:
+        from triposg_stub import StubRMBG, StubTripoSGPipeline
+        t0 = time.perf_counter()
+        models = StubTripoSGPipeline(), StubRMBG().eval()
+        timings["load_triposg"] = time.perf_counter() - t0
+    else:
+        models = load_weights(timings)
+    
+    if device == "cpu":
+        t0 = time.perf_counter()
+        models = (profile or CPUProfile.from_env()).apply(*models)
+        timings["cpu_profile"] = time.perf_counter() - t0
+    
+    if OFFLOAD:
+        t0 = time.perf_counter()
+        offloader = StageOffloader(
+            pipeline_components(*models), device, budget_bytes=OFFLOAD_BUDGET_BYTES, directory=OFFLOAD_DIR, metrics=metrics
+        )
+        timings["offload"] = time.perf_counter() - t0
+        print(
+            f"Offloading {offloader.total_bytes / 1024 ** 2:.0f} MB of weights, "
+            f"at most {offloader.budget_bytes / 1024 ** 2:.0f} MB resident"
+        )
+    return models
+
+
+def load_weights(timings: Dict[str, float]) -> Tuple[Any, Any]:
+    """Download (if needed) and load the real TripoSG pipeline and BriaRMBG concurrently"""
+    from triposg.pipelines.pipeline_triposg import TripoSGPipeline
+    from TripoSG.scripts.briarmbg import BriaRMBG
+    
+    # Set up paths
+    triposg_weights_dir = "TripoSG/pretrained_weights/TripoSG"
+    rmbg_weights_dir = "TripoSG/pretrained_weights/RMBG-1.4"
+    
+    def download(name: str, repo_id: str, local_dir: str):
+        # Download weights if they don't exist
+        if not os.path.exists(local_dir):
+            print(f"Downloading {name} weights...")
+            from huggingface_hub import snapshot_download
+            t0 = time.perf_counter()
+            snapshot_download(repo_id=repo_id, local_dir=local_dir)
+            timings[f"download_{name.lower()}"] = time.perf_counter() - t0
+    
+    # Offloaded weights start out on the host, so they never all sit on the device together
+    target = "cpu" if OFFLOAD else device
+    
+    def load_rmbg():
+        download("RMBG", "briaai/RMBG-1.4", rmbg_weights_dir)
+        t0 = time.perf_counter()
+        rmbg = BriaRMBG.from_pretrained(rmbg_weights_dir, map_location=target).to(target)
+        rmbg.eval()
+        timings["load_rmbg"] = time.perf_counter() - t0
+        return rmbg
+    
+    def load_pipeline():
+        download("TripoSG", "VAST-AI/TripoSG", triposg_weights_dir)
+        t0 = time.perf_counter()
+        pipeline = TripoSGPipeline.from_pretrained(
+            triposg_weights_dir, torch_dtype=dtype, low_cpu_mem_usage=True
+        ).to(target, dtype)
+        timings["load_triposg"] = time.perf_counter() - t0
+        return pipeline
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        rmbg_future = executor.submit(load_rmbg)
+        pipeline_future = executor.submit(load_pipeline)
+        return pipeline_future.result(), rmbg_future.result()
+
+
+def make_embedding_cache() -> EmbeddingCache:
+    """An ``EmbeddingCache`` sized by the ``TRIPOSG_EMBEDDING_*`` settings"""
+    return EmbeddingCache(
+        max_bytes=EMBEDDING_CACHE_BYTES, spill_dir=EMBEDDING_SPILL_DIR or None, spill_max_bytes=EMBEDDING_SPILL_BYTES
+    )
+
+
+def start_segmentation_worker(rmbg_net: Any, cache: Optional[EmbeddingCache]) -> Optional[SegmentationWorker]:
+    """Move background removal for queued jobs onto its own batching thread; ``None`` if it stays inline"""
+    # Offloaded stages run one at a time; RMBG in parallel would evict the denoiser mid-run
+    if SEGMENTATION_BATCH_SIZE <= 0 or rmbg_net is None or offloader is not None:
+        return None
+    worker = SegmentationWorker(
+        RMBGSegmenter(SessionPool(lambda: rmbg_net)),
+        max_batch_size=SEGMENTATION_BATCH_SIZE,
+        max_wait=SEGMENTATION_WAIT_MS / 1000,
+        metrics=metrics,
+        cache=cache,
+        cache_key=image_key,
+    )
+    worker.start()
+    return worker
+
+
+@torch.no_grad()
+def generate_samples(
+    pipe: Any,
+    images: List[Union[Image.Image, np.ndarray, Future]],
+    rmbg_net: Any,
+    seeds: List[int],
+    num_inference_steps: int = 50,
+    guidance_scale: float = 7.0,
+    progress: Optional[Callable[..., None]] = None,
+    timings: Optional[Dict[str, float]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+    cache: Optional[EmbeddingCache] = None,
+    profiler: Optional[RequestProfiler] = None,
+    scheduler: str = "default",
+    guidance_cutoff: float = 1.0,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Run TripoSG inference on several images in one pipeline call.
+    
+    Returns the raw ``(vertices, faces)`` arrays per image. Every image gets
+    its own generator so results match single-image runs with the same seed.
+    ``progress`` is called with each stage as it starts, and stage durations
+    are recorded in ``metrics`` and added to ``timings``. When ``cancelled``
+    returns true, ``JobCancelledError`` is raised at the next denoising step.
+    With a ``cache``, segmented images are reused for inputs seen before.
+    An image may be a future from the segmentation worker, already prepared.
+    An image that fails to prepare gets its exception in place of its
+    sample, so it fails only its own job; if every image fails, the first
+    error is raised. A ``profiler`` gets ``prepare_image`` and ``pipeline`` stages.
+    ``scheduler`` names a sampler from ``samplers``; after ``guidance_cutoff``
+    of the steps, guidance is dropped if the pipeline supports it.
+    """
+    
+    def report(stage: str, step: int = 0, total_steps: int = 0):
+        if progress is not None:
+            progress(stage, step, total_steps)
+    
+    last_step = [time.perf_counter()]
+    # Steps run with classifier-free guidance (at least the first); the rest use the conditional branch only
+    guided_steps = max(1, round(guidance_cutoff * num_inference_steps)) if can_skip_guidance(pipe) else num_inference_steps
+    
+    def on_step_end(pipeline, i, t, callback_kwargs):
+        now = time.perf_counter()
+        metrics.observe("diffusion_step", now - last_step[0])
+        last_step[0] = now
+        report("diffusion", i + 1, num_inference_steps)
+        if cancelled is not None and cancelled():
+            raise JobCancelledError("Job was cancelled")
+        if i + 1 == guided_steps < num_inference_steps:
+            skip_guidance(pipeline, callback_kwargs)
+        return callback_kwargs
+    
+    # Prepare images (remove background, etc.) entirely in memory
+    report("preprocessing")
+    def prepare(image):
+        try:
+            return image.result() if isinstance(image, Future) else prepare_cached(image, rmbg_net, cache)
+        except Exception as e:
+            return e
+    
+    with metrics.timed("rmbg", timings), profile_stage(profiler, "prepare_image"):
+        prepared = [prepare(image) for image in images]
+    failed = [isinstance(image, Exception) for image in prepared]
+    if all(failed):
+        raise prepared[0]
+    images = [image for image, bad in zip(prepared, failed) if not bad]
+    seeds = [seed for seed, bad in zip(seeds, failed) if not bad]
+    
+    # Run inference
+    report("diffusion", 0, num_inference_steps)
+    # With offloading, weights sit on the host between stages; the execution device is where they run
+    execution_device = getattr(pipe, "_execution_device", pipe.device)
+    generators = [torch.Generator(device=execution_device).manual_seed(seed) for seed in seeds]
+    with metrics.timed("diffusion", timings), profile_stage(profiler, "pipeline"), use_scheduler(pipe, scheduler):
+        last_step[0] = time.perf_counter()
+        samples = pipe(
+            image=images if len(images) > 1 else images[0],
+            generator=generators if len(generators) > 1 else generators[0],
+            num_inference_steps=num_inference_steps,
+            guidance_scale=guidance_scale,
+            callback_on_step_end=on_step_end,
+            callback_on_step_end_tensor_inputs=["latents", "image_embeds"] if guided_steps < num_inference_steps else ["latents"],
+        ).samples
+    
+    results = iter([(outputs[0].astype(np.float32), np.ascontiguousarray(outputs[1])) for outputs in samples])
+    return [image if bad else next(results) for image, bad in zip(prepared, failed)]
+
+
+def prepare_cached(image: Union[Image.Image, np.ndarray], rmbg_net: Any, cache: Optional[EmbeddingCache]) -> Image.Image:
+    """``prepare_image_array`` on a white background, reusing earlier results from ``cache``"""
+    bg_color = np.array([1.0, 1.0, 1.0])
+    if cache is None or not cache.enabled:
+        return prepare_image_array(image, bg_color=bg_color, rmbg_net=rmbg_net)
+    
+    key = image_key(image, bg_color.tolist())
+    cached = cache.get("rmbg", key)
+    if cached is not None:
+        return Image.fromarray(cached[0].numpy())
+    t0 = time.perf_counter()
+    prepared = prepare_image_array(image, bg_color=bg_color, rmbg_net=rmbg_net)
+    cache.put("rmbg", key, (torch.from_numpy(np.array(prepared)),), time.perf_counter() - t0)
+    return prepared
+
+
+def batch_key(job: Job):
+    # Profiled jobs run alone, so their traces only show their own work
+    params = job.params
+    return (
+        params["num_inference_steps"], params["guidance_scale"],
+        params.get("scheduler", "default"), params.get("guidance_cutoff", 1.0),
+        job.id if params.get("profile") else None,
+    )
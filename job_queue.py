@@ -0,0 +1,270 @@
+"""
+Bounded job queue drained by a dedicated inference worker thread
+"""
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from batching import BatchCollector
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class JobCancelledError(Exception):
+    """Raised for a job that was cancelled, including from inside its handler to stop early"""
+
+
+class DeadlineExceededError(JobCancelledError):
+    """Raised for a job that was cancelled because it missed its deadline"""
+
+
+class Job:
+    """A single image-to-3D request and its progress"""
+
+    def __init__(self, params: Dict[str, Any], payload: Any):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.payload = payload
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.stage = "queued"
+        self.step = 0
+        self.total_steps = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.timings: Dict[str, float] = {}
+        self.cancelled = False
+        # Wall-clock time after which nobody wants the result
+        self.deadline: Optional[float] = None
+        # Requests blocked on the result; the job is cancelled once the last one gives up
+        self.waiters = 0
+        # The result already serialized by the handler, when it does that itself
+        self.output: Optional[bytes] = None
+        # A quick low-step job whose result previews this one
+        self.preview_id: Optional[str] = None
+        self.future: Future = Future()
+
+    @property
+    def overdue(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    def set_stage(self, stage: str, step: int = 0, total_steps: int = 0):
+        self.stage = stage
+        self.step = step
+        self.total_steps = total_steps
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "step": self.step,
+            "total_steps": self.total_steps,
+            "params": self.params,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "timings": self.timings,
+            "preview_job_id": self.preview_id,
+            "deadline": self.deadline,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a worker thread so the event loop stays free.
+
+    ``handler`` receives a list of jobs that share the same ``batch_key`` and
+    returns one result per job; a result that is an ``Exception`` fails only
+    that job. A result may also be a ``Future`` for work handed off elsewhere
+    (e.g. post-processing), in which case the worker moves on to the next
+    batch and the job finishes when the future does. With
+    ``max_batch_size=1`` jobs run strictly one at a time.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Job]], List[Any]],
+        maxsize: int = 16,
+        max_finished: int = 256,
+        max_batch_size: int = 1,
+        max_wait: float = 0.0,
+        batch_key: Optional[Callable[[Job], Hashable]] = None,
+    ):
+        self.handler = handler
+        self.max_finished = max_finished
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=maxsize)
+        self._collector = BatchCollector(
+            self._queue,
+            key=batch_key or (lambda job: job.id),
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            on_error=self._finish,
+        )
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._finish_lock = threading.RLock()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._collector)
+
+    @property
+    def running(self) -> int:
+        """Jobs that have left the queue but not finished yet"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.started_at is not None and job.finished_at is None)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name="inference-worker", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def submit(self, params: Dict[str, Any], payload: Any, deadline: Optional[float] = None) -> Job:
+        job = Job(params, payload)
+        job.deadline = deadline
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFullError("Job queue is full")
+        return job
+
+    def add_finished(self, params: Dict[str, Any], result: Any) -> Job:
+        """Register a job whose result is already known, e.g. from a cache"""
+        job = Job(params, None)
+        job.status = "done"
+        job.stage = "done"
+        job.started_at = job.finished_at = job.created_at
+        job.future.set_result(result)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._forget_old_jobs()
+        return job
+
+    def cancel(self, job_id: str, error: Optional[JobCancelledError] = None) -> Optional[Job]:
+        """Cancel a job that hasn't finished; it resolves with ``JobCancelledError`` right away.
+
+        A queued job is skipped by the worker. A running one keeps going
+        until the handler notices ``job.cancelled`` (e.g. between denoising
+        steps) and its result is discarded.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished_at is not None:
+            return job
+        job.cancelled = True
+        self._finish(job, error or JobCancelledError("Job was cancelled"))
+        return job
+
+    def expire(self, jobs: List[Job]) -> bool:
+        """Cancel the jobs in ``jobs`` that are past their deadline; True once none of them is still wanted"""
+        for job in jobs:
+            if not job.cancelled and job.overdue:
+                self.cancel(job.id, DeadlineExceededError("Job missed its deadline"))
+        return all(job.cancelled for job in jobs)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    @staticmethod
+    def _release_payload(job: Job):
+        """Drop the job's input; one still being prepared (a future, e.g. segmentation) is cancelled first"""
+        if isinstance(job.payload, Future):
+            job.payload.cancel()
+        job.payload = None
+
+    @staticmethod
+    def _outcome(done: Future) -> Any:
+        """A handed-off future's result or exception; a cancelled one counts as a cancelled job"""
+        if done.cancelled():
+            return JobCancelledError("Job was cancelled")
+        return done.exception() or done.result()
+
+    def _finish(self, job: Job, result: Any):
+        with self._finish_lock:
+            if job.future.done():
+                # Already cancelled; drop the late result
+                self._release_payload(job)
+                return
+
+            if isinstance(result, Future):
+                job.set_stage("postprocessing")
+                result.add_done_callback(lambda done: self._finish(job, self._outcome(done)))
+                return
+
+            job.finished_at = time.time()
+            if isinstance(result, JobCancelledError):
+                job.status = "cancelled"
+                job.stage = "cancelled"
+                job.error = str(result)
+                job.future.set_exception(result)
+            elif isinstance(result, Exception):
+                print(f"Job {job.id} failed: {result}")
+                job.status = "failed"
+                job.stage = "failed"
+                job.error = str(result)
+                job.future.set_exception(result)
+            else:
+                job.status = "done"
+                job.stage = "done"
+                job.future.set_result(result)
+            # Drop the decoded image once the job no longer needs it
+            self._release_payload(job)
+
+    def _run(self):
+        while True:
+            try:
+                jobs = self._collector.next_batch()
+            except Exception as e:
+                # A bad job fails on its own (via ``on_error``); anything else must not stop the worker
+                print(f"Job queue worker error: {e}")
+                continue
+            if jobs is None:
+                break
+
+            # Jobs cancelled (or expired) while queued have already been resolved
+            self.expire(jobs)
+            for job in jobs:
+                if job.cancelled:
+                    self._release_payload(job)
+            jobs = [job for job in jobs if not job.cancelled]
+            if not jobs:
+                continue
+
+            for job in jobs:
+                job.status = "running"
+                job.started_at = time.time()
+            try:
+                results = self.handler(jobs)
+            except Exception as e:
+                results = [e] * len(jobs)
+
+            for job, result in zip(jobs, results):
+                self._finish(job, result)
+            self._forget_old_jobs()
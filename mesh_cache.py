@@ -0,0 +1,174 @@
+"""
+Content-addressed cache of generated meshes with LRU eviction
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class MeshCache:
+    """Stores raw vertex/face arrays on disk, keyed by image hash and parameters.
+
+    Entries are evicted least-recently-used first once either ``max_bytes`` or
+    ``max_entries`` is exceeded. Requests that are already being computed can
+    be registered with ``track`` so identical requests coalesce onto them.
+
+    The directory itself is the index: lookups go to disk and recency is the
+    file's mtime, so several worker processes can share one ``cache_dir``.
+    Hit, miss and eviction counts are per process.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024 ** 3, max_entries: int = 1000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Any] = {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(image_bytes: bytes, **params: Any) -> str:
+        digest = hashlib.sha256(image_bytes)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _entries(self) -> List[Tuple[int, str, int]]:
+        """``(mtime, key, size)`` of every entry on disk, oldest first"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                # Evicted by another process since the listing
+                continue
+            entries.append((stat.st_mtime_ns, name[:-4], stat.st_size))
+        return sorted(entries)
+
+    def _evict(self):
+        entries = self._entries()
+        total_bytes = sum(size for _, _, size in entries)
+        for _, key, size in entries:
+            if total_bytes <= self.max_bytes and len(entries) <= self.max_entries:
+                break
+            entries = entries[1:]
+            total_bytes -= size
+            try:
+                os.remove(self._path(key))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _touch(path: str):
+        # An explicit timestamp: the filesystem's own clock can be too coarse
+        # to order a write and a read made a few milliseconds apart
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def _load(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                arrays = data["vertices"], data["faces"]
+            self._touch(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return arrays
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        with self._lock:
+            arrays = self._load(key)
+            if arrays is not None:
+                self.hits += 1
+            return arrays
+
+    def get_many(self, keys: List[str]) -> Optional[List[Tuple[np.ndarray, np.ndarray]]]:
+        """Return every entry for ``keys`` as one hit, or ``None`` unless all are cached"""
+        with self._lock:
+            if not all(os.path.exists(self._path(key)) for key in keys):
+                return None
+            entries = [self._load(key) for key in keys]
+            if any(entry is None for entry in entries):
+                return None
+            self.hits += 1
+            return entries
+
+    def put(self, key: str, vertices: np.ndarray, faces: np.ndarray):
+        path = self._path(key)
+        # Unique across processes sharing the directory, not just threads
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, vertices=vertices, faces=faces)
+        os.replace(temp_path, path)
+        self._touch(path)
+
+        with self._lock:
+            self._evict()
+
+    def inflight(self, key: str) -> Optional[Any]:
+        """Return the in-progress computation for ``key``, if there is one"""
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+            return pending
+
+    def coalesce(self, key: str, start: Callable[[], Any]) -> Tuple[Any, bool]:
+        """The in-progress computation for ``key``, or a new one from ``start()``, registered atomically.
+
+        Returns ``(pending, started)``. Checking and registering under one
+        lock means identical concurrent requests can't both miss and both
+        generate. ``start`` runs under the lock, so it must not block; if it
+        raises, nothing is registered.
+        """
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                return pending, False
+            pending = start()
+            self.misses += 1
+            self._inflight[key] = pending
+            return pending, True
+
+    def track(self, key: str, pending: Any):
+        """Register a new computation for ``key``; this is what counts as a miss"""
+        with self._lock:
+            self.misses += 1
+            self._inflight[key] = pending
+
+    def release(self, key: str):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "inflight": len(self._inflight),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,276 @@
+"""
+Serialize meshes to GLB/PLY/OBJ in memory, with optional compact encodings
+"""
+import io
+import json
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from mesh_postprocess import vertex_normals
+
+MEDIA_TYPES = {
+    "glb": "model/gltf-binary",
+    "obj": "application/octet-stream",
+    "ply": "application/octet-stream",
+}
+
+# glTF constants
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+BYTE = 5120
+UNSIGNED_SHORT = 5123
+UNSIGNED_INT = 5125
+FLOAT = 5126
+
+GLB_MAGIC = 0x46546C67
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+
+
+def index_dtype(n_vertices: int) -> np.dtype:
+    """Use 16-bit indices whenever every vertex index fits"""
+    return np.dtype(np.uint16) if n_vertices < 65535 else np.dtype(np.uint32)
+
+
+def _pad4(data: bytes, fill: bytes = b"\0") -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+class _GLBBuilder:
+    """Accumulates buffer views and accessors for a single-buffer GLB"""
+
+    def __init__(self, compress: bool):
+        self.compress = compress
+        self.chunks: List[bytes] = []
+        self.offset = 0
+        self.fallback_length = 0
+        self.buffer_views: List[dict] = []
+        self.accessors: List[dict] = []
+
+    def _append(self, data: bytes) -> Tuple[int, int]:
+        offset = self.offset
+        self.chunks.append(_pad4(data))
+        self.offset += len(self.chunks[-1])
+        return offset, len(data)
+
+    def add_view(self, array: np.ndarray, target: int, stride: Optional[int] = None) -> int:
+        array = np.ascontiguousarray(array)
+        if not self.compress:
+            offset, length = self._append(array.tobytes())
+            view = {"buffer": 0, "byteOffset": offset, "byteLength": length, "target": target}
+            if stride is not None:
+                view["byteStride"] = stride
+        else:
+            import meshoptimizer
+
+            if target == ELEMENT_ARRAY_BUFFER:
+                indices = array.reshape(-1).astype(np.uint32)
+                encoded = meshoptimizer.encode_index_buffer(indices, len(indices), int(indices.max()) + 1)
+                count, byte_stride, mode = len(indices), array.itemsize, "TRIANGLES"
+            else:
+                count, byte_stride, mode = len(array), stride, "ATTRIBUTES"
+                encoded = meshoptimizer.encode_vertex_buffer(array, count, byte_stride)
+            offset, length = self._append(bytes(encoded))
+            view = {
+                "buffer": 1,
+                "byteOffset": self.fallback_length,
+                "byteLength": array.nbytes,
+                "target": target,
+                "extensions": {
+                    "EXT_meshopt_compression": {
+                        "buffer": 0,
+                        "byteOffset": offset,
+                        "byteLength": length,
+                        "byteStride": byte_stride,
+                        "mode": mode,
+                        "count": count,
+                    }
+                },
+            }
+            if stride is not None:
+                view["byteStride"] = stride
+            self.fallback_length += array.nbytes + (-array.nbytes % 4)
+        self.buffer_views.append(view)
+        return len(self.buffer_views) - 1
+
+    def add_accessor(self, view: int, component_type: int, count: int, type_: str, **extra) -> int:
+        accessor = {"bufferView": view, "componentType": component_type, "count": count, "type": type_}
+        accessor.update(extra)
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def _add_primitive(builder: _GLBBuilder, vertices: np.ndarray, faces: np.ndarray, quantize: bool) -> Tuple[dict, dict]:
+    """Write one mesh's attributes and indices; returns (primitive, node transform)"""
+    vertices = np.asarray(vertices, dtype=np.float32)
+    faces = np.asarray(faces)
+    normals = vertex_normals(vertices, faces)
+    n = len(vertices)
+
+    if builder.compress:
+        import meshoptimizer
+
+        # Reordering triangles for the post-transform cache also makes the index stream compress better
+        reordered = np.empty(faces.size, dtype=np.uint32)
+        meshoptimizer.optimize_vertex_cache(reordered, faces.reshape(-1).astype(np.uint32), faces.size, n)
+        faces = reordered.reshape(-1, 3)
+
+    transform = {}
+    if quantize:
+        # Positions: uint16 on a uniform grid over the bounding box, dequantized by the node transform
+        lo = vertices.min(axis=0)
+        extent = float((vertices.max(axis=0) - lo).max()) or 1.0
+        scale = extent / 65535.0
+        q = np.zeros((n, 4), dtype=np.uint16)
+        q[:, :3] = np.round((vertices - lo) / scale)
+        view = builder.add_view(q, ARRAY_BUFFER, stride=8)
+        position = builder.add_accessor(
+            view, UNSIGNED_SHORT, n, "VEC3",
+            min=q[:, :3].min(axis=0).tolist(), max=q[:, :3].max(axis=0).tolist(),
+        )
+        transform = {"translation": lo.tolist(), "scale": [scale] * 3}
+
+        # Normals: normalized int8, padded to a 4-byte stride
+        qn = np.zeros((n, 4), dtype=np.int8)
+        qn[:, :3] = np.round(np.clip(normals, -1, 1) * 127)
+        view = builder.add_view(qn, ARRAY_BUFFER, stride=4)
+        normal = builder.add_accessor(view, BYTE, n, "VEC3", normalized=True)
+    else:
+        view = builder.add_view(vertices, ARRAY_BUFFER, stride=12)
+        position = builder.add_accessor(
+            view, FLOAT, n, "VEC3",
+            min=vertices.min(axis=0).tolist(), max=vertices.max(axis=0).tolist(),
+        )
+        view = builder.add_view(normals, ARRAY_BUFFER, stride=12)
+        normal = builder.add_accessor(view, FLOAT, n, "VEC3")
+
+    indices = faces.reshape(-1).astype(index_dtype(n))
+    view = builder.add_view(indices, ELEMENT_ARRAY_BUFFER)
+    index = builder.add_accessor(
+        view, UNSIGNED_SHORT if indices.dtype == np.uint16 else UNSIGNED_INT, len(indices), "SCALAR",
+    )
+
+    primitive = {"attributes": {"POSITION": position, "NORMAL": normal}, "indices": index, "mode": 4}
+    return primitive, transform
+
+
+def export_glb(
+    meshes: List[Tuple[np.ndarray, np.ndarray]],
+    names: Optional[List[str]] = None,
+    quantize: bool = False,
+    compress: bool = False,
+    lods: bool = False,
+) -> bytes:
+    """Build a GLB with one node per mesh.
+
+    With ``lods`` the meshes are levels of detail, most detailed first: only
+    the first node is in the scene, and it lists the others as MSFT_lod
+    alternatives. Viewers without MSFT_lod then render just LOD0 rather than
+    every level on top of each other. ``quantize`` stores positions as uint16 and normals as int8
+    (KHR_mesh_quantization). ``compress`` additionally applies
+    EXT_meshopt_compression and needs the ``meshoptimizer`` package; without
+    it the mesh is written uncompressed.
+    """
+    if compress:
+        try:
+            import meshoptimizer  # noqa: F401
+        except ImportError:
+            print("meshoptimizer not available, skipping meshopt compression")
+            compress = False
+
+    builder = _GLBBuilder(compress)
+    gltf_meshes, nodes = [], []
+    for i, (vertices, faces) in enumerate(meshes):
+        name = names[i] if names else f"mesh_{i}"
+        primitive, transform = _add_primitive(builder, vertices, faces, quantize)
+        gltf_meshes.append({"name": name, "primitives": [primitive]})
+        nodes.append({"name": name, "mesh": i, **transform})
+
+    extensions = (["KHR_mesh_quantization"] if quantize else []) + (["EXT_meshopt_compression"] if compress else [])
+    scene_nodes = list(range(len(nodes)))
+    optional_extensions = []
+    if lods and len(nodes) > 1:
+        nodes[0]["extensions"] = {"MSFT_lod": {"ids": scene_nodes[1:]}}
+        scene_nodes = [0]
+        optional_extensions.append("MSFT_lod")
+    buffers = [{"byteLength": builder.offset}]
+    if compress:
+        buffers.append({
+            "byteLength": builder.fallback_length,
+            "extensions": {"EXT_meshopt_compression": {"fallback": True}},
+        })
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "sceneit"},
+        "scene": 0,
+        "scenes": [{"nodes": scene_nodes}],
+        "nodes": nodes,
+        "meshes": gltf_meshes,
+        "accessors": builder.accessors,
+        "bufferViews": builder.buffer_views,
+        "buffers": buffers,
+    }
+    if extensions or optional_extensions:
+        gltf["extensionsUsed"] = extensions + optional_extensions
+    if extensions:
+        gltf["extensionsRequired"] = extensions
+
+    json_chunk = _pad4(json.dumps(gltf, separators=(",", ":")).encode(), b" ")
+    bin_chunk = b"".join(builder.chunks)
+    total = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+
+    out = io.BytesIO()
+    out.write(struct.pack("<III", GLB_MAGIC, 2, total))
+    out.write(struct.pack("<II", len(json_chunk), GLB_JSON_CHUNK))
+    out.write(json_chunk)
+    out.write(struct.pack("<II", len(bin_chunk), GLB_BIN_CHUNK))
+    out.write(bin_chunk)
+    return out.getvalue()
+
+
+def export_ply(vertices: np.ndarray, faces: np.ndarray) -> bytes:
+    """Binary little-endian PLY, with 16-bit face indices when they fit"""
+    vertices = np.asarray(vertices, dtype="<f4")
+    idx = index_dtype(len(vertices)).newbyteorder("<")
+    index_type = "ushort" if idx.itemsize == 2 else "uint"
+
+    header = (
+        "ply\nformat binary_little_endian 1.0\n"
+        f"element vertex {len(vertices)}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        f"element face {len(faces)}\n"
+        f"property list uchar {index_type} vertex_indices\n"
+        "end_header\n"
+    ).encode()
+
+    face_records = np.empty(len(faces), dtype=[("n", "u1"), ("v", idx, (3,))])
+    face_records["n"] = 3
+    face_records["v"] = faces
+    return header + vertices.tobytes() + face_records.tobytes()
+
+
+def export_obj(vertices: np.ndarray, faces: np.ndarray) -> bytes:
+    out = io.StringIO()
+    np.savetxt(out, np.asarray(vertices, dtype=np.float32), fmt="v %.6f %.6f %.6f")
+    np.savetxt(out, np.asarray(faces) + 1, fmt="f %d %d %d")
+    return out.getvalue().encode()
+
+
+def export_mesh(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    output_format: str,
+    quantize: bool = False,
+    compress: bool = False,
+) -> bytes:
+    """Serialize a mesh to bytes; compact encodings only apply to GLB"""
+    if output_format == "glb":
+        return export_glb([(vertices, faces)], quantize=quantize, compress=compress)
+    if output_format == "ply":
+        return export_ply(vertices, faces)
+    if output_format == "obj":
+        return export_obj(vertices, faces)
+    raise ValueError(f"Unsupported output format: {output_format}")
+
@@ -0,0 +1,188 @@
+"""
+Mesh clean-up on raw ``(vertices, faces)`` arrays.
+
+Everything is sort- or bincount-based NumPy over the whole mesh at once:
+no per-face Python loops, no round trip through another mesh library, and
+``trimesh.Trimesh`` objects are only built at the end with
+``process=False``, so nothing is validated twice.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+import trimesh
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# Vertices closer than this (per axis) are welded, as the processed trimesh.Trimesh
+# of the previous path did; decimation merges at a coarser, bbox-relative
+# distance first (mesh_simplify.MERGE_PERCENT)
+WELD_TOLERANCE = 1e-8
+
+
+def _group_rows(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Group equal rows of ``keys``.
+
+    Returns one representative row index per group, in order of
+    appearance, and the group number of every row.
+    """
+    if keys.shape[1] == 1:
+        order = np.argsort(keys[:, 0])
+        sorted_keys = keys[order]
+    else:
+        # One 1D sort on a 64-bit hash of each row instead of a lexsort over every column
+        hashed = np.zeros(len(keys), dtype=np.uint64)
+        for column, prime in zip(keys.T, (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)):
+            hashed ^= column.astype(np.uint64) * np.uint64(prime)
+        order = np.argsort(hashed)
+        sorted_keys = keys[order]
+        sorted_hashed = hashed[order]
+        same_hash = sorted_hashed[1:] == sorted_hashed[:-1]
+        if not np.array_equal(sorted_keys[1:][same_hash], sorted_keys[:-1][same_hash]):
+            # A hash collision between different rows; vanishingly rare, but stay exact
+            order = np.lexsort(keys.T[::-1])
+            sorted_keys = keys[order]
+    first = np.empty(len(keys), dtype=bool)
+    first[:1] = True
+    np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1, out=first[1:])
+
+    # Number groups by first appearance, so output keeps the input's order (and locality)
+    starts = order[first]
+    by_start = np.argsort(starts)
+    rank = np.empty(len(starts), dtype=np.int64)
+    rank[by_start] = np.arange(len(starts))
+    inverse = np.empty(len(keys), dtype=np.int64)
+    inverse[order] = rank[np.cumsum(first) - 1]
+    return starts[by_start], inverse
+
+
+def weld_vertices(
+    vertices: np.ndarray, faces: np.ndarray, tolerance: float = WELD_TOLERANCE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge vertices that fall in the same ``tolerance`` grid cell and reindex ``faces``.
+
+    With ``tolerance=0`` only bit-identical positions are merged.
+    """
+    if len(vertices) == 0:
+        return vertices, faces
+    if tolerance > 0:
+        keys = np.round(np.multiply(vertices, 1 / tolerance, dtype=np.float64)).astype(np.int64)
+    else:
+        # + 0.0 turns -0.0 into 0.0 so both hash alike
+        keys = np.ascontiguousarray(vertices + 0.0).view(np.uint32 if vertices.dtype == np.float32 else np.uint64)
+    first, inverse = _group_rows(keys)
+    if len(first) == len(vertices):
+        return vertices, faces
+    return vertices[first], inverse[faces]
+
+
+def remove_degenerate_faces(vertices: np.ndarray, faces: np.ndarray, area_epsilon: float = 0.0) -> np.ndarray:
+    """Faces that repeat a vertex (e.g. after welding) or whose area is at most ``area_epsilon`` are dropped"""
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 0] != faces[:, 2])
+    if area_epsilon > 0:
+        keep &= face_areas(vertices, faces) > area_epsilon
+    return faces if keep.all() else faces[keep]
+
+
+def remove_duplicate_faces(faces: np.ndarray, n_vertices: int) -> np.ndarray:
+    """Keep one of each set of faces that use the same three vertices, in any order or winding"""
+    if len(faces) == 0:
+        return faces
+    corners = np.sort(faces, axis=1).astype(np.int64)
+    if n_vertices < 1 << 21:
+        # Three 21-bit indices pack into one int64
+        keys = ((corners[:, 0] << 42) | (corners[:, 1] << 21) | corners[:, 2])[:, None]
+        # Generated meshes rarely have any; a plain sort is enough to find out
+        sorted_keys = np.sort(keys[:, 0])
+        if not np.any(sorted_keys[1:] == sorted_keys[:-1]):
+            return faces
+    else:
+        keys = corners
+    first, _ = _group_rows(keys)
+    if len(first) == len(faces):
+        return faces
+    return faces[first]
+
+
+def remove_unreferenced_vertices(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Drop vertices no face uses, keeping the rest in order"""
+    used = np.zeros(len(vertices), dtype=bool)
+    used[faces.ravel()] = True
+    if used.all():
+        return vertices, faces
+    remap = np.cumsum(used) - 1
+    return vertices[used], remap[faces]
+
+
+def face_normals(vertices: np.ndarray, faces: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """Per-face normals; unnormalized, their length is twice the face area"""
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    a, b = v1 - v0, v2 - v0
+    normals = np.empty_like(a)
+    normals[:, 0] = a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1]
+    normals[:, 1] = a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2]
+    normals[:, 2] = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    if normalize:
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals /= np.where(length > 0, length, 1)
+    return normals
+
+
+def face_areas(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    return np.linalg.norm(face_normals(vertices, faces, normalize=False), axis=1) / 2
+
+
+def vertex_normals(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+    """Area-weighted vertex normals, as float32 unit vectors"""
+    weighted = face_normals(vertices, faces, normalize=False)
+    normals = np.zeros((len(vertices), 3), dtype=np.float64)
+    for corner in range(3):
+        for axis in range(3):
+            normals[:, axis] += np.bincount(faces[:, corner], weighted[:, axis], minlength=len(vertices))
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals /= np.where(length > 0, length, 1)
+    return normals.astype(np.float32)
+
+
+def face_components(faces: np.ndarray, n_vertices: int) -> np.ndarray:
+    """Connected component label of every face, components sharing at least one vertex"""
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]]])
+    graph = coo_matrix(
+        (np.ones(len(edges), dtype=np.int8), (edges[:, 0], edges[:, 1])), shape=(n_vertices, n_vertices)
+    )
+    _, labels = connected_components(graph, directed=False)
+    return labels[faces[:, 0]]
+
+
+def remove_small_components(faces: np.ndarray, n_vertices: int, min_fraction: float) -> np.ndarray:
+    """Drop components with fewer than ``min_fraction`` of the largest component's faces (floaters)"""
+    if min_fraction <= 0 or len(faces) == 0:
+        return faces
+    labels = face_components(faces, n_vertices)
+    sizes = np.bincount(labels)
+    keep = sizes[labels] >= min_fraction * sizes.max()
+    return faces if keep.all() else faces[keep]
+
+
+def clean_mesh(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    weld_tolerance: float = WELD_TOLERANCE,
+    min_component_fraction: float = 0.0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Weld, drop degenerate and duplicate faces, optionally drop floaters, and compact.
+
+    Returns float32 vertices and int64 faces that are safe to build a
+    ``trimesh.Trimesh`` from with ``process=False``.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    faces = np.asarray(faces, dtype=np.int64)
+    vertices, faces = weld_vertices(vertices, faces, weld_tolerance)
+    faces = remove_degenerate_faces(vertices, faces)
+    faces = remove_duplicate_faces(faces, len(vertices))
+    faces = remove_small_components(faces, len(vertices), min_component_fraction)
+    return remove_unreferenced_vertices(vertices, faces)
+
+
+def to_trimesh(vertices: np.ndarray, faces: np.ndarray, normals: Optional[np.ndarray] = None) -> trimesh.Trimesh:
+    """Wrap already-clean arrays without any further processing"""
+    return trimesh.Trimesh(vertices=vertices, faces=faces, vertex_normals=normals, process=False)
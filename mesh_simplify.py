@@ -0,0 +1,86 @@
+"""
+Mesh decimation and level-of-detail chains
+"""
+import os
+from typing import List, Tuple
+
+import numpy as np
+import trimesh
+
+from mesh_postprocess import remove_unreferenced_vertices, to_trimesh
+
+# Each level is one more decimation pass per request
+MAX_LODS = 8
+
+# Before decimating, merge vertices closer than this percentage of the bounding box
+# diagonal (pymeshlab's default, which closes marching cubes seams); 0 skips it
+MERGE_PERCENT = float(os.environ.get("TRIPOSG_DECIMATE_MERGE_PERCENT", "1"))
+
+
+def decimate(
+    vertices: np.ndarray, faces: np.ndarray, n_faces: int, merge_percent: float = MERGE_PERCENT
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Quadric edge-collapse decimation of welded arrays (see ``mesh_postprocess.clean_mesh``) using pymeshlab.
+
+    Vertices within ``merge_percent`` of the bounding box diagonal are merged
+    first, as pymeshlab's ``meshing_merge_close_vertices`` does by default.
+    """
+    try:
+        import pymeshlab
+
+        ms = pymeshlab.MeshSet()
+        ms.add_mesh(pymeshlab.Mesh(vertex_matrix=np.asarray(vertices, dtype=np.float64), face_matrix=faces))
+        if merge_percent > 0:
+            ms.meshing_merge_close_vertices(threshold=pymeshlab.PercentageValue(merge_percent))
+        ms.meshing_decimation_quadric_edge_collapse(targetfacenum=n_faces)
+
+        simplified = ms.current_mesh()
+        return remove_unreferenced_vertices(
+            simplified.vertex_matrix().astype(np.float32), simplified.face_matrix().astype(np.int64)
+        )
+    except ImportError:
+        print("pymeshlab not available, skipping mesh simplification")
+        return vertices, faces
+    except Exception as e:
+        print(f"Mesh simplification failed: {e}")
+        return vertices, faces
+
+
+def simplify_mesh(mesh: trimesh.Trimesh, n_faces: int) -> trimesh.Trimesh:
+    """Simplify a welded mesh using pymeshlab"""
+    return to_trimesh(*decimate(mesh.vertices, mesh.faces, n_faces))
+
+
+def build_lods(vertices: np.ndarray, faces: np.ndarray, targets: List[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Build progressively decimated meshes, one per face target.
+
+    Levels are produced from the densest target down, each decimated from
+    the previous level rather than the full mesh, so every step only has to
+    collapse the difference. Results are returned in the order of ``targets``.
+    """
+    levels = {}
+    current = (vertices, faces)
+    for target in sorted(set(targets), reverse=True):
+        if target > 0 and len(current[1]) > target:
+            current = decimate(*current, target)
+        levels[target] = current
+    return [levels[target] for target in targets]
+
+
+def parse_lods(lods: str) -> List[int]:
+    """Parse a ``lods`` query value such as ``200000,50000,10000`` or ``[200000,50000]``.
+
+    Face counts must be positive and strictly decreasing, at most ``MAX_LODS`` of them.
+    """
+    parts = [part.strip() for part in lods.strip().strip("[]").split(",") if part.strip()]
+    try:
+        targets = [int(part) for part in parts]
+    except ValueError:
+        raise ValueError("lods must be a comma-separated list of face counts, e.g. 200000,50000,10000") from None
+    if not targets or any(target <= 0 for target in targets):
+        raise ValueError("lods must be a list of positive face counts")
+    if len(targets) > MAX_LODS:
+        raise ValueError(f"lods may list at most {MAX_LODS} levels")
+    if any(later >= earlier for earlier, later in zip(targets, targets[1:])):
+        raise ValueError("lods face counts must be strictly decreasing")
+    return targets
@@ -0,0 +1,158 @@
+"""
+Per-stage latency summaries and gauges, rendered in Prometheus text format
+"""
+import os
+import resource
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Summary:
+    """Count, sum and quantiles over a sliding window of recent observations"""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self._window: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self._window.append(value)
+
+    def quantiles(self) -> List[Tuple[float, float]]:
+        values = sorted(self._window)
+        if not values:
+            return [(q, float("nan")) for q in QUANTILES]
+        return [(q, values[min(len(values) - 1, int(q * len(values)))]) for q in QUANTILES]
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux); unlike the peak, it drops when memory is given back"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def accelerator_memory() -> Dict[str, float]:
+    """Current and peak allocated accelerator memory, if an accelerator is in use"""
+    try:
+        import torch
+    except ImportError:
+        return {}
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        return {
+            "allocated": torch.cuda.memory_allocated(),
+            "peak": torch.cuda.max_memory_allocated(),
+        }
+    if hasattr(torch, "mps") and torch.backends.mps.is_available():
+        return {"allocated": torch.mps.current_allocated_memory()}
+    return {}
+
+
+class Metrics:
+    """Collects stage timings, counters and callback gauges for ``/metrics``"""
+
+    def __init__(self, prefix: str = "triposg", window: int = 1024):
+        self.prefix = prefix
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Summary] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+
+    def observe(self, stage: str, seconds: float, timings: Optional[Dict[str, float]] = None):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = Summary(self.window)
+            self._stages[stage].observe(seconds)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+        """Time a block as ``stage``, also adding it to a per-request ``timings`` dict"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0, timings)
+
+    def inc(self, name: str, value: float = 1.0):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + value
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float]):
+        """Register a gauge whose value is read when metrics are rendered"""
+        self._gauges[name] = (help_text, fn)
+
+    def reset_stages(self):
+        """Drop stage observations, e.g. those recorded during warmup"""
+        with self._lock:
+            self._stages.clear()
+
+    def stage_quantiles(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: {f"p{int(q * 100)}": value for q, value in summary.quantiles()}
+                for stage, summary in self._stages.items()
+            }
+
+    def render(self) -> str:
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Latency of each processing stage",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        with self._lock:
+            for stage, summary in sorted(self._stages.items()):
+                for q, value in summary.quantiles():
+                    lines.append(f'{p}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {summary.total:.6f}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {summary.count}')
+            counters = sorted(self._counters.items())
+
+        for name, value in counters:
+            lines.append(f"# TYPE {p}_{name} counter")
+            lines.append(f"{p}_{name} {_format(value)}")
+
+        gauges = dict(self._gauges)
+        gauges["process_peak_rss_bytes"] = ("Peak resident set size of the server process", peak_rss_bytes)
+        gauges["process_rss_bytes"] = ("Resident set size of the server process", rss_bytes)
+        for name, (help_text, fn) in sorted(gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name} {_format(value)}")
+
+        memory = accelerator_memory()
+        if memory:
+            lines.append(f"# TYPE {p}_accelerator_memory_bytes gauge")
+            for kind, value in memory.items():
+                lines.append(f'{p}_accelerator_memory_bytes{{kind="{kind}"}} {_format(value)}')
+
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Format per-request timings as a ``Server-Timing`` header value"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
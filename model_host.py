@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Model host: one process owns the TripoSG weights and serves inference to
+HTTP worker processes over local IPC.
+
+HTTP workers decode uploads, post-process and encode responses; they send
+images to the host and get raw ``(vertices, faces)`` samples back. Requests
+from all workers share the host's job queue, so they are batched together.
+
+    export TRIPOSG_MODEL_HOST_AUTHKEY=$(openssl rand -hex 32)
+    python model_host.py --address 127.0.0.1:8011
+    TRIPOSG_MODEL_HOST=127.0.0.1:8011 uvicorn generate_3d_model:app --workers 4
+"""
+import argparse
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from postprocess_pool import share_array, take_arrays
+
+DEFAULT_ADDRESS = "127.0.0.1:8011"
+
+# Jobs waiting on the host, across all HTTP workers
+HOST_QUEUE_SIZE = int(os.environ.get("TRIPOSG_MODEL_HOST_QUEUE_SIZE", "64"))
+
+
+def authkey_from_env() -> bytes:
+    """The secret shared by the host and its workers, from TRIPOSG_MODEL_HOST_AUTHKEY.
+
+    There is deliberately no default: connections exchange pickles, so
+    anyone who knows the key can run code in the host.
+    """
+    key = os.environ.get("TRIPOSG_MODEL_HOST_AUTHKEY", "")
+    if not key:
+        raise RuntimeError("TRIPOSG_MODEL_HOST_AUTHKEY must be set to a secret shared by the model host and its workers")
+    return key.encode()
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """``host:port`` for TCP, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+class ModelHostClient:
+    """Connection from an HTTP worker to the model host.
+
+    One connection carries any number of concurrent requests; a reader
+    thread routes progress updates and results back to their futures.
+    """
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None):
+        self.address = address
+        self.authkey = authkey or authkey_from_env()
+        self._conn: Optional[Connection] = None
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: Dict[int, Tuple[Future, Optional[Callable[..., None]], Optional[Dict[str, float]]]] = {}
+        # What the host's pipeline supports, sent by the host on connect
+        self.info: Dict[str, Any] = {}
+
+    def connect(self, timeout: float = 600.0):
+        """Connect, retrying until the host is listening (it listens once its models are warm)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._conn = Client(parse_address(self.address), authkey=self.authkey)
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+        _, _, self.info = self._conn.recv()
+        threading.Thread(target=self._read, name="model-host-client", daemon=True).start()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+    def generate(
+        self,
+        image: Image.Image,
+        seed: int,
+        num_inference_steps: int,
+        guidance_scale: float,
+        progress: Optional[Callable[..., None]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        scheduler: str = "default",
+        guidance_cutoff: float = 1.0,
+        deadline: Optional[float] = None,
+    ) -> "Future[Tuple[np.ndarray, np.ndarray]]":
+        """Run inference on the host; stage timings are added to ``timings`` before the future resolves.
+
+        Cancelling the returned future cancels the job on the host, which
+        also drops it by itself once ``deadline`` (a ``time.time()``) passes.
+        """
+        request_id = next(self._ids)
+        future: Future = Future()
+        with self._lock:
+            self._pending[request_id] = (future, progress, timings)
+        params = {
+            "seed": seed,
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+            "scheduler": scheduler,
+            "guidance_cutoff": guidance_cutoff,
+            "deadline": deadline,
+        }
+        try:
+            with self._send_lock:
+                self._conn.send(("generate", request_id, params, np.asarray(image)))
+        except (OSError, AttributeError) as e:
+            with self._lock:
+                self._pending.pop(request_id, None)
+            future.set_exception(ConnectionError(f"Model host unavailable: {e}"))
+            return future
+        future.add_done_callback(lambda done: done.cancelled() and self._cancel(request_id))
+        return future
+
+    def _cancel(self, request_id: int):
+        try:
+            with self._send_lock:
+                self._conn.send(("cancel", request_id))
+        except (OSError, AttributeError):
+            pass
+
+    def _read(self):
+        while True:
+            try:
+                kind, request_id, *body = self._conn.recv()
+            except (EOFError, OSError):
+                break
+
+            if kind == "progress":
+                with self._lock:
+                    entry = self._pending.get(request_id)
+                if entry is not None and entry[1] is not None:
+                    entry[1](*body)
+                continue
+
+            with self._lock:
+                entry = self._pending.pop(request_id, None)
+            if entry is None:
+                continue
+            future, _, timings = entry
+            if kind == "result":
+                (vertices_spec, faces_spec), host_timings = body
+                # Taken even for a cancelled request, since taking is what frees the shared blocks
+                try:
+                    samples = tuple(take_arrays([vertices_spec, faces_spec]))
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if future.done():
+                    continue
+                if timings is not None:
+                    timings.update(host_timings)
+                future.set_result(samples)
+            elif not future.done():
+                future.set_exception(RuntimeError(body[0]))
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Lost connection to the model host"))
+
+
+def serve(address: str = DEFAULT_ADDRESS, authkey: Optional[bytes] = None, stub: bool = False):
+    """Load and warm up the models, then accept worker connections forever"""
+    # Before loading anything, so a missing key fails fast
+    authkey = authkey or authkey_from_env()
+    import inference
+    from embedding_cache import cache_image_encoder
+    from image_preprocess import synthetic_image
+    from job_queue import Job, JobQueue
+    from samplers import can_skip_guidance
+
+    t0 = time.perf_counter()
+    pipe, rmbg_net = inference.load_models(stub=stub)
+    for i in range(inference.WARMUP_RUNS):
+        inference.generate_samples(pipe, [synthetic_image()], rmbg_net, [i], num_inference_steps=inference.WARMUP_STEPS)
+    inference.metrics.reset_stages()
+    embedding_cache = inference.make_embedding_cache()
+    cache_image_encoder(pipe, embedding_cache)
+    segmentation_worker = inference.start_segmentation_worker(rmbg_net, embedding_cache)
+    print(f"Models loaded and warmed up on {inference.device} in {time.perf_counter() - t0:.1f}s")
+
+    # job id -> (send function, client request id, that connection's request id -> job id)
+    clients: Dict[str, Tuple[Callable[[Any], None], int, Dict[int, str]]] = {}
+
+    def run_batch(jobs: List[Job]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        def progress(stage: str, step: int = 0, total_steps: int = 0):
+            for job in jobs:
+                # reply() may drop the entry at any time, when a worker cancels or disconnects
+                entry = clients.get(job.id)
+                if entry is None:
+                    continue
+                send, request_id, _ = entry
+                try:
+                    send(("progress", request_id, stage, step, total_steps))
+                except Exception as e:
+                    # Progress is best effort; it must never fail the batch
+                    print(f"Failed to send progress for job {job.id}: {e}")
+
+        timings: Dict[str, float] = {}
+        samples = inference.generate_samples(
+            pipe=pipe,
+            images=[job.payload for job in jobs],
+            rmbg_net=rmbg_net,
+            seeds=[job.params["seed"] for job in jobs],
+            num_inference_steps=jobs[0].params["num_inference_steps"],
+            guidance_scale=jobs[0].params["guidance_scale"],
+            scheduler=jobs[0].params.get("scheduler", "default"),
+            guidance_cutoff=jobs[0].params.get("guidance_cutoff", 1.0),
+            progress=progress,
+            timings=timings,
+            cancelled=lambda: job_queue.expire(jobs),
+            cache=embedding_cache,
+        )
+        for job in jobs:
+            job.timings.update(timings)
+        return samples
+
+    job_queue = JobQueue(
+        handler=run_batch,
+        maxsize=HOST_QUEUE_SIZE,
+        max_finished=0,
+        max_batch_size=inference.MAX_BATCH_SIZE,
+        max_wait=inference.BATCH_WAIT_MS / 1000,
+        batch_key=inference.batch_key,
+    )
+    job_queue.start()
+
+    def reply(job: Job, done: Future):
+        send, request_id, requests = clients.pop(job.id)
+        requests.pop(request_id, None)
+        if done.exception() is not None:
+            send(("error", request_id, str(done.exception())))
+            return
+        vertices, faces = done.result()
+        blocks, specs = [], []
+        for array in (vertices, faces):
+            shm, spec = share_array(array)
+            shm.close()
+            blocks.append(shm)
+            specs.append(spec)
+        if send(("result", request_id, tuple(specs), job.timings)):
+            # The worker unlinks the blocks after copying the result out, so this
+            # process's resource tracker must not unlink them again at exit
+            for shm in blocks:
+                resource_tracker.unregister(shm._name, "shared_memory")
+        else:
+            for shm in blocks:
+                shm.unlink()
+
+    def handle(conn: Connection):
+        send_lock = threading.Lock()
+
+        def send(message: Any) -> bool:
+            try:
+                with send_lock:
+                    conn.send(message)
+                return True
+            except OSError:
+                return False
+
+        send(("info", None, {"guidance_skipping": can_skip_guidance(pipe)}))
+        # Request ids are per connection
+        requests: Dict[int, str] = {}
+        while True:
+            try:
+                kind, request_id, *body = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "cancel":
+                job_id = requests.get(request_id)
+                if job_id is not None:
+                    job_queue.cancel(job_id)
+                continue
+            image = None
+            try:
+                params, image = body
+                image = Image.fromarray(image)
+                if segmentation_worker is not None:
+                    image = segmentation_worker.submit(image)
+                job = job_queue.submit(params, image, deadline=params.get("deadline"))
+            except Exception as e:
+                # A bad request fails alone; the connection keeps serving the others
+                if isinstance(image, Future):
+                    image.cancel()
+                send(("error", request_id, str(e) or type(e).__name__))
+                continue
+            clients[job.id] = (send, request_id, requests)
+            requests[request_id] = job.id
+            job.future.add_done_callback(lambda done, job=job: reply(job, done))
+        # The worker is gone; nobody wants its jobs any more
+        for job_id in list(requests.values()):
+            job_queue.cancel(job_id)
+        conn.close()
+
+    listener = Listener(parse_address(address), authkey=authkey)
+    print(f"Model host listening on {address}")
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=handle, args=(conn,), name="model-host-conn", daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve TripoSG inference to HTTP worker processes")
+    parser.add_argument("--address", default=os.environ.get("TRIPOSG_MODEL_HOST") or DEFAULT_ADDRESS)
+    parser.add_argument("--stub", action="store_true", default=os.environ.get("TRIPOSG_STUB_MODELS", "0") == "1")
+    args = parser.parse_args()
+    serve(args.address, stub=args.stub)
@@ -0,0 +1,275 @@
+"""
+Low-memory execution: only the model components of the running stage keep
+their weights resident. The rest are offloaded, to host memory on an
+accelerator or to a memory-mapped file on CPU, and brought back when their
+stage starts, with the next stage's component prefetched in the background.
+"""
+import functools
+import itertools
+import mmap
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
+
+import torch
+
+# Methods through which a stage uses a component (the VAE is used through ``decode``)
+ENTRY_POINTS = ("forward", "decode")
+
+# Pipeline components in the order a request uses them; BriaRMBG runs before all of them
+PIPELINE_COMPONENTS = ("image_encoder_dinov2", "image_encoder", "image_projection", "transformer", "vae")
+
+# Tensors in a mapped weight file start at multiples of this many bytes
+ALIGNMENT = 64
+
+
+def _tensors(module: torch.nn.Module) -> List[torch.Tensor]:
+    """Parameters and buffers that can be moved, each once (tied weights are shared)"""
+    seen = set()
+    tensors = []
+    for tensor in itertools.chain(module.parameters(), module.buffers()):
+        if id(tensor) in seen or tensor.is_quantized or tensor.numel() == 0:
+            continue
+        seen.add(id(tensor))
+        tensors.append(tensor)
+    return tensors
+
+
+def pipeline_components(pipe: Any, rmbg: Optional[torch.nn.Module] = None) -> List[Tuple[str, torch.nn.Module]]:
+    """``(name, module)`` for BriaRMBG and every pipeline component, in the order a request uses them"""
+    components = [("rmbg", rmbg)] if isinstance(rmbg, torch.nn.Module) else []
+    for name in PIPELINE_COMPONENTS:
+        module = getattr(pipe, name, None)
+        if isinstance(module, torch.nn.Module):
+            components.append((name, module))
+    return components
+
+
+class _MappedWeights:
+    """A module's weights moved into one memory-mapped file.
+
+    Clean file-backed pages count as resident only while touched, and can
+    be dropped with ``MADV_DONTNEED`` and read back from the page cache on
+    the next use, so an idle component costs no process memory.
+    """
+
+    def __init__(self, tensors: List[torch.Tensor], directory: str, name: str):
+        fd, path = tempfile.mkstemp(prefix=f"triposg-{name}-", suffix=".weights", dir=directory)
+        layout = []
+        offset = 0
+        with os.fdopen(fd, "wb") as f:
+            for tensor in tensors:
+                offset = -(-offset // ALIGNMENT) * ALIGNMENT
+                f.seek(offset)
+                f.write(tensor.detach().contiguous().reshape(-1).view(torch.uint8).numpy().data)
+                layout.append(offset)
+                offset += tensor.nbytes
+        with open(path, "r+b") as f:
+            # Copy-on-write, so tensors are writable as far as torch is concerned; weights are never written
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        # The mapping keeps the data alive; the name is not needed any more
+        os.unlink(path)
+        for tensor, start in zip(tensors, layout):
+            mapped = torch.frombuffer(self.mapping, dtype=tensor.dtype, count=tensor.numel(), offset=start)
+            tensor.data = mapped.view(tensor.shape)
+
+    def prefetch(self):
+        self.mapping.madvise(mmap.MADV_WILLNEED)
+
+    def release(self):
+        self.mapping.madvise(mmap.MADV_DONTNEED)
+
+
+class _Component:
+    def __init__(self, name: str, module: torch.nn.Module):
+        self.name = name
+        self.module = module
+        self.tensors = _tensors(module)
+        self.nbytes = sum(t.nbytes for t in self.tensors)
+        self.resident = False
+        self.in_use = 0
+        self.last_used = 0.0
+        # Set while a copy to the device is in flight (CUDA event) or done being prefetched
+        self.ready: Optional[Any] = None
+        self.prefetched = False
+        self.host: List[torch.Tensor] = []
+        self.mapped: Optional[_MappedWeights] = None
+
+
+class StageOffloader:
+    """Keeps the weights of idle components off ``device``.
+
+    ``components`` are ``(name, module)`` pairs in the order a request uses
+    them. Calling a component (``forward``, or ``decode`` for the VAE)
+    makes it resident, evicting least recently used idle components until
+    resident weights fit ``budget_bytes`` (0: only the running component;
+    -1: the two largest components, so one prefetch always fits), and
+    starts loading the next component in the background.
+
+    On an accelerator, offloaded weights live in pinned host memory and are
+    copied on a side stream. On CPU they live in a memory-mapped file, so
+    evicting drops their pages from the process and prefetching asks the
+    kernel to read them ahead.
+    """
+
+    def __init__(
+        self,
+        components: List[Tuple[str, torch.nn.Module]],
+        device: Any,
+        budget_bytes: int = -1,
+        prefetch: bool = True,
+        directory: Optional[str] = None,
+        metrics: Optional[Any] = None,
+    ):
+        self.device = torch.device(device)
+        self.mapped = self.device.type == "cpu"
+        self.prefetch = prefetch
+        self.metrics = metrics
+        self._lock = threading.RLock()
+        self._stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+        # Components without weights (e.g. stubs) have nothing to move
+        self.components = [c for c in (_Component(name, module) for name, module in components) if c.nbytes > 0]
+        sizes = sorted((c.nbytes for c in self.components), reverse=True)
+        self.budget_bytes = sum(sizes[:2]) if budget_bytes < 0 else budget_bytes
+        self.peak_resident_bytes = 0
+
+        for component in self.components:
+            if self.mapped:
+                component.mapped = _MappedWeights(component.tensors, directory or tempfile.gettempdir(), component.name)
+                component.mapped.release()
+            else:
+                pin = self.device.type == "cuda"
+                component.host = [t.detach().to("cpu").pin_memory() if pin else t.detach().to("cpu") for t in component.tensors]
+                for tensor, host in zip(component.tensors, component.host):
+                    tensor.data = host
+                # diffusers picks the execution device from accelerate-style hooks once weights leave it
+                for module in component.module.modules():
+                    module._hf_hook = SimpleNamespace(execution_device=self.device)
+            self._wrap(component)
+        if self._stream is not None:
+            torch.cuda.empty_cache()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(c.nbytes for c in self.components)
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(c.nbytes for c in self.components if c.resident)
+
+    def _wrap(self, component: _Component):
+        for method_name in ENTRY_POINTS:
+            method = getattr(component.module, method_name, None)
+            if method is None:
+                continue
+
+            @functools.wraps(method)
+            def wrapped(*args, _method=method, **kwargs):
+                self._acquire(component)
+                try:
+                    return _method(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        component.in_use -= 1
+
+            setattr(component.module, method_name, wrapped)
+
+    def _acquire(self, component: _Component):
+        with self._lock:
+            component.in_use += 1
+            component.last_used = time.monotonic()
+            if component.resident:
+                if component.prefetched and self.metrics is not None:
+                    self.metrics.inc("offload_prefetch_hits_total")
+                component.prefetched = False
+                ready = component.ready
+            else:
+                self._make_room(component)
+                ready = self._load(component)
+                if self.metrics is not None:
+                    self.metrics.inc("offload_loads_total")
+            upcoming = self._next(component)
+        t0 = time.perf_counter()
+        if ready is not None:
+            # Stream-ordered: the compute stream waits for the copy, the CPU does not
+            torch.cuda.current_stream(self.device).wait_event(ready)
+            for tensor in component.tensors:
+                tensor.data.record_stream(torch.cuda.current_stream(self.device))
+            component.ready = None
+        if self.metrics is not None:
+            self.metrics.observe("offload_wait", time.perf_counter() - t0)
+        if upcoming is not None:
+            self._prefetch(upcoming)
+
+    def _next(self, component: _Component) -> Optional[_Component]:
+        index = self.components.index(component)
+        return self.components[index + 1] if index + 1 < len(self.components) else None
+
+    def _make_room(self, component: _Component):
+        """Evict idle components, least recently used first, until ``component`` fits the budget"""
+        resident = self.resident_bytes + component.nbytes
+        for other in sorted(self.components, key=lambda c: c.last_used):
+            if resident <= self.budget_bytes:
+                break
+            if other is component or not other.resident or other.in_use:
+                continue
+            self._unload(other)
+            resident -= other.nbytes
+
+    def _load(self, component: _Component) -> Optional[Any]:
+        component.resident = True
+        self.peak_resident_bytes = max(self.peak_resident_bytes, self.resident_bytes)
+        if self.mapped:
+            # Pages fault in as the forward pass reads them
+            return None
+        if self._stream is None:
+            for tensor, host in zip(component.tensors, component.host):
+                tensor.data = host.to(self.device)
+            return None
+        with torch.cuda.stream(self._stream):
+            for tensor, host in zip(component.tensors, component.host):
+                tensor.data = host.to(self.device, non_blocking=True)
+            component.ready = torch.cuda.Event()
+            component.ready.record(self._stream)
+        return component.ready
+
+    def _unload(self, component: _Component):
+        component.resident = False
+        component.prefetched = False
+        if self.mapped:
+            component.mapped.release()
+            return
+        for tensor, host in zip(component.tensors, component.host):
+            tensor.data = host
+        component.ready = None
+
+    def _prefetch(self, component: _Component):
+        if not self.prefetch:
+            return
+        with self._lock:
+            if component.resident:
+                return
+            if self.mapped:
+                # Read-ahead into the page cache; nothing is mapped into the process yet
+                component.mapped.prefetch()
+                return
+            if self.resident_bytes + component.nbytes > self.budget_bytes:
+                return
+            self._load(component)
+            component.prefetched = True
+            if self.metrics is not None:
+                self.metrics.inc("offload_prefetches_total")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "device": str(self.device),
+                "budget_bytes": self.budget_bytes,
+                "total_bytes": self.total_bytes,
+                "resident_bytes": self.resident_bytes,
+                "peak_resident_bytes": self.peak_resident_bytes,
+                "components": {c.name: {"bytes": c.nbytes, "resident": c.resident} for c in self.components},
+            }
@@ -0,0 +1,266 @@
+"""
+CPU process pool for mesh decimation and export, fed through shared memory
+"""
+import importlib.util
+import multiprocessing
+import sys
+import time
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import trimesh
+
+from mesh_export import export_glb, export_mesh
+from mesh_postprocess import clean_mesh, to_trimesh
+from mesh_simplify import build_lods, decimate
+
+# (shared memory block name, shape, dtype string)
+ArraySpec = Tuple[str, Tuple[int, ...], str]
+
+
+def share_array(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, ArraySpec]:
+    """Copy an array into a new shared memory block"""
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _open(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python 3.13+: attaching must not register the block for cleanup a second time
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+@contextmanager
+def attached(spec: ArraySpec) -> Iterator[np.ndarray]:
+    """View a shared array without copying it; the view is only valid inside the block"""
+    name, shape, dtype = spec
+    shm = _open(name)
+    try:
+        yield np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    finally:
+        shm.close()
+
+
+def take_array(spec: ArraySpec) -> np.ndarray:
+    """Copy a shared array out of its block and free the block"""
+    name, shape, dtype = spec
+    shm = _open(name)
+    try:
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def discard_array(spec: ArraySpec):
+    """Free a shared array's block without reading it; a block that is already gone is fine"""
+    try:
+        shm = _open(spec[0])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def take_arrays(specs: List[ArraySpec]) -> List[np.ndarray]:
+    """``take_array`` each spec; every block is freed even if copying one of them fails"""
+    arrays: List[np.ndarray] = []
+    try:
+        for spec in specs:
+            arrays.append(take_array(spec))
+    finally:
+        for spec in specs[len(arrays):]:
+            discard_array(spec)
+    return arrays
+
+
+def _share_result(array: np.ndarray) -> ArraySpec:
+    shm, spec = share_array(array)
+    shm.close()  # The parent unlinks it after copying the result out
+    return spec
+
+
+def _share_results(levels: List[Tuple[np.ndarray, np.ndarray]]) -> List[Tuple[ArraySpec, ArraySpec]]:
+    specs: List[ArraySpec] = []
+    try:
+        for vertices, faces in levels:
+            specs += [_share_result(vertices), _share_result(faces)]
+    except BaseException:
+        # The parent never hears of these blocks, so they are freed here
+        for spec in specs:
+            discard_array(spec)
+        raise
+    return list(zip(specs[::2], specs[1::2]))
+
+
+def _simplify_worker(
+    vertices_spec: ArraySpec, faces_spec: ArraySpec, n_faces: int, lods: Optional[List[int]], min_component_fraction: float
+) -> Tuple[List[Tuple[ArraySpec, ArraySpec]], Dict[str, float]]:
+    t0 = time.perf_counter()
+    # Results may be views of the inputs, so they are shared before the inputs are detached
+    with attached(vertices_spec) as vertices, attached(faces_spec) as faces:
+        vertices, faces = clean_mesh(vertices, faces, min_component_fraction=min_component_fraction)
+        t1 = time.perf_counter()
+
+        if lods:
+            levels = build_lods(vertices, faces, lods)
+        elif n_faces > 0 and len(faces) > n_faces:
+            levels = [decimate(vertices, faces, n_faces)]
+        else:
+            levels = [(vertices, faces)]
+        shared = _share_results(levels)
+        del vertices, faces, levels
+    timings = {"meshing": t1 - t0, "simplify": time.perf_counter() - t1}
+    return shared, timings
+
+
+def _export_worker(
+    level_specs: List[Tuple[ArraySpec, ArraySpec]],
+    output_format: str,
+    quantize: bool,
+    compress: bool,
+    names: Optional[List[str]],
+) -> bytes:
+    meshes = []
+    for vertices_spec, faces_spec in level_specs:
+        with attached(vertices_spec) as vertices, attached(faces_spec) as faces:
+            meshes.append((vertices.copy(), faces.copy()))
+
+    if len(meshes) > 1:
+        return export_glb(meshes, names=names, quantize=quantize, compress=compress, lods=True)
+    return export_mesh(meshes[0][0], meshes[0][1], output_format, quantize=quantize, compress=compress)
+
+
+def spawn_from_worker_module():
+    """Start spawned processes from ``postprocess_worker`` rather than the ``__main__`` script.
+
+    A spawned child re-imports the parent's main script as ``__mp_main__``;
+    for the server that is the whole app, its caches and torch, in every
+    pool worker. When ``__main__.__spec__`` is set (as under ``python -m``)
+    multiprocessing imports that module by name instead. Call this from a
+    script's ``__main__`` block, before the pool starts any workers.
+    """
+    sys.modules["__main__"].__spec__ = importlib.util.find_spec("postprocess_worker")
+
+
+class PostprocessPool:
+    """Runs decimation and serialization in worker processes.
+
+    Mesh arrays travel through shared memory rather than being pickled, so
+    the inference thread hands off raw samples and goes straight back to
+    the next diffusion run. With ``workers=0`` everything runs inline.
+    Raw samples are welded and cleaned (``mesh_postprocess.clean_mesh``)
+    before decimation; components smaller than ``min_component_fraction``
+    of the largest are dropped.
+    """
+
+    def __init__(self, workers: int = 2, metrics: Optional[Any] = None, min_component_fraction: float = 0.0):
+        self.workers = workers
+        self.metrics = metrics
+        self.min_component_fraction = min_component_fraction
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if workers > 0:
+            # spawn, not fork: the parent holds model weights and possibly a CUDA context
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _run(self, fn, blocks: List[shared_memory.SharedMemory], *args, inline: bool = False) -> Future:
+        """Submit ``fn`` (or run it on this thread) and free the input blocks once it has finished with them"""
+        if self._executor is None or inline:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = self._executor.submit(fn, *args)
+
+        def release(_):
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        future.add_done_callback(release)
+        return future
+
+    def simplify(
+        self,
+        vertices: np.ndarray,
+        faces: np.ndarray,
+        n_faces: int = -1,
+        lods: Optional[List[int]] = None,
+        timings: Optional[Dict[str, float]] = None,
+        inline: bool = False,
+    ) -> "Future[List[trimesh.Trimesh]]":
+        """Decimate to ``n_faces`` or build an LOD chain; resolves to a list of levels.
+
+        Stage timings measured in the worker are added to ``timings`` and
+        recorded in ``metrics`` before the future resolves. With ``inline``
+        the work runs on the calling thread, e.g. so a profiler sees it.
+        """
+        vertices_shm, vertices_spec = share_array(vertices)
+        faces_shm, faces_spec = share_array(faces)
+        inner = self._run(
+            _simplify_worker, [vertices_shm, faces_shm],
+            vertices_spec, faces_spec, n_faces, lods, self.min_component_fraction, inline=inline,
+        )
+
+        outer: Future = Future()
+
+        def collect(done: Future):
+            try:
+                specs, worker_timings = done.result()
+                # Taken even when the caller has cancelled, since taking is what frees the blocks
+                arrays = take_arrays([spec for level in specs for spec in level])
+                levels = [to_trimesh(v, f) for v, f in zip(arrays[::2], arrays[1::2])]
+                for stage, seconds in worker_timings.items():
+                    if self.metrics is not None:
+                        self.metrics.observe(stage, seconds, timings)
+                    elif timings is not None:
+                        timings[stage] = seconds
+            except Exception as e:
+                error: Optional[Exception] = e
+            else:
+                error = None
+            try:
+                if error is not None:
+                    outer.set_exception(error)
+                else:
+                    outer.set_result(levels)
+            except InvalidStateError:
+                # Cancelled by the caller
+                pass
+
+        inner.add_done_callback(collect)
+        return outer
+
+    def export(
+        self,
+        levels: List[trimesh.Trimesh],
+        output_format: str,
+        quantize: bool = False,
+        compress: bool = False,
+        names: Optional[List[str]] = None,
+        inline: bool = False,
+    ) -> "Future[bytes]":
+        """Serialize one mesh, or several levels of detail as one GLB"""
+        blocks, specs = [], []
+        for level in levels:
+            vertices_shm, vertices_spec = share_array(np.asarray(level.vertices))
+            faces_shm, faces_spec = share_array(np.asarray(level.faces))
+            blocks += [vertices_shm, faces_shm]
+            specs.append((vertices_spec, faces_spec))
+        return self._run(_export_worker, blocks, specs, output_format, quantize, compress, names, inline=inline)
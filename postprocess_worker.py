@@ -0,0 +1,6 @@
+"""
+Entry module for spawned postprocess workers, in place of the parent's main
+script (see ``postprocess_pool.spawn_from_worker_module``)
+"""
+# Loaded at start-up rather than on the worker's first task
+import postprocess_pool  # noqa: F401
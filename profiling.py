@@ -0,0 +1,214 @@
+"""
+Opt-in per-request profiling: a torch.profiler Chrome trace plus a Python
+sampling profile (speedscope format) for one job, kept in a bounded store
+"""
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, ContextManager, Dict, List, Optional, Tuple
+
+import torch
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Trace files kept per job: kind -> file suffix
+TRACE_KINDS = {"chrome": "trace.json", "speedscope": "speedscope.json"}
+
+
+class SamplingProfiler:
+    """Samples the Python stack of the threads currently inside a ``stage``.
+
+    Every ``interval`` seconds a background thread reads
+    ``sys._current_frames()``; each sample is rooted at a synthetic frame
+    named after the stage, so the flame graph splits by stage first.
+    """
+
+    def __init__(self, interval: float = 0.005, max_samples: int = 200000):
+        self.interval = interval
+        self.max_samples = max_samples
+        self._stages: Dict[int, str] = {}
+        self._frames: Dict[Tuple[str, str, int], int] = {}
+        self._samples: List[List[int]] = []
+        self._weights: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = self.stopped_at = 0.0
+
+    def _frame(self, name: str, file: str = "", line: int = 0) -> int:
+        key = (name, file, line)
+        if key not in self._frames:
+            self._frames[key] = len(self._frames)
+        return self._frames[key]
+
+    def _sample(self, elapsed: float):
+        frames = sys._current_frames()
+        for thread_id, stage in list(self._stages.items()):
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(self._frame(code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.append(self._frame(stage))
+            self._samples.append(stack[::-1])
+            self._weights.append(elapsed)
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval) and len(self._samples) < self.max_samples:
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        thread_id = threading.get_ident()
+        self._stages[thread_id] = name
+        try:
+            yield
+        finally:
+            self._stages.pop(thread_id, None)
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        frames = [None] * len(self._frames)
+        for (frame_name, file, line), index in self._frames.items():
+            frames[index] = {"name": frame_name, "file": file, "line": line} if file else {"name": frame_name}
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.stopped_at - self.started_at,
+                "samples": self._samples,
+                "weights": self._weights,
+            }],
+            "exporter": "triposg",
+        }
+
+
+class RequestProfiler:
+    """Profiles one job: torch.profiler for operators, ``SamplingProfiler`` for Python.
+
+    Use as a context manager around the whole job and wrap each part in
+    ``stage(name)``. torch.profiler must start and stop on the same thread,
+    so everything profiled runs on the thread that entered the context.
+    """
+
+    def __init__(self, name: str, interval: float = 0.005):
+        self.name = name
+        self.sampler = SamplingProfiler(interval)
+        self.output: Optional[bytes] = None
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._torch = torch.profiler.profile(activities=activities, record_shapes=True)
+
+    def __enter__(self) -> "RequestProfiler":
+        self._torch.start()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sampler.stop()
+        self._torch.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        with self.sampler.stage(name), torch.profiler.record_function(name):
+            yield
+
+    def chrome_trace(self) -> bytes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.json")
+            self._torch.export_chrome_trace(path)
+            return Path(path).read_bytes()
+
+    def speedscope(self) -> bytes:
+        return json.dumps(self.sampler.to_speedscope(self.name)).encode()
+
+
+def stage(profiler: Optional[RequestProfiler], name: str) -> ContextManager:
+    """``profiler.stage(name)``, or nothing when the request isn't profiled"""
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+class ProfileSampler:
+    """Decides which requests are profiled: explicit requests when ``allow_requests``,
+    plus one in every ``every`` requests (0 disables automatic sampling)"""
+
+    def __init__(self, allow_requests: bool = False, every: int = 0):
+        self.allow_requests = allow_requests
+        self.every = every
+        self._counter = itertools.count(1)
+
+    def should_profile(self, requested: bool) -> bool:
+        if requested:
+            if not self.allow_requests:
+                raise PermissionError("Profiling is disabled on this server")
+            return True
+        return self.every > 0 and next(self._counter) % self.every == 0
+
+
+class TraceStore:
+    """Trace files per job id on disk, oldest jobs removed past ``max_jobs`` or ``max_bytes``"""
+
+    def __init__(self, directory: str, max_jobs: int = 50, max_bytes: int = 512 * 1024 ** 2):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, job_id: str, kind: str) -> Optional[Path]:
+        if not job_id.isalnum() or kind not in TRACE_KINDS:
+            return None
+        path = self.directory / f"{job_id}.{TRACE_KINDS[kind]}"
+        return path if path.exists() else None
+
+    def save(self, job_id: str, profiler: RequestProfiler):
+        traces = {"chrome": profiler.chrome_trace(), "speedscope": profiler.speedscope()}
+        with self._lock:
+            for kind, data in traces.items():
+                path = self.directory / f"{job_id}.{TRACE_KINDS[kind]}"
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            self._trim()
+
+    def _trim(self):
+        jobs: Dict[str, List[Path]] = {}
+        for path in self.directory.glob("*.json"):
+            jobs.setdefault(path.name.split(".", 1)[0], []).append(path)
+        oldest_first = sorted(jobs.values(), key=lambda paths: min(p.stat().st_mtime for p in paths))
+        total = sum(p.stat().st_size for paths in oldest_first for p in paths)
+        while oldest_first and (len(oldest_first) > self.max_jobs or total > self.max_bytes):
+            for path in oldest_first.pop(0):
+                total -= path.stat().st_size
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, int]:
+        paths = list(self.directory.glob("*.json"))
+        return {
+            "jobs": len({p.name.split(".", 1)[0] for p in paths}),
+            "bytes": sum(p.stat().st_size for p in paths),
+        }
@@ -0,0 +1,201 @@
+"""
+Multistep solvers for TripoSG's rectified-flow sampling, and named quality
+tiers that pick a solver, step count and guidance schedule.
+
+The solvers wrap the pipeline's own scheduler: they keep its timesteps and
+noise levels (including any shift) and only replace the Euler update, so
+they work for whatever flow convention the base scheduler uses.
+"""
+import copy
+import math
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import torch
+
+# "default" keeps the pipeline's own scheduler (Euler for TripoSG)
+SAMPLERS = ("default", "dpmpp_2m", "unipc")
+
+# Named trade-offs between speed and fidelity; "guidance_cutoff" is the
+# fraction of steps that use classifier-free guidance (the rest run the
+# conditional branch alone, at half the cost)
+QUALITY_TIERS: Dict[str, Dict[str, Any]] = {
+    "draft": {"scheduler": "unipc", "num_inference_steps": 10, "guidance_scale": 7.0, "guidance_cutoff": 0.6},
+    "standard": {"scheduler": "dpmpp_2m", "num_inference_steps": 20, "guidance_scale": 7.0, "guidance_cutoff": 0.8},
+    "high": {"scheduler": "default", "num_inference_steps": 50, "guidance_scale": 7.0, "guidance_cutoff": 1.0},
+}
+
+
+def _noise_levels(base: Any, num_inference_steps: int, device: Any) -> Tuple[torch.Tensor, List[float], float]:
+    """The base scheduler's timesteps, its noise level before each step (1: pure noise, ending at 0),
+    and the factor ``k`` such that its Euler step is ``x + k * (n_next - n) * model_output``"""
+    probe = copy.deepcopy(base)
+    probe.set_timesteps(num_inference_steps, device=device)
+    timesteps = probe.timesteps
+    sigmas = getattr(probe, "sigmas", None)
+    if sigmas is None:
+        sigmas = torch.cat([timesteps.float() / probe.config.num_train_timesteps, timesteps.new_zeros(1, dtype=torch.float32)])
+    sigmas = [float(s) for s in sigmas]
+    # Some flow schedulers count up from noise (0) to data (1)
+    levels = sigmas if sigmas[0] > sigmas[-1] else [1.0 - s for s in sigmas]
+    if len(levels) == len(timesteps):
+        levels.append(0.0)
+    # One Euler step on a probe tells which way the velocity points
+    probe_sample = torch.zeros(1, device=device)
+    step = probe.step(torch.ones(1, device=device), timesteps[0], probe_sample, return_dict=False)[0]
+    k = float(step.sum()) / (levels[1] - levels[0])
+    return timesteps, levels, k
+
+
+class FlowMultistepScheduler:
+    """Second-order multistep sampling on the base scheduler's noise levels.
+
+    The latents follow ``x = (1 - n) * x0 + n * noise`` as the noise level
+    ``n`` goes from 1 to 0. Each step turns the model's velocity into a
+    data prediction and takes a DPM-Solver++(2M) step from it and the
+    previous one; the first and last steps are first order. With
+    ``corrector``, each step first refines the previous update with the new
+    model output (UniPC's bh2 corrector), which costs no extra evaluations.
+    Anything else (``config``, ``order``...) is read from the base scheduler.
+    """
+
+    def __init__(self, base: Any, corrector: bool = False):
+        self.base = base
+        self.corrector = corrector
+        self.order = 1
+        self.init_noise_sigma = 1.0
+        self.timesteps: Optional[torch.Tensor] = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def set_timesteps(self, num_inference_steps: int, device: Any = None, **kwargs):
+        self.timesteps, self.levels, self.k = _noise_levels(self.base, num_inference_steps, device)
+        self.num_inference_steps = len(self.timesteps)
+        self._index = 0
+        # (data prediction, noise level) of earlier steps, and the sample the last step started from
+        self._history: List[Tuple[torch.Tensor, float]] = []
+        self._last_sample: Optional[torch.Tensor] = None
+
+    @staticmethod
+    def _lambda(n: float) -> float:
+        """Log signal-to-noise ratio, ``log(alpha / sigma)``"""
+        return math.log((1 - n) / n)
+
+    def _update(self, sample: torch.Tensor, n: float, n_next: float, d: torch.Tensor, d_prev: Optional[torch.Tensor], n_prev: float) -> torch.Tensor:
+        """DPM-Solver++ from ``sample`` at ``n`` to ``n_next``, second order when ``d_prev`` is given"""
+        alpha, alpha_next = 1 - n, 1 - n_next
+        # e^{-h}, written without logs so pure noise (alpha = 0) and clean data (n_next = 0) are exact
+        decay = alpha * n_next / (n * alpha_next)
+        update = d
+        if d_prev is not None:
+            r = (self._lambda(n) - self._lambda(n_prev)) / (self._lambda(n_next) - self._lambda(n))
+            update = d + (d - d_prev) / (2 * r)
+        return (n_next / n) * sample + alpha_next * (1 - decay) * update
+
+    def _correct(self, sample: torch.Tensor, d_new: torch.Tensor) -> torch.Tensor:
+        """UniC: redo the last update from ``_last_sample`` with the model output at its result"""
+        (d, n), *earlier = self._history[::-1]
+        n_next = self.levels[self._index]
+        alpha_next = 1 - n_next
+        h = self._lambda(n_next) - self._lambda(n)
+        # B(h) = e^{-h} - 1 in the bh2 variant; phi terms follow from it
+        h_phi_1 = math.expm1(-h)
+        b1 = (h_phi_1 / -h - 1) / h_phi_1
+        b2 = ((h_phi_1 / -h - 1) / -h - 0.5) * 2 / h_phi_1
+        base = (n_next / n) * self._last_sample - alpha_next * h_phi_1 * d
+        if earlier and 0 < earlier[0][1] < 1:
+            d_prev, n_prev = earlier[0]
+            r0 = (self._lambda(n_prev) - self._lambda(n)) / h
+            rho_prev, rho_new = torch.linalg.solve(
+                torch.tensor([[1.0, 1.0], [r0, 1.0]], dtype=torch.float64), torch.tensor([b1, b2], dtype=torch.float64)
+            ).tolist()
+            correction = rho_prev * (d_prev - d) / r0 + rho_new * (d_new - d)
+        else:
+            correction = 0.5 * (d_new - d)
+        return base - alpha_next * h_phi_1 * correction
+
+    def step(self, model_output: torch.Tensor, timestep: Any, sample: torch.Tensor, return_dict: bool = True, **kwargs):
+        i = self._index
+        n, n_next = self.levels[i], self.levels[i + 1]
+        x = sample.float()
+        d = x - n * self.k * model_output.float()
+        if self.corrector and self._last_sample is not None and 0 < self._history[-1][1] < 1:
+            # The data prediction stays the one at the uncorrected sample, as in UniPC
+            x = self._correct(x, d)
+        previous = self._history[-1] if self._history else None
+        # Second order needs a previous step with a finite log-SNR
+        second_order = previous is not None and 0 < previous[1] < 1
+        if n >= 1 or n_next <= 0:
+            prev_sample = x + self.k * (n_next - n) * model_output.float() if n >= 1 else d
+        else:
+            prev_sample = self._update(x, n, n_next, d, previous[0] if second_order else None, previous[1] if second_order else 0.0)
+        self._history = [*self._history[-1:], (d, n)]
+        self._last_sample = x
+        self._index += 1
+        prev_sample = prev_sample.to(sample.dtype)
+        return SimpleNamespace(prev_sample=prev_sample) if return_dict else (prev_sample,)
+
+
+def make_scheduler(base: Any, name: str) -> Any:
+    if name == "default":
+        return base
+    if name == "dpmpp_2m":
+        return FlowMultistepScheduler(base)
+    if name == "unipc":
+        return FlowMultistepScheduler(base, corrector=True)
+    raise ValueError(f"Unknown scheduler {name!r}; expected one of {', '.join(SAMPLERS)}")
+
+
+@contextmanager
+def use_scheduler(pipe: Any, name: str) -> Iterator[Any]:
+    """Run ``pipe`` with the named sampler, restoring its own scheduler afterwards"""
+    base = pipe.scheduler
+    if isinstance(base, FlowMultistepScheduler):
+        base = base.base
+    pipe.scheduler = make_scheduler(base, name)
+    try:
+        yield pipe.scheduler
+    finally:
+        pipe.scheduler = base
+
+
+def can_skip_guidance(pipe: Any) -> bool:
+    """Dropping guidance mid-run needs the pipeline to take ``image_embeds`` back from its step callback"""
+    return "image_embeds" in getattr(pipe, "_callback_tensor_inputs", ())
+
+
+def skip_guidance(pipe: Any, callback_kwargs: Dict[str, Any]):
+    """Switch the rest of the run to the conditional branch only: half the batch per step"""
+    if pipe._guidance_scale <= 1:
+        return
+    pipe._guidance_scale = 1.0
+    # Embeddings are stacked [unconditional, conditional]
+    callback_kwargs["image_embeds"] = callback_kwargs["image_embeds"].chunk(2)[1]
+
+
+def resolve_sampling(
+    quality: Optional[str], scheduler: str, num_inference_steps: int, guidance_scale: float, guidance_cutoff: float
+) -> Dict[str, Any]:
+    """Sampling parameters, taken from the ``quality`` tier when one is named"""
+    if quality is not None:
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality {quality!r}; expected one of {', '.join(QUALITY_TIERS)}")
+        return dict(QUALITY_TIERS[quality])
+    if scheduler not in SAMPLERS:
+        raise ValueError(f"Unknown scheduler {scheduler!r}; expected one of {', '.join(SAMPLERS)}")
+    if num_inference_steps < 1:
+        raise ValueError("num_inference_steps must be at least 1")
+    if guidance_scale < 0:
+        raise ValueError("guidance_scale must be at least 0 (1 or less disables guidance)")
+    if not 0 < guidance_cutoff <= 1:
+        raise ValueError("guidance_cutoff must be in (0, 1]")
+    return {
+        "scheduler": scheduler,
+        "num_inference_steps": num_inference_steps,
+        "guidance_scale": guidance_scale,
+        "guidance_cutoff": guidance_cutoff,
+    }
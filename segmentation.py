@@ -0,0 +1,231 @@
+"""
+Background removal as its own pipeline stage: a pool of warm segmentation
+sessions and a worker thread that segments queued images in batches, so
+the next request is segmented while the current one is denoising
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from batching import BatchCollector
+from image_preprocess import composite, crop_and_composite, has_matte, segment_batch, to_float_array
+
+ImageLike = Union[Image.Image, np.ndarray]
+
+
+class SessionPool:
+    """Sessions created once by ``factory`` and lent to one caller at a time"""
+
+    def __init__(self, factory: Callable[[], Any], size: int = 1):
+        self.size = max(1, size)
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(factory())
+
+    @contextmanager
+    def session(self) -> Iterator[Any]:
+        session = self._idle.get()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+
+class RMBGSegmenter:
+    """Mattes for a batch of images from one BriaRMBG forward pass"""
+
+    def __init__(self, pool: SessionPool):
+        self.pool = pool
+
+    @torch.no_grad()
+    def __call__(self, rgbs: List[np.ndarray]) -> List[np.ndarray]:
+        with self.pool.session() as net:
+            return segment_batch(net, rgbs)
+
+
+def rembg_pool(size: int = 1, model: str = "u2net") -> SessionPool:
+    import rembg
+
+    return SessionPool(lambda: rembg.new_session(model), size)
+
+
+def rembg_matte(pool: SessionPool, rgb: np.ndarray) -> np.ndarray:
+    import rembg
+
+    image = Image.fromarray(np.clip(rgb * 255.0 + 0.5, 0, 255).astype(np.uint8))
+    with pool.session() as session:
+        mask = rembg.remove(image, session=session, only_mask=True)
+    return np.asarray(mask, dtype=np.float32) / 255.0
+
+
+class RembgSegmenter:
+    """Mattes from rembg; its onnxruntime sessions take one image per call, so a batch is spread over the pool"""
+
+    def __init__(self, pool: SessionPool):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="rembg")
+
+    def __call__(self, rgbs: List[np.ndarray]) -> List[np.ndarray]:
+        return list(self._executor.map(lambda rgb: rembg_matte(self.pool, rgb), rgbs))
+
+
+def remove_background(image: ImageLike, pool: SessionPool, bg_color: Any = (0.5, 0.5, 0.5)) -> Image.Image:
+    """Composite ``image`` onto ``bg_color`` (uncropped) with a matte from a pooled rembg session"""
+    array = to_float_array(image)
+    rgb = array[:, :, :3]
+    alpha = array[:, :, 3] if has_matte(array) else rembg_matte(pool, rgb)
+    return Image.fromarray(composite(rgb, alpha, bg_color))
+
+
+class _Request:
+    def __init__(self, image: ImageLike, bg_color: Any):
+        self.image = image
+        self.bg_color = bg_color
+        self.future: Future = Future()
+
+
+class SegmentationWorker:
+    """Prepares queued images (segment, crop, composite) on its own thread.
+
+    ``submit`` returns a future of what ``prepare_image_array`` would
+    return. Images waiting together are segmented in one ``segmenter``
+    call of up to ``max_batch_size``; images that already carry a matte
+    skip it. With a ``cache``, prepared images are stored under
+    ``cache_key(image, bg_color)`` (kind ``rmbg``) and reused.
+    """
+
+    def __init__(
+        self,
+        segmenter: Callable[[List[np.ndarray]], List[np.ndarray]],
+        max_batch_size: int = 4,
+        max_wait: float = 0.005,
+        metrics: Optional[Any] = None,
+        cache: Optional[Any] = None,
+        cache_key: Optional[Callable[..., str]] = None,
+    ):
+        self.segmenter = segmenter
+        self.metrics = metrics
+        self.cache = cache if cache is not None and cache.enabled and cache_key is not None else None
+        self.cache_key = cache_key
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._collector = BatchCollector(self._queue, key=lambda request: None, max_batch_size=max_batch_size, max_wait=max_wait)
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._collector)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name="segmentation-worker", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def submit(self, image: ImageLike, bg_color: Any = (1.0, 1.0, 1.0)) -> Future:
+        request = _Request(image, bg_color)
+        self._queue.put(request)
+        return request.future
+
+    def _segment(self, rgbs: List[np.ndarray]) -> List[Union[np.ndarray, Exception]]:
+        """One batched ``segmenter`` call, or one call per image if the batch fails"""
+        try:
+            return list(self.segmenter(rgbs))
+        except Exception:
+            if len(rgbs) == 1:
+                raise
+        # Find the image that broke the batch, and segment the others anyway
+        if self.metrics is not None:
+            self.metrics.inc("segmentation_batch_fallbacks_total")
+        mattes: List[Union[np.ndarray, Exception]] = []
+        for rgb in rgbs:
+            try:
+                mattes.append(self.segmenter([rgb])[0])
+            except Exception as e:
+                mattes.append(e)
+        return mattes
+
+    def prepare(self, requests: List[_Request]) -> List[Union[Image.Image, Exception]]:
+        """Prepared images in request order; an image that fails is its exception, and fails alone"""
+        keys: List[Optional[str]] = [None] * len(requests)
+        results: List[Union[None, Image.Image, Exception]] = [None] * len(requests)
+        arrays: List[Optional[np.ndarray]] = [None] * len(requests)
+        to_segment = []
+        for i, request in enumerate(requests):
+            try:
+                if self.cache is not None:
+                    keys[i] = self.cache_key(request.image, list(request.bg_color))
+                    cached = self.cache.get("rmbg", keys[i])
+                    if cached is not None:
+                        results[i] = Image.fromarray(cached[0].numpy())
+                        continue
+                arrays[i] = to_float_array(request.image)
+            except Exception as e:
+                results[i] = e
+                continue
+            if not has_matte(arrays[i]):
+                to_segment.append(i)
+
+        mattes = {}
+        seconds = 0.0
+        if to_segment:
+            t0 = time.perf_counter()
+            try:
+                mattes = dict(zip(to_segment, self._segment([arrays[i][:, :, :3] for i in to_segment])))
+            except Exception as e:
+                mattes = {i: e for i in to_segment}
+            seconds = time.perf_counter() - t0
+            if self.metrics is not None:
+                self.metrics.observe("segmentation_batch", seconds)
+                self.metrics.inc("segmentation_batches_total")
+                self.metrics.inc("segmentation_images_total", len(to_segment))
+
+        for i, request in enumerate(requests):
+            if results[i] is not None:
+                continue
+            if isinstance(mattes.get(i), Exception):
+                results[i] = mattes[i]
+                continue
+            try:
+                t0 = time.perf_counter()
+                alpha = mattes[i] if i in mattes else arrays[i][:, :, 3]
+                results[i] = crop_and_composite(arrays[i][:, :, :3], alpha, request.bg_color)
+                if keys[i] is not None:
+                    # Each image is charged its share of the batched forward pass
+                    spent = time.perf_counter() - t0 + (seconds / len(to_segment) if i in mattes else 0.0)
+                    self.cache.put("rmbg", keys[i], (torch.from_numpy(np.array(results[i])),), spent)
+            except Exception as e:
+                results[i] = e
+        return results
+
+    def _run(self):
+        while True:
+            requests = self._collector.next_batch()
+            if requests is None:
+                break
+            requests = [r for r in requests if r.future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+            try:
+                results: List[Any] = self.prepare(requests)
+            except Exception as e:
+                # prepare() fails images one at a time; this is only a last resort so no future is left hanging
+                results = [e] * len(requests)
+            for request, result in zip(requests, results):
+                if isinstance(result, Exception):
+                    request.future.set_exception(result)
+                else:
+                    request.future.set_result(result)
@@ -0,0 +1,98 @@
+"""
+Admission control: requests past the active and waiting limits get 429 with Retry-After
+
+    python -m pytest test_admission.py
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from admission import AdmissionController, AdmissionMiddleware, BodySizeLimitMiddleware, OverloadedError
+
+
+def test_waits_then_rejects():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_waiting=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (controller.active, controller.waiting) == (1, 1)
+
+        with pytest.raises(OverloadedError) as rejected:
+            async with controller.slot():
+                pass
+        assert rejected.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert (controller.active, controller.waiting) == (0, 0)
+        # Free again
+        async with controller.slot():
+            assert controller.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_scales_with_queue_and_job_time():
+    controller = AdmissionController(max_active=1, max_waiting=0, parallelism=2)
+    assert controller.retry_after(0) == 1
+    controller.observe(10.0)
+    assert controller.retry_after(3) == 20
+    assert controller.retry_after(10_000) == 600
+
+
+@pytest.fixture
+def client():
+    controller = AdmissionController(max_active=1, max_waiting=0)
+    app = FastAPI()
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=["/convert"])
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=100, exempt=["/bulk"])
+
+    @app.post("/convert")
+    async def convert(request: Request):
+        if await request.body() == b"hold":
+            await asyncio.to_thread(client.release.wait, 10)
+        return {"ok": True}
+
+    @app.post("/bulk")
+    async def bulk(request: Request):
+        return {"bytes": len(await request.body())}
+
+    with TestClient(app) as client:
+        client.controller = controller
+        client.release = threading.Event()
+        yield client
+        client.release.set()
+
+
+def test_busy_server_answers_429(client):
+    assert client.post("/convert", content=b"x").status_code == 200
+
+    holder = threading.Thread(target=client.post, args=("/convert",), kwargs={"content": b"hold"})
+    holder.start()
+    deadline = time.monotonic() + 5
+    while client.controller.active == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    response = client.post("/convert", content=b"x")
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    client.release.set()
+    holder.join(5)
+    assert client.post("/convert", content=b"x").status_code == 200
+
+
+def test_oversized_body_answers_413(client):
+    assert client.post("/convert", content=b"x" * 101).status_code == 413
+    assert client.post("/bulk", content=b"x" * 101).json() == {"bytes": 101}
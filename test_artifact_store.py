@@ -0,0 +1,85 @@
+"""
+ArtifactStore dedup, garbage collection and totals shared between processes
+
+    python -m pytest test_artifact_store.py
+"""
+import os
+
+from artifact_store import ArtifactStore
+
+
+def blob_files(store: ArtifactStore) -> list:
+    return [name for _, _, names in os.walk(os.path.join(store.directory, "objects")) for name in names]
+
+
+def test_identical_exports_share_a_file(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    store.put("a", b"mesh", "glb", {"seed": 1})
+    store.put("b", b"mesh", "glb", {"seed": 2})
+    assert len(blob_files(store)) == 1
+    assert store.stats()["artifacts"] == 2 and store.stats()["bytes"] == 4
+    # The file stays until its last artifact goes
+    assert store.delete("a")
+    assert len(blob_files(store)) == 1
+    assert store.delete("b") and not store.delete("b")
+    assert blob_files(store) == [] and store.stats()["bytes"] == 0
+
+
+def test_second_put_for_a_job_keeps_the_first(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    first = store.put("job", b"glb bytes", "glb", {})
+    again = store.put("job", b"obj bytes, larger", "obj", {})
+    assert again == first
+    # No orphan file for the ignored export, and nothing counted for it
+    assert len(blob_files(store)) == 1
+    assert store.stats()["bytes"] == len(b"glb bytes")
+    assert store.count("obj") == 0
+
+
+def test_least_recently_used_files_are_collected(tmp_path):
+    store = ArtifactStore(str(tmp_path), max_bytes=25)
+    store.put("a", b"a" * 10, "glb", {})
+    store.put("b", b"b" * 10, "glb", {})
+    store.put("c", b"c" * 10, "obj", {})
+    assert store.get("a") is None and store.get("b") is not None
+    assert store.stats() == {"artifacts": 2, "bytes": 20, "max_bytes": 25, "evictions": 1}
+    assert (store.count("glb"), store.count("obj")) == (1, 1)
+    assert len(blob_files(store)) == 2
+    # A file over the limit on its own is collected right away
+    assert store.put("huge", b"x" * 30, "glb", {}) is None
+
+
+def test_list_pages_newest_first(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    for i in range(5):
+        store.put(f"job{i}", f"mesh{i}".encode(), "glb" if i % 2 else "obj", {})
+    page, cursor = store.list(limit=2)
+    assert [record["job_id"] for record in page] == ["job4", "job3"]
+    page, cursor = store.list(limit=2, cursor=cursor)
+    assert [record["job_id"] for record in page] == ["job2", "job1"]
+    page, cursor = store.list(limit=2, cursor=cursor)
+    assert [record["job_id"] for record in page] == ["job0"] and cursor is None
+    page, _ = store.list(format="glb")
+    assert [record["job_id"] for record in page] == ["job3", "job1"]
+
+
+def test_stores_sharing_a_directory_share_totals(tmp_path):
+    # Like HTTP workers sharing one index.db
+    first = ArtifactStore(str(tmp_path), max_bytes=25)
+    second = ArtifactStore(str(tmp_path), max_bytes=25)
+    first.put("a", b"a" * 10, "glb", {})
+    second.put("b", b"b" * 10, "glb", {})
+    assert first.stats()["bytes"] == second.stats()["bytes"] == 20
+    # GC in one store sees what the other wrote
+    first.put("c", b"c" * 10, "glb", {})
+    assert second.stats() == first.stats() == {"artifacts": 2, "bytes": 20, "max_bytes": 25, "evictions": 1}
+    assert len(blob_files(first)) == 2
+    assert second.get("a") is None
+
+
+def test_totals_survive_a_restart(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    store.put("a", b"mesh", "glb", {})
+    store.close()
+    reopened = ArtifactStore(str(tmp_path))
+    assert reopened.count() == 1 and reopened.count("glb") == 1 and reopened.stats()["bytes"] == 4
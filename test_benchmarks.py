@@ -0,0 +1,44 @@
+"""
+Run every benchmark that needs no model weights, with tiny settings, and fail
+if any of them exits with an error (benchmark_triposr needs the real TripoSR)
+
+    python -m pytest test_benchmarks.py
+    python -m pytest test_benchmarks.py -k samplers
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent
+
+# Each benchmark with the smallest settings that still exercise its whole path
+BENCHMARKS = {
+    "benchmark_suite": ["--backend", "triposg", "--stub", "--warmup=0", "--repeats=1", "--concurrency=2", "--requests=2", "--steps=2"],
+    "benchmark_samplers": ["--stub", "--steps", "2", "--reference-steps=4", "--repeats=1", "--samples=2000"],
+    "benchmark_cpu_profiles": ["--stub", "--profiles", "fp32", "--repeats=1", "--steps=2", "--samples=2000"],
+    "benchmark_offload": ["--stub", "--budgets", "-1", "--runs=1", "--steps=2", "--stub-width=1000", "--stub-vae-width=1000"],
+    "benchmark_batching": ["--max-batch=2", "--requests=2", "--steps=2", "--tokens=16", "--width=16"],
+    "benchmark_segmentation": ["--stub", "--batch-sizes", "1", "2", "--images=2", "--size=64", "--repeats=1"],
+    "benchmark_workers": ["--stub", "--workers", "1", "--modes", "independent", "--requests=2", "--concurrency=1", "--steps=2"],
+    "benchmark_lods": ["--subdivisions=3", "--lods=500,100"],
+    "benchmark_mesh_postprocess": ["--subdivisions=3", "--floaters=2", "--faces", "-1", "500", "--repeats=1"],
+}
+
+
+@pytest.mark.parametrize("name", list(BENCHMARKS))
+def test_benchmark_runs(name, tmp_path):
+    result = subprocess.run(
+        [sys.executable, str(ROOT / f"{name}.py"), *BENCHMARKS[name]],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env={
+            **os.environ,
+            "TRIPOSG_CACHE_DIR": str(tmp_path / "cache"),
+            "TRIPOSG_ARTIFACT_DIR": str(tmp_path / "artifacts"),
+        },
+    )
+    assert result.returncode == 0, f"{name} exited with {result.returncode}\n{result.stdout[-2000:]}\n{result.stderr[-4000:]}"
@@ -0,0 +1,170 @@
+"""
+Bulk jobs: input filtering, NDJSON status lines, the streamed tar of meshes, and resuming
+
+    python -m pytest test_bulk.py
+"""
+import asyncio
+import io
+import json
+import tarfile
+import time
+import zipfile
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from bulk import BulkRunner, follow_meshes, follow_status, is_image_name
+
+
+def convert(contents: bytes, params: Dict[str, Any], stopped: Callable[[], bool]) -> Future:
+    """Encodes an image as ``mesh:<contents>``; images whose contents are ``bad`` fail"""
+    future: Future = Future()
+    if contents == b"bad":
+        future.set_exception(ValueError("not an image"))
+    else:
+        future.set_result(b"mesh:" + contents)
+    return future
+
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+def run_to_end(runner: BulkRunner, bulk) -> List[Dict[str, Any]]:
+    lines = asyncio.run(collect(follow_status(bulk, runner, interval=0.01))).decode().splitlines()
+    return [json.loads(line) for line in lines]
+
+
+@pytest.fixture
+def runner(tmp_path):
+    return BulkRunner(str(tmp_path), convert, window=2)
+
+
+def test_is_image_name():
+    assert is_image_name("a.png") and is_image_name("dir/B.JPEG") and is_image_name("c.jpg")
+    assert not is_image_name("notes.txt") and not is_image_name("__MACOSX/._a.png") and not is_image_name(".png")
+
+
+def test_zip_keeps_only_images(runner):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("shoes/red.png", b"red")
+        z.writestr("shoes/notes.txt", b"text")
+        z.writestr("__MACOSX/shoes/._red.png", b"resource fork")
+        z.writestr("shoes/", b"")
+    archive.seek(0)
+    bulk = runner.create()
+    bulk.add_zip(archive)
+    assert [item["name"] for item in bulk.items] == ["00000_red"]
+
+
+def test_status_lines_and_tar(runner):
+    bulk = runner.create()
+    for name, contents in [("a.png", b"a"), ("b.png", b"bad"), ("c.jpg", b"c")]:
+        bulk.add_file(name, io.BytesIO(contents))
+    bulk.save_manifest({"output_format": "glb"})
+    runner.start(bulk)
+
+    lines = run_to_end(runner, bulk)
+    by_name = {line["name"]: line for line in lines if "name" in line}
+    assert by_name["00000_a"]["status"] == "done" and by_name["00000_a"]["file"] == "meshes/00000_a.glb"
+    assert by_name["00001_b"] == dict(by_name["00001_b"], status="failed", error="not an image")
+    assert by_name["00002_c"]["bytes"] == len(b"mesh:c")
+    assert lines[-1] == {"status": "complete", "bulk_id": bulk.id, "total": 3, "done": 2, "failed": 1, "complete": True}
+
+    # Following again from an offset only sends the lines after it
+    assert run_to_end(runner, bulk) == lines
+    assert asyncio.run(collect(follow_status(bulk, runner, offset=3))).decode().count("\n") == 1
+
+    tar_bytes = asyncio.run(collect(follow_meshes(bulk, runner)))
+    with tarfile.open(fileobj=io.BytesIO(tar_bytes)) as tar:
+        members = {member.name: tar.extractfile(member).read() for member in tar}
+    assert members == {"meshes/00000_a.glb": b"mesh:a", "meshes/00002_c.glb": b"mesh:c"}
+
+    tar_bytes = asyncio.run(collect(follow_meshes(bulk, runner, offset=1)))
+    with tarfile.open(fileobj=io.BytesIO(tar_bytes)) as tar:
+        assert tar.getnames() == ["meshes/00002_c.glb"]
+
+
+def test_resume_converts_only_unfinished_items(tmp_path):
+    seen: List[bytes] = []
+
+    def recording(contents: bytes, params: Dict[str, Any], stopped: Callable[[], bool]) -> Future:
+        seen.append(contents)
+        return convert(contents, params, stopped)
+
+    bulk = BulkRunner(str(tmp_path), recording).create()
+    for name in ("first", "second"):
+        bulk.add_file(f"{name}.png", io.BytesIO(name.encode()))
+    bulk.save_manifest({"output_format": "obj"})
+    # Interrupted after the first image, e.g. by a restart
+    bulk.meshes_dir.mkdir()
+    (bulk.meshes_dir / "00000_first.obj").write_bytes(b"mesh:first")
+    bulk.append_status({"name": "00000_first", "status": "done", "file": "meshes/00000_first.obj", "bytes": 10})
+
+    runner = BulkRunner(str(tmp_path), recording)
+    resumed = runner.get(bulk.id)
+    runner.start(resumed)
+    lines = run_to_end(runner, resumed)
+    assert seen == [b"second"]
+    assert [line.get("name") for line in lines] == ["00000_first", "00001_second", None]
+    assert lines[-1]["done"] == 2 and lines[-1]["complete"]
+
+
+def test_delete_cancels_inflight_items(tmp_path):
+    inflight: List[Future] = []
+    waits: List[float] = []
+
+    def slow(contents: bytes, params: Dict[str, Any], stopped: Callable[[], bool]) -> Future:
+        if contents == b"waits":
+            # Like waiting for queue space: gives up once the bulk job is stopped
+            t0 = time.monotonic()
+            while not stopped():
+                time.sleep(0.01)
+            waits.append(time.monotonic() - t0)
+            raise RuntimeError("stopped")
+        inflight.append(Future())
+        return inflight[-1]
+
+    runner = BulkRunner(str(tmp_path), slow, window=2)
+    bulk = runner.create()
+    for name in ("running", "waits"):
+        bulk.add_file(f"{name}.png", io.BytesIO(name.encode()))
+    bulk.save_manifest({"output_format": "glb"})
+    runner.start(bulk)
+    while not inflight:
+        time.sleep(0.01)
+
+    t0 = time.monotonic()
+    runner.delete(bulk)
+    assert time.monotonic() - t0 < 5
+    assert waits and inflight[0].cancelled()
+    assert not bulk.directory.exists()
+
+
+def test_failed_write_fails_only_its_item(runner):
+    bulk = runner.create()
+    for name in ("a", "b"):
+        bulk.add_file(f"{name}.png", io.BytesIO(name.encode()))
+    bulk.save_manifest({"output_format": "glb"})
+    # A directory where the first mesh's temp file would go makes its write fail
+    bulk.meshes_dir.mkdir()
+    (bulk.meshes_dir / "00000_a.tmp").mkdir()
+    runner.start(bulk)
+    lines = run_to_end(runner, bulk)
+    by_name = {line["name"]: line["status"] for line in lines if "name" in line}
+    assert by_name == {"00000_a": "failed", "00001_b": "done"}
+    assert lines[-1]["status"] == "complete" and lines[-1]["failed"] == 1
+
+
+def test_runner_failure_still_ends_the_status(tmp_path):
+    runner = BulkRunner(str(tmp_path), convert)
+    bulk = runner.create()
+    bulk.add_file("a.png", io.BytesIO(b"a"))
+    bulk.save_manifest({"output_format": "glb"})
+    # The meshes directory can't be created: a file is in the way
+    bulk.meshes_dir.write_bytes(b"")
+    runner.start(bulk)
+    lines = run_to_end(runner, bulk)
+    assert lines[-1]["status"] == "error" and not lines[-1]["complete"]
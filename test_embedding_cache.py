@@ -0,0 +1,90 @@
+"""
+EmbeddingCache eviction, spilling to disk, and the cached image encoder
+
+    python -m pytest test_embedding_cache.py
+"""
+import os
+
+import numpy as np
+import torch
+
+from embedding_cache import EmbeddingCache, cache_image_encoder
+from image_preprocess import synthetic_image
+from triposg_stub import StubTripoSGPipeline
+
+# Four float32s: 16 bytes per entry
+ENTRY_BYTES = 16
+
+
+def entry(value: float):
+    return (torch.full((4,), float(value)),)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_bytes=2 * ENTRY_BYTES)
+    cache.put("encoder", "a", entry(1), 0.5)
+    cache.put("encoder", "b", entry(2), 0.5)
+    assert cache.get("encoder", "a") is not None
+    cache.put("encoder", "c", entry(3), 0.5)
+
+    assert cache.get("encoder", "b") is None
+    assert torch.equal(cache.get("encoder", "a")[0], entry(1)[0])
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 2 * ENTRY_BYTES)
+    assert stats["encoder"]["hits"] == 2 and stats["encoder"]["misses"] == 1
+    assert stats["encoder"]["saved_seconds"] == 1.0
+
+
+def test_evicted_entries_spill_to_disk_and_reload(tmp_path):
+    cache = EmbeddingCache(max_bytes=ENTRY_BYTES, spill_dir=str(tmp_path))
+    cache.put("encoder", "a", entry(1), 2.0)
+    cache.put("encoder", "b", entry(2), 0.5)
+    assert [p.name for p in tmp_path.glob("*.pt")] == ["encoder-a.pt"]
+
+    # Back from disk, with the time it took to compute; now b is the one spilled
+    assert torch.equal(cache.get("encoder", "a")[0], entry(1)[0])
+    assert cache.stats()["encoder"]["saved_seconds"] == 2.0
+    assert [p.name for p in tmp_path.glob("*.pt")] == ["encoder-b.pt"]
+
+
+def test_spill_directory_is_trimmed_oldest_first(tmp_path):
+    cache = EmbeddingCache(max_bytes=ENTRY_BYTES, spill_dir=str(tmp_path))
+    cache.put("encoder", "a", entry(1), 0.1)
+    cache.put("encoder", "b", entry(2), 0.1)
+    spilled = tmp_path / "encoder-a.pt"
+    # Room for one spilled entry, and a clearly older one already there
+    cache.spill_max_bytes = spilled.stat().st_size
+    os.utime(spilled, (0, 0))
+    cache.put("encoder", "c", entry(3), 0.1)
+    assert [p.name for p in tmp_path.glob("*.pt")] == ["encoder-b.pt"]
+
+
+def test_cached_encoder_matches_a_fresh_encode():
+    pipe = StubTripoSGPipeline(tokens=16, width=16, step_overhead=0, subdivisions=1, vae_width=16)
+    first, second = synthetic_image(64), np.asarray(synthetic_image(48))
+    fresh_embeds, fresh_uncond = pipe.encode_image([first, second], "cpu", 2)
+
+    cache = EmbeddingCache()
+    calls = []
+    encode_image = pipe.encode_image
+    pipe.encode_image = lambda images, *args: calls.append(len(images)) or encode_image(images, *args)
+    assert cache_image_encoder(pipe, cache)
+
+    pipe.encode_image([first], "cpu", 1)
+    embeds, uncond = pipe.encode_image([first, second], "cpu", 2)
+    # Only the image not seen before reached the encoder
+    assert calls == [1, 1]
+    assert torch.allclose(embeds, fresh_embeds, atol=1e-6) and torch.allclose(uncond, fresh_uncond)
+
+    embeds, _ = pipe.encode_image([second, first], "cpu", 1)
+    assert calls == [1, 1]
+    assert torch.allclose(embeds[0], fresh_embeds[2], atol=1e-6)
+    assert torch.allclose(embeds[1], fresh_embeds[0], atol=1e-6)
+    assert cache.stats()["encoder"]["hits"] == 3
+
+
+def test_disabled_cache_leaves_the_encoder_alone():
+    pipe = StubTripoSGPipeline(tokens=16, width=16, step_overhead=0, subdivisions=1, vae_width=16)
+    encode_image = pipe.encode_image
+    assert not cache_image_encoder(pipe, EmbeddingCache(max_bytes=0))
+    assert pipe.encode_image == encode_image
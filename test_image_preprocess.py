@@ -0,0 +1,99 @@
+"""
+Decoding uploads (EXIF orientation, modes, early JPEG downscaling) and the
+in-memory crop and composite
+
+    python -m pytest test_image_preprocess.py
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from image_preprocess import crop_and_composite, decode_image, prepare_image_array
+
+# EXIF tag for orientation; 6 means the camera was rotated 90 degrees clockwise
+ORIENTATION = 0x0112
+
+
+def encode(image: Image.Image, format: str, **options) -> bytes:
+    data = io.BytesIO()
+    image.save(data, format=format, **options)
+    return data.getvalue()
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[ORIENTATION] = 6
+    image = decode_image(encode(Image.new("RGB", (60, 40), "red"), "JPEG", exif=exif.tobytes()))
+    assert image.size == (40, 60)
+
+
+@pytest.mark.parametrize("image, mode", [
+    (Image.new("L", (8, 8), 128), "RGB"),
+    (Image.new("LA", (8, 8), (128, 100)), "RGBA"),
+    (Image.new("RGBA", (8, 8), (1, 2, 3, 4)), "RGBA"),
+    (Image.new("CMYK", (8, 8), (0, 255, 255, 0)), "RGB"),
+])
+def test_modes_become_rgb_or_rgba(image, mode):
+    format = "JPEG" if image.mode == "CMYK" else "PNG"
+    assert decode_image(encode(image, format)).mode == mode
+
+
+def test_palette_transparency_keeps_an_alpha_channel():
+    image = Image.new("P", (8, 8), 1)
+    image.putpalette([0, 0, 0, 255, 0, 0] + [0] * 762)
+    image.putpixel((0, 0), 0)
+    decoded = decode_image(encode(image, "PNG", transparency=0))
+    assert decoded.mode == "RGBA"
+    assert decoded.getpixel((0, 0))[3] == 0 and decoded.getpixel((1, 1)) == (255, 0, 0, 255)
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale(monkeypatch):
+    drafts = []
+    original = JpegImagePlugin.JpegImageFile.draft
+
+    def draft(self, mode, size):
+        drafts.append(size)
+        result = original(self, mode, size)
+        drafts.append(self.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", draft)
+    image = decode_image(encode(Image.new("RGB", (4000, 3000), "blue"), "JPEG"), max_size=512)
+    assert drafts[0] == (512, 512)
+    # The decoder's own scaling already got it to within 2x of the target, before any resampling
+    assert max(drafts[1]) < 1024
+    assert image.size == (512, 384)
+
+
+def test_small_images_are_not_resized():
+    assert decode_image(encode(Image.new("RGB", (300, 200)), "PNG"), max_size=512).size == (300, 200)
+    assert decode_image(encode(Image.new("RGB", (1000, 500)), "PNG"), max_size=512).size == (512, 256)
+
+
+def test_crop_and_composite_centres_the_foreground_on_a_padded_square():
+    rgb = np.zeros((100, 100, 3), dtype=np.float32)
+    rgb[..., 0] = 1.0
+    alpha = np.zeros((100, 100), dtype=np.float32)
+    alpha[20:40, 30:80] = 1.0
+
+    image = np.asarray(crop_and_composite(rgb, alpha, (1.0, 1.0, 1.0), padding_ratio=0.1))
+    # The 50 px wide box, padded by 10% on each side
+    assert image.shape == (60, 60, 3)
+    assert tuple(image[30, 30]) == (255, 0, 0)
+    assert tuple(image[0, 0]) == (255, 255, 255)
+    assert tuple(image[5, 30]) == (255, 255, 255)
+
+
+def test_rgba_input_uses_its_own_matte():
+    array = np.zeros((40, 40, 4), dtype=np.uint8)
+    array[..., 1] = 255
+    array[10:30, 10:30, 3] = 255
+    array[20, 20, 3] = 128
+    image = np.asarray(prepare_image_array(Image.fromarray(array, "RGBA"), np.array([0.0, 0.0, 1.0]), padding_ratio=0.0))
+
+    assert image.shape == (20, 20, 3)
+    assert tuple(image[0, 0]) == (0, 255, 0)
+    # Half transparent: half foreground green, half background blue
+    assert np.allclose(image[10, 10], (0, 128, 127), atol=1)
@@ -0,0 +1,144 @@
+"""
+JobQueue cancellation, deadlines and per-job failures
+
+    python -m pytest test_job_queue.py
+"""
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+import pytest
+
+from job_queue import DeadlineExceededError, Job, JobCancelledError, JobQueue, QueueFullError
+
+
+@pytest.fixture
+def started():
+    queues: List[JobQueue] = []
+
+    def start(handler, **kwargs) -> JobQueue:
+        job_queue = JobQueue(handler=handler, **kwargs)
+        job_queue.start()
+        queues.append(job_queue)
+        return job_queue
+
+    yield start
+    for job_queue in queues:
+        job_queue.stop()
+
+
+def blocking_handler():
+    """A handler that holds the worker until ``release`` is set, recording the jobs it ran"""
+    release = threading.Event()
+    running = threading.Event()
+    ran: List[Job] = []
+
+    def handler(jobs: List[Job]) -> List[str]:
+        ran.extend(jobs)
+        running.set()
+        release.wait(10)
+        return [job.params["name"] for job in jobs]
+
+    return handler, release, running, ran
+
+
+def test_results_per_job(started):
+    job_queue = started(lambda jobs: [job.params["x"] * 2 for job in jobs])
+    jobs = [job_queue.submit({"x": i}, None) for i in range(3)]
+    assert [job.future.result(timeout=5) for job in jobs] == [0, 2, 4]
+    assert all(job.status == "done" for job in jobs)
+
+
+def test_exception_result_fails_only_its_job(started):
+    job_queue = started(
+        lambda jobs: [ValueError("bad") if job.params["bad"] else "ok" for job in jobs],
+        max_batch_size=2, max_wait=0.5,
+    )
+    good, bad = job_queue.submit({"bad": False}, None), job_queue.submit({"bad": True}, None)
+    assert good.future.result(timeout=5) == "ok"
+    with pytest.raises(ValueError):
+        bad.future.result(timeout=5)
+    assert bad.status == "failed" and bad.error == "bad"
+
+
+def test_cancelled_queued_job_is_skipped(started):
+    handler, release, running, ran = blocking_handler()
+    job_queue = started(handler)
+    first = job_queue.submit({"name": "first"}, None)
+    assert running.wait(5)
+    second = job_queue.submit({"name": "second"}, None)
+    job_queue.cancel(second.id)
+    with pytest.raises(JobCancelledError):
+        second.future.result(timeout=0)
+    assert second.status == "cancelled"
+    release.set()
+    assert first.future.result(timeout=5) == "first"
+    job_queue.stop()
+    assert [job.params["name"] for job in ran] == ["first"]
+
+
+def test_cancelled_running_job_drops_late_result(started):
+    handler, release, running, _ = blocking_handler()
+    job_queue = started(handler)
+    job = job_queue.submit({"name": "job"}, None)
+    assert running.wait(5)
+    job_queue.cancel(job.id)
+    assert job.cancelled
+    release.set()
+    with pytest.raises(JobCancelledError):
+        job.future.result(timeout=5)
+    # Cancelling a finished job changes nothing
+    assert job_queue.cancel(job.id).status == "cancelled"
+
+
+def test_queued_job_expires_at_deadline(started):
+    handler, release, running, ran = blocking_handler()
+    job_queue = started(handler)
+    job_queue.submit({"name": "first"}, None)
+    assert running.wait(5)
+    late = job_queue.submit({"name": "late"}, None, deadline=time.time() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(DeadlineExceededError):
+        late.future.result(timeout=5)
+    assert late.status == "cancelled"
+    assert "late" not in [job.params["name"] for job in ran]
+
+
+def test_expire_reports_when_nothing_is_wanted():
+    job_queue = JobQueue(handler=lambda jobs: [None] * len(jobs))
+    overdue = job_queue.submit({}, None, deadline=time.time() - 1)
+    current = job_queue.submit({}, None, deadline=time.time() + 60)
+    assert not job_queue.expire([overdue, current])
+    assert overdue.cancelled and not current.cancelled
+    assert job_queue.expire([overdue])
+
+
+def test_full_queue_rejects_without_registering():
+    job_queue = JobQueue(handler=lambda jobs: [None] * len(jobs), maxsize=1)
+    job_queue.submit({}, None)
+    with pytest.raises(QueueFullError):
+        job_queue.submit({}, None)
+    assert job_queue.depth == 1
+
+
+def test_handed_off_future(started):
+    pending: List[Future] = []
+
+    def handler(jobs: List[Job]) -> List[Future]:
+        pending.extend(Future() for _ in jobs)
+        return pending[-len(jobs):]
+
+    job_queue = started(handler)
+    done, cancelled = job_queue.submit({}, None), job_queue.submit({}, None)
+    deadline = time.monotonic() + 5
+    while cancelled.stage != "postprocessing" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert done.status == "running" and done.stage == "postprocessing"
+    pending[0].set_result("mesh")
+    assert done.future.result(timeout=5) == "mesh"
+    # e.g. a model-host job cancelled under it
+    pending[1].cancel()
+    with pytest.raises(JobCancelledError):
+        cancelled.future.result(timeout=5)
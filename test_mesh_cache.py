@@ -0,0 +1,76 @@
+"""
+MeshCache coalescing of identical in-flight requests, LRU eviction, and\nsharing a cache directory between processes
+
+    python -m pytest test_mesh_cache.py
+"""
+import numpy as np
+import pytest
+
+from mesh_cache import MeshCache
+
+
+def test_coalesce_shares_one_computation(tmp_path):
+    cache = MeshCache(str(tmp_path))
+    calls = []
+
+    def start():
+        calls.append(1)
+        return object()
+
+    first, started = cache.coalesce("key", start)
+    second, started_again = cache.coalesce("key", start)
+    assert started and not started_again
+    assert second is first and len(calls) == 1
+    assert cache.inflight("key") is first
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["inflight"]) == (1, 2, 1)
+
+
+def test_release_lets_the_next_request_start(tmp_path):
+    cache = MeshCache(str(tmp_path))
+    first, _ = cache.coalesce("key", object)
+    cache.release("key")
+    assert cache.inflight("key") is None
+    second, started = cache.coalesce("key", object)
+    assert started and second is not first
+
+
+def test_failed_start_registers_nothing(tmp_path):
+    cache = MeshCache(str(tmp_path))
+
+    def start():
+        raise RuntimeError("queue full")
+
+    with pytest.raises(RuntimeError):
+        cache.coalesce("key", start)
+    assert cache.inflight("key") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = MeshCache(str(tmp_path), max_entries=2)
+    vertices, faces = np.zeros((3, 3), np.float32), np.array([[0, 1, 2]])
+    cache.put("a", vertices, faces)
+    cache.put("b", vertices, faces)
+    assert cache.get("a") is not None
+    cache.put("c", vertices, faces)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.get_many(["a", "b"]) is None
+    # Entries on disk are picked up again by a new instance
+    assert MeshCache(str(tmp_path), max_entries=2).stats()["entries"] == 2
+
+
+def test_instances_sharing_a_directory_see_each_others_entries(tmp_path):
+    # Like two HTTP workers with the same TRIPOSG_CACHE_DIR
+    first, second = MeshCache(str(tmp_path), max_entries=2), MeshCache(str(tmp_path), max_entries=2)
+    vertices, faces = np.zeros((3, 3), np.float32), np.array([[0, 1, 2]])
+    first.put("a", vertices, faces)
+    assert second.get("a") is not None
+    second.put("b", vertices, faces)
+    assert first.get_many(["a", "b"]) is not None
+    assert first.get("a") is not None
+    # b is now the least recently used, across both instances
+    first.put("c", vertices, faces)
+    assert second.get("b") is None and second.get("a") is not None
+    assert first.stats()["entries"] == second.stats()["entries"] == 2
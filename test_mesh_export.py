@@ -0,0 +1,85 @@
+"""
+GLB export: levels of detail, quantization, and the meshopt fallback
+
+    python -m pytest test_mesh_export.py
+"""
+import io
+import json
+import struct
+import sys
+
+import numpy as np
+import pytest
+import trimesh
+
+from mesh_export import export_glb
+
+
+def sphere(subdivisions: int):
+    mesh = trimesh.creation.icosphere(subdivisions=subdivisions)
+    return np.asarray(mesh.vertices, dtype=np.float32), np.asarray(mesh.faces)
+
+
+def gltf_json(glb: bytes) -> dict:
+    length, _ = struct.unpack_from("<II", glb, 12)
+    return json.loads(glb[20:20 + length])
+
+
+def load(glb: bytes) -> trimesh.Scene:
+    return trimesh.load(io.BytesIO(glb), file_type="glb", force="scene")
+
+
+def test_default_scene_renders_only_the_most_detailed_level():
+    levels = [sphere(3), sphere(2), sphere(1)]
+    glb = export_glb(levels, names=["LOD0", "LOD1", "LOD2"], lods=True)
+
+    gltf = gltf_json(glb)
+    assert gltf["scenes"][gltf["scene"]]["nodes"] == [0]
+    assert gltf["nodes"][0]["extensions"]["MSFT_lod"]["ids"] == [1, 2]
+    assert "MSFT_lod" in gltf["extensionsUsed"]
+    assert "MSFT_lod" not in gltf.get("extensionsRequired", [])
+
+    rendered = load(glb).to_geometry()
+    assert len(rendered.faces) == len(levels[0][1])
+
+
+def test_without_lods_every_mesh_is_in_the_scene():
+    meshes = [sphere(1), sphere(1)]
+    glb = export_glb(meshes)
+    assert gltf_json(glb)["scenes"][0]["nodes"] == [0, 1]
+    assert len(load(glb).to_geometry().faces) == 2 * len(meshes[0][1])
+
+
+def test_quantized_glb_round_trips_within_the_grid_step():
+    vertices, faces = sphere(3)
+    vertices = vertices * [2.0, 1.0, 0.5] + [10.0, -3.0, 1.0]
+    glb = export_glb([(vertices, faces)], quantize=True)
+
+    loaded = load(glb).to_geometry()
+    extent = float((vertices.max(axis=0) - vertices.min(axis=0)).max())
+    assert len(loaded.faces) == len(faces)
+    # Loaders may drop unreferenced vertices or reorder them, so compare as point sets
+    error = np.abs(np.sort(loaded.vertices, axis=0) - np.sort(vertices, axis=0)).max()
+    assert error <= extent / 65535 + 1e-5
+    assert np.allclose(np.linalg.norm(loaded.vertex_normals, axis=1), 1.0, atol=0.05)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_mesh_quantization_is_required_only_when_quantizing(quantize):
+    gltf = gltf_json(export_glb([sphere(1)], quantize=quantize))
+    required = gltf.get("extensionsRequired", [])
+    assert ("KHR_mesh_quantization" in required) == quantize
+    assert ("KHR_mesh_quantization" in gltf.get("extensionsUsed", [])) == quantize
+
+
+def test_compress_without_meshoptimizer_writes_a_plain_glb(monkeypatch):
+    # A None entry makes the import fail, whether or not meshoptimizer is installed
+    monkeypatch.setitem(sys.modules, "meshoptimizer", None)
+    vertices, faces = sphere(2)
+    glb = export_glb([(vertices, faces)], compress=True)
+
+    gltf = gltf_json(glb)
+    assert "EXT_meshopt_compression" not in gltf.get("extensionsUsed", [])
+    assert len(gltf["buffers"]) == 1
+    assert glb == export_glb([(vertices, faces)])
+    assert len(load(glb).to_geometry().faces) == len(faces)
@@ -0,0 +1,36 @@
+"""
+The NumPy clean-up and decimation match the previous trimesh/pymeshlab path
+
+    python -m pytest test_mesh_postprocess.py
+"""
+import numpy as np
+import pytest
+
+from benchmark_mesh_postprocess import new_path, previous_path, synthetic_samples
+
+pytest.importorskip("pymeshlab")
+
+
+def near_duplicate_soup() -> tuple:
+    """An unwelded sphere whose shared corners are a tiny jitter apart, like marching cubes seams"""
+    vertices, faces = synthetic_samples(subdivisions=4, soup=True, floaters=0)
+    rng = np.random.default_rng(1)
+    vertices = vertices + rng.uniform(-1e-5, 1e-5, vertices.shape).astype(np.float32)
+    return vertices, faces
+
+
+@pytest.mark.parametrize("n_faces", [-1, 1000])
+def test_counts_match_previous_path(n_faces):
+    vertices, faces = near_duplicate_soup()
+    old_vertices, old_faces = previous_path(vertices, faces, n_faces)
+    new_vertices, new_faces = new_path(vertices, faces, n_faces)
+    assert (len(new_vertices), len(new_faces)) == (len(old_vertices), len(old_faces))
+
+
+def test_decimation_closes_seams():
+    vertices, faces = near_duplicate_soup()
+    new_vertices, new_faces = new_path(vertices, faces, 1000)
+    # A closed sphere: every edge is shared by exactly two faces
+    edges = np.sort(new_faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    assert (counts == 2).all()
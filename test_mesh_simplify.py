@@ -0,0 +1,34 @@
+"""
+Parsing of the ``lods`` query parameter
+
+    python -m pytest test_mesh_simplify.py
+"""
+import pytest
+
+from mesh_simplify import MAX_LODS, parse_lods
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("200000,50000,10000", [200000, 50000, 10000]),
+    ("[200000, 50000]", [200000, 50000]),
+    (" 5000 ", [5000]),
+    ("1000,", [1000]),
+])
+def test_valid(value, expected):
+    assert parse_lods(value) == expected
+
+
+@pytest.mark.parametrize("value, message", [
+    ("", "positive"),
+    ("[]", "positive"),
+    ("1000,abc", "comma-separated"),
+    ("1.5", "comma-separated"),
+    ("1000,0", "positive"),
+    ("-5", "positive"),
+    ("1000,1000", "strictly decreasing"),
+    ("100,1000", "strictly decreasing"),
+    (",".join(str(n) for n in range(MAX_LODS + 1, 0, -1)), "at most"),
+])
+def test_invalid(value, message):
+    with pytest.raises(ValueError, match=message):
+        parse_lods(value)
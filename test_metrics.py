@@ -0,0 +1,58 @@
+"""
+Prometheus rendering of stage summaries, counters and gauges
+
+    python -m pytest test_metrics.py
+"""
+from metrics import Metrics, server_timing
+
+
+def test_stage_summaries_have_quantiles_sum_and_count():
+    metrics = Metrics()
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        metrics.observe("denoise", seconds)
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE triposg_stage_seconds summary" in lines
+    assert 'triposg_stage_seconds{stage="denoise",quantile="0.5"} 0.300000' in lines
+    assert 'triposg_stage_seconds{stage="denoise",quantile="0.99"} 0.400000' in lines
+    assert 'triposg_stage_seconds_sum{stage="denoise"} 1.000000' in lines
+    assert 'triposg_stage_seconds_count{stage="denoise"} 4' in lines
+
+
+def test_counters_and_gauges():
+    metrics = Metrics(prefix="test")
+    metrics.inc("requests_total")
+    metrics.inc("requests_total", 2)
+    metrics.gauge("queue_depth", "Jobs waiting", lambda: 3)
+    metrics.gauge("broken", "Raises when read", lambda: 1 / 0)
+    lines = metrics.render().splitlines()
+
+    assert "# TYPE test_requests_total counter" in lines and "test_requests_total 3" in lines
+    gauge = lines.index("test_queue_depth 3")
+    assert lines[gauge - 2:gauge] == ["# HELP test_queue_depth Jobs waiting", "# TYPE test_queue_depth gauge"]
+    # A gauge that fails to read is left out rather than breaking the page
+    assert not any("broken" in line for line in lines)
+    assert any(line.startswith("test_process_rss_bytes ") for line in lines)
+
+
+def test_reset_stages_keeps_counters():
+    metrics = Metrics()
+    metrics.observe("warmup", 1.5)
+    metrics.inc("offload_loads_total")
+    metrics.reset_stages()
+
+    assert metrics.stage_quantiles() == {}
+    rendered = metrics.render()
+    assert 'stage="warmup"' not in rendered
+    assert "triposg_offload_loads_total 1" in rendered
+
+
+def test_timed_adds_to_request_timings():
+    metrics = Metrics()
+    timings = {"denoise": 1.0}
+    metrics.observe("denoise", 0.5, timings)
+    with metrics.timed("export", timings):
+        pass
+    assert timings["denoise"] == 1.5 and "export" in timings
+    assert set(metrics.stage_quantiles()) == {"denoise", "export"}
+    assert server_timing({"denoise": 1.5}) == "denoise;dur=1500.0"
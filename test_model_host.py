@@ -0,0 +1,48 @@
+"""
+The model host serves stub-model requests from a worker connection
+
+    python -m pytest test_model_host.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from image_preprocess import synthetic_image
+from model_host import ModelHostClient
+
+ROOT = Path(__file__).parent
+
+
+@pytest.fixture
+def client(tmp_path):
+    address = str(tmp_path / "host.sock")
+    env = dict(
+        os.environ,
+        TRIPOSG_MODEL_HOST_AUTHKEY="test",
+        TRIPOSG_CACHE_DIR=str(tmp_path / "cache"),
+        TRIPOSG_ARTIFACT_DIR=str(tmp_path / "artifacts"),
+    )
+    host = subprocess.Popen([sys.executable, str(ROOT / "model_host.py"), "--stub", "--address", address], cwd=ROOT, env=env)
+    client = ModelHostClient(address, authkey=b"test")
+    try:
+        client.connect(timeout=300)
+        yield client
+    finally:
+        client.close()
+        host.kill()
+        host.wait()
+
+
+def test_bad_request_does_not_drop_connection(client):
+    # Seven channels is no image mode PIL knows
+    bad = client.generate(np.zeros((8, 8, 7), dtype=np.uint8), seed=0, num_inference_steps=2, guidance_scale=7.0)
+    with pytest.raises(RuntimeError):
+        bad.result(timeout=60)
+
+    good = client.generate(synthetic_image(), seed=0, num_inference_steps=2, guidance_scale=7.0)
+    vertices, faces = good.result(timeout=300)
+    assert len(vertices) > 0 and len(faces) > 0
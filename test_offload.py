@@ -0,0 +1,83 @@
+"""
+StageOffloader keeps a component's weights resident only while its stage runs
+
+    python -m pytest test_offload.py
+"""
+import copy
+from typing import Dict, List
+
+import pytest
+import torch
+
+from offload import StageOffloader
+
+NAMES = ("image_encoder", "transformer", "vae")
+
+
+def components() -> List:
+    torch.manual_seed(0)
+    return [(name, torch.nn.Linear(32, 32)) for name in NAMES]
+
+
+def run_stages(offloader: StageOffloader, modules: Dict[str, torch.nn.Module], x: torch.Tensor) -> Dict[str, dict]:
+    """Each stage in turn; returns what was resident while each one ran"""
+    seen = {}
+    for name in NAMES:
+        handle = modules[name].register_forward_hook(
+            lambda module, inputs, output, name=name: seen.__setitem__(name, offloader.stats()["components"])
+        )
+        x = modules[name](x.to(offloader.device))
+        handle.remove()
+    return seen
+
+
+def test_only_the_running_stage_is_resident(tmp_path):
+    pairs = components()
+    reference = copy.deepcopy(pairs)
+    offloader = StageOffloader(pairs, "cpu", budget_bytes=0, prefetch=False, directory=str(tmp_path))
+    assert offloader.resident_bytes == 0
+
+    modules = dict(pairs)
+    x = torch.randn(4, 32)
+    seen = run_stages(offloader, modules, x)
+    for name in NAMES:
+        assert {other for other, state in seen[name].items() if state["resident"]} == {name}
+    # Released once the next stage needed the room; the last stays until something else runs
+    assert [name for name, state in offloader.stats()["components"].items() if state["resident"]] == ["vae"]
+    assert offloader.peak_resident_bytes == max(offloader.components, key=lambda c: c.nbytes).nbytes
+
+    # Weights survive the round trip through the mapped file
+    expected = x
+    for _, module in reference:
+        expected = module(expected)
+    actual = x
+    for name in NAMES:
+        actual = modules[name](actual)
+    assert torch.allclose(actual, expected)
+
+
+def test_default_budget_keeps_two_components(tmp_path):
+    offloader = StageOffloader(components(), "cpu", prefetch=False, directory=str(tmp_path))
+    modules = {c.name: c.module for c in offloader.components}
+    run_stages(offloader, modules, torch.randn(4, 32))
+    assert offloader.resident_bytes <= offloader.budget_bytes == 2 * offloader.components[0].nbytes
+    assert offloader.peak_resident_bytes <= offloader.budget_bytes
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs CUDA")
+def test_weights_are_on_the_device_only_inside_their_stage():
+    pairs = components()
+    StageOffloader(pairs, "cuda", budget_bytes=0, prefetch=False)
+    modules = dict(pairs)
+    devices = {}
+    for name in NAMES:
+        handle = modules[name].register_forward_hook(
+            lambda module, inputs, output, name=name: devices.__setitem__(
+                name, {other: modules[other].weight.device.type for other in NAMES}
+            )
+        )
+        modules[name](torch.randn(4, 32, device="cuda"))
+        handle.remove()
+    for name in NAMES:
+        assert devices[name] == {other: "cuda" if other == name else "cpu" for other in NAMES}
+    assert modules["image_encoder"].weight.device.type == "cpu"
@@ -0,0 +1,83 @@
+"""
+Shared memory blocks are freed on every path out of the postprocess pool,
+and its spawned workers don't re-run the main script
+
+    python -m pytest test_postprocess_pool.py
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import trimesh
+
+from postprocess_pool import PostprocessPool, share_array, take_arrays
+
+ROOT = Path(__file__).parent
+SHM_DIR = "/dev/shm"
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason="needs POSIX shared memory")
+
+
+def blocks() -> set:
+    return {name for name in os.listdir(SHM_DIR) if name.startswith("psm_")}
+
+
+def shared(array: np.ndarray):
+    shm, spec = share_array(array)
+    shm.close()
+    return spec
+
+
+def test_a_failed_copy_still_frees_every_block():
+    before = blocks()
+    good = shared(np.arange(4))
+    name, _, dtype = shared(np.arange(4))
+    # Larger than its block, so copying it out fails
+    bad = (name, (1000,), dtype)
+    rest = shared(np.arange(4))
+    with pytest.raises(TypeError):
+        take_arrays([good, bad, rest])
+    assert blocks() == before
+
+
+def test_cancelled_simplify_frees_the_worker_results():
+    sphere = trimesh.creation.icosphere(subdivisions=3)
+    before = blocks()
+    pool = PostprocessPool(workers=1)
+    try:
+        future = pool.simplify(np.asarray(sphere.vertices), np.asarray(sphere.faces), n_faces=100)
+        assert future.cancel()
+    finally:
+        # Waits for the worker, and so for the result to be collected
+        pool.shutdown()
+    assert blocks() == before
+
+
+SCRIPT = '''
+import sys
+sys.path.insert(0, {root!r})
+with open({marker!r}, "a") as f:
+    f.write(__name__ + "\\n")
+
+if __name__ == "__main__":
+    import numpy as np
+    from postprocess_pool import PostprocessPool, spawn_from_worker_module
+
+    spawn_from_worker_module()
+    pool = PostprocessPool(workers=1)
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32)
+    pool.simplify(vertices, np.array([[0, 1, 2]])).result()
+    pool.shutdown()
+'''
+
+
+def test_workers_do_not_re_run_the_main_script(tmp_path):
+    # Like running python generate_3d_model.py
+    marker = tmp_path / "imports.txt"
+    script = tmp_path / "server.py"
+    script.write_text(SCRIPT.format(root=str(ROOT), marker=str(marker)))
+    subprocess.run([sys.executable, str(script)], check=True, timeout=120)
+    assert marker.read_text().split() == ["__main__"]
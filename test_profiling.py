@@ -0,0 +1,103 @@
+"""
+Which requests are profiled, what a profile contains, and how long traces are kept
+
+    python -m pytest test_profiling.py
+"""
+import json
+import os
+import time
+
+import pytest
+import torch
+
+from profiling import ProfileSampler, RequestProfiler, TraceStore
+
+
+def test_explicit_requests_need_permission():
+    with pytest.raises(PermissionError):
+        ProfileSampler(allow_requests=False).should_profile(True)
+    assert ProfileSampler(allow_requests=True).should_profile(True)
+
+
+def test_every_nth_request_is_sampled():
+    sampler = ProfileSampler(every=3)
+    assert [sampler.should_profile(False) for _ in range(6)] == [False, False, True, False, False, True]
+    never = ProfileSampler(every=0)
+    assert not any(never.should_profile(False) for _ in range(10))
+
+
+def busy(seconds: float):
+    deadline = time.perf_counter() + seconds
+    x = torch.ones(64, 64)
+    while time.perf_counter() < deadline:
+        x = (x @ x).clamp(max=1.0)
+
+
+def test_profile_has_valid_speedscope_and_chrome_traces():
+    with RequestProfiler("job", interval=0.001) as profiler:
+        with profiler.stage("denoise"):
+            busy(0.1)
+        with profiler.stage("export"):
+            busy(0.05)
+
+    speedscope = json.loads(profiler.speedscope())
+    frames = speedscope["shared"]["frames"]
+    profile, = speedscope["profiles"]
+    assert profile["type"] == "sampled" and profile["unit"] == "seconds"
+    assert profile["samples"] and len(profile["samples"]) == len(profile["weights"])
+    assert all(0 <= index < len(frames) for sample in profile["samples"] for index in sample)
+    # Every sample is rooted at its stage
+    roots = {frames[sample[0]]["name"] for sample in profile["samples"]}
+    assert roots <= {"denoise", "export"} and "denoise" in roots
+    assert any(frame["name"] == "busy" for frame in frames)
+    assert 0 < profile["endValue"] and sum(profile["weights"]) <= profile["endValue"] + 0.01
+
+    chrome = json.loads(profiler.chrome_trace())
+    names = {event.get("name") for event in chrome["traceEvents"]}
+    assert {"denoise", "export"} <= names
+
+
+class FakeProfiler:
+    def __init__(self, size: int = 10):
+        self.size = size
+
+    def chrome_trace(self) -> bytes:
+        return b"{" + b" " * (self.size - 2) + b"}"
+
+    def speedscope(self) -> bytes:
+        return self.chrome_trace()
+
+
+def save_aged(store: TraceStore, job_id: str, age: float, size: int = 10):
+    store.save(job_id, FakeProfiler(size))
+    for kind in ("chrome", "speedscope"):
+        t = time.time() - age
+        os.utime(store.path(job_id, kind), (t, t))
+
+
+def test_oldest_jobs_are_removed_past_max_jobs(tmp_path):
+    store = TraceStore(str(tmp_path), max_jobs=2)
+    save_aged(store, "first", 30)
+    save_aged(store, "second", 20)
+    store.save("third", FakeProfiler())
+    assert store.path("first", "chrome") is None
+    assert store.path("second", "speedscope") is not None and store.path("third", "chrome") is not None
+    assert store.stats() == {"jobs": 2, "bytes": 40}
+
+
+def test_oldest_jobs_are_removed_past_max_bytes(tmp_path):
+    store = TraceStore(str(tmp_path), max_bytes=50)
+    save_aged(store, "first", 30)
+    save_aged(store, "second", 20)
+    store.save("third", FakeProfiler(16))
+    assert store.path("first", "chrome") is None and store.path("second", "chrome") is None
+    assert store.stats() == {"jobs": 1, "bytes": 32}
+
+
+def test_paths_reject_unknown_kinds_and_unsafe_ids(tmp_path):
+    store = TraceStore(str(tmp_path))
+    store.save("job", FakeProfiler())
+    assert store.path("job", "chrome") is not None
+    assert store.path("job", "pprof") is None
+    assert store.path("../job", "chrome") is None
+    assert store.path("missing", "chrome") is None
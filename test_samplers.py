@@ -0,0 +1,47 @@
+"""
+Guidance is only dropped partway through a run when the pipeline supports it
+
+    python -m pytest test_samplers.py
+"""
+from typing import List
+
+import pytest
+
+from image_preprocess import synthetic_image
+from inference import generate_samples
+from samplers import can_skip_guidance
+from triposg_stub import StubRMBG, StubTripoSGPipeline
+
+
+class NoEmbedsCallbackPipeline(StubTripoSGPipeline):
+    """A pipeline whose step callback can't hand ``image_embeds`` back"""
+
+    _callback_tensor_inputs = ["latents"]
+
+
+def denoiser_batch_sizes(pipe: StubTripoSGPipeline, guidance_cutoff: float, steps: int = 4) -> List[int]:
+    """Rows the denoiser saw at each step: two per image while guidance is on, one after"""
+    sizes: List[int] = []
+    pipe.transformer.register_forward_hook(lambda module, inputs, output: sizes.append(inputs[0].shape[0]))
+    generate_samples(
+        pipe, [synthetic_image()], StubRMBG().eval(), [0], num_inference_steps=steps, guidance_cutoff=guidance_cutoff
+    )
+    return sizes
+
+
+def small(cls):
+    return cls(tokens=16, width=16, step_overhead=0, subdivisions=1, vae_width=16)
+
+
+def test_can_skip_guidance():
+    assert can_skip_guidance(small(StubTripoSGPipeline))
+    assert not can_skip_guidance(small(NoEmbedsCallbackPipeline))
+
+
+@pytest.mark.parametrize("guidance_cutoff, expected", [(1.0, [2, 2, 2, 2]), (0.5, [2, 2, 1, 1])])
+def test_guidance_dropped_after_cutoff(guidance_cutoff, expected):
+    assert denoiser_batch_sizes(small(StubTripoSGPipeline), guidance_cutoff) == expected
+
+
+def test_guidance_kept_when_pipeline_cannot_skip():
+    assert denoiser_batch_sizes(small(NoEmbedsCallbackPipeline), 0.5) == [2, 2, 2, 2]
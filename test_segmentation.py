@@ -0,0 +1,58 @@
+"""
+A segmentation failure fails only the image that caused it
+
+    python -m pytest test_segmentation.py
+"""
+from typing import List
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from segmentation import SegmentationWorker
+
+
+def solid(value: float) -> np.ndarray:
+    return np.full((16, 16, 3), value, dtype=np.float32)
+
+
+class Segmenter:
+    """A centred square matte; an all-black image makes the call raise"""
+
+    def __init__(self):
+        self.calls: List[int] = []
+
+    def __call__(self, rgbs: List[np.ndarray]) -> List[np.ndarray]:
+        self.calls.append(len(rgbs))
+        if any(rgb.max() == 0 for rgb in rgbs):
+            raise RuntimeError("bad image")
+        matte = np.zeros(rgbs[0].shape[:2], dtype=np.float32)
+        matte[4:12, 4:12] = 1.0
+        return [matte for _ in rgbs]
+
+
+@pytest.fixture
+def worker():
+    segmenter = Segmenter()
+    worker = SegmentationWorker(segmenter, max_batch_size=4, max_wait=0.2)
+    worker.segmenter_calls = segmenter.calls
+    worker.start()
+    yield worker
+    worker.stop()
+
+
+def test_a_failed_batch_falls_back_to_one_image_at_a_time(worker):
+    futures = [worker.submit(image) for image in (solid(0.5), solid(0.0), solid(0.8))]
+    assert isinstance(futures[0].result(timeout=10), Image.Image)
+    with pytest.raises(RuntimeError, match="bad image"):
+        futures[1].result(timeout=10)
+    assert isinstance(futures[2].result(timeout=10), Image.Image)
+    assert worker.segmenter_calls == [3, 1, 1, 1]
+
+
+def test_an_unreadable_image_fails_alone(worker):
+    futures = [worker.submit(solid(0.5)), worker.submit(np.full((4, 4, 3), "x"))]
+    assert isinstance(futures[0].result(timeout=10), Image.Image)
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=10)
+    assert worker.segmenter_calls == [1]
@@ -0,0 +1,195 @@
+"""
+The HTTP API end to end, on the stub models: /convert, /jobs, results with
+ETags and byte ranges, the artifact store, and job event streams
+
+    python -m pytest test_server.py
+"""
+import importlib
+import io
+import json
+import sys
+import time
+from typing import List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from image_preprocess import synthetic_image
+from job_queue import Job
+
+STEPS = 4
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("server")
+    settings = {
+        "TRIPOSG_STUB_MODELS": "1",
+        "TRIPOSG_CACHE_DIR": str(root / "cache"),
+        "TRIPOSG_ARTIFACT_DIR": str(root / "artifacts"),
+        "TRIPOSG_PROFILE_DIR": str(root / "profiles"),
+        "TRIPOSG_BULK_DIR": str(root / "bulk"),
+        # One spawned worker: pytest's own __main__ is import-guarded, so spawning is safe here
+        "TRIPOSG_POSTPROCESS_WORKERS": "1",
+        # Polled often, so a stream sees the preview finish before the final job
+        "TRIPOSG_EVENTS_INTERVAL": "0.01",
+    }
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in settings.items():
+            patch.setenv(name, value)
+        # Settings are read at import
+        sys.modules.pop("generate_3d_model", None)
+        module = importlib.import_module("generate_3d_model")
+    yield module
+    sys.modules.pop("generate_3d_model", None)
+
+
+@pytest.fixture(scope="module")
+def client(server):
+    with TestClient(server.app) as client:
+        deadline = time.monotonic() + 120
+        while client.get("/health/ready").status_code != 200:
+            assert client.get("/health/live").status_code == 200, "startup failed"
+            assert time.monotonic() < deadline, "models never became ready"
+            time.sleep(0.1)
+        yield client
+
+
+def upload() -> dict:
+    data = io.BytesIO()
+    synthetic_image(128).save(data, format="PNG")
+    return {"file": ("image.png", data.getvalue(), "image/png")}
+
+
+def finished(client: TestClient, job_id: str) -> dict:
+    deadline = time.monotonic() + 60
+    while True:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        assert time.monotonic() < deadline, f"job stuck in {job['status']}"
+        time.sleep(0.05)
+
+
+def test_convert_returns_a_glb(client):
+    response = client.post("/convert", params={"num_inference_steps": STEPS}, files=upload())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "model/gltf-binary"
+    assert response.content[:4] == b"glTF"
+    assert response.headers["x-job-id"]
+    assert response.headers["etag"]
+
+
+def test_job_result_supports_etags_and_ranges(client):
+    created = client.post("/jobs", params={"num_inference_steps": STEPS, "seed": 1}, files=upload())
+    assert created.status_code == 202
+    job_id = created.json()["job_id"]
+    assert finished(client, job_id)["status"] == "done"
+
+    result = client.get(f"/jobs/{job_id}/result")
+    assert result.status_code == 200 and result.content[:4] == b"glTF"
+    etag, data = result.headers["etag"], result.content
+
+    assert client.get(f"/jobs/{job_id}/result", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/jobs/{job_id}/result", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    partial = client.get(f"/jobs/{job_id}/result", headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == data[:10]
+    assert partial.headers["content-range"] == f"bytes 0-9/{len(data)}"
+
+    suffix = client.get(f"/jobs/{job_id}/result", headers={"Range": "bytes=-4"})
+    assert suffix.status_code == 206 and suffix.content == data[-4:]
+
+    beyond = client.get(f"/jobs/{job_id}/result", headers={"Range": f"bytes={len(data)}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(data)}"
+
+
+def test_exported_result_is_stored_as_an_artifact(client):
+    created = client.post("/jobs", params={"num_inference_steps": STEPS, "seed": 2}, files=upload())
+    job_id = created.json()["job_id"]
+    assert finished(client, job_id)["status"] == "done"
+    data = client.get(f"/jobs/{job_id}/result").content
+
+    info = client.get(f"/artifacts/{job_id}")
+    assert info.status_code == 200
+    assert info.json()["url"] == f"/artifacts/{job_id}/file"
+    listing = client.get("/artifacts", params={"format": "glb"}).json()
+    assert job_id in [item["job_id"] for item in listing["items"]]
+    assert listing["total"] >= 1
+
+    stored = client.get(f"/artifacts/{job_id}/file")
+    assert stored.status_code == 200 and stored.content == data
+    assert stored.headers["etag"] == client.get(f"/jobs/{job_id}/result").headers["etag"]
+
+    assert client.delete(f"/artifacts/{job_id}").status_code == 200
+    assert client.get(f"/artifacts/{job_id}").status_code == 404
+
+
+def test_unknown_jobs_and_artifacts_are_404(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/result").status_code == 404
+    assert client.get("/artifacts/missing").status_code == 404
+
+
+def events(client: TestClient, job_id: str) -> List[Tuple[str, dict]]:
+    received = []
+    with client.stream("GET", f"/jobs/{job_id}/events") as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                received.append((event, json.loads(line[len("data: "):])))
+    return received
+
+
+def test_events_stream_progress_then_preview_then_done(server, client):
+    steps = server.PREVIEW_STEPS + 20
+    created = client.post("/jobs", params={"num_inference_steps": steps, "preview": True, "seed": 3}, files=upload())
+    job = created.json()
+    assert job["preview_job_id"]
+
+    received = events(client, job["job_id"])
+    kinds = [kind for kind, _ in received]
+    assert kinds[0] == "progress" and kinds[-1] == "done"
+    assert kinds.count("preview") == 1
+    preview_at = kinds.index("preview")
+    assert "progress" in kinds[:preview_at]
+
+    preview = received[preview_at][1]
+    assert preview["job_id"] == job["preview_job_id"]
+    assert client.get(preview["result_url"]).status_code == 200
+    phases = {body["phase"] for kind, body in received if kind == "progress"}
+    assert phases == {"preview", "final"}
+    # The final job's denoising is reported against its own step count
+    assert max(body["total_steps"] for kind, body in received if kind == "progress" and body["phase"] == "final") == steps
+    assert received[-1][1]["result_url"] == f"/jobs/{job['job_id']}/result"
+
+
+class FakeQueue:
+    def __init__(self, job: Job):
+        self.job = job
+        self.cancelled: List[str] = []
+
+    def get(self, job_id: str):
+        return self.job if job_id == self.job.id else None
+
+    def cancel(self, job_id: str):
+        self.cancelled.append(job_id)
+
+
+def test_a_shared_job_is_cancelled_only_when_its_last_submitter_leaves(server, monkeypatch):
+    job = Job({}, None)
+    # Two identical /jobs requests coalesced onto one job
+    job.waiters = 2
+    queue = FakeQueue(job)
+    monkeypatch.setattr(server, "job_queue", queue)
+
+    assert server.release_job(job.id) is job
+    assert queue.cancelled == [] and job.waiters == 1
+    assert server.release_job(job.id) is job
+    assert queue.cancelled == [job.id] and job.waiters == 0
+    assert server.release_job("missing") is None
@@ -2,6 +2,7 @@
 """
 Direct TripoSR test - bypasses the server to test the model pipeline directly
 """
+import argparse
 import os
 import sys
 import time
@@ -12,13 +13,18 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "TripoSR"))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "TripoSR", "tsr"))
 
 def main():
+    parser = argparse.ArgumentParser(description="Run TripoSR on one test image")
+    parser.add_argument("--chunk-size", type=int, default=0, help="Renderer chunk size (0: from free memory)")
+    parser.add_argument("--mc-resolution", type=int, default=256, help="Marching cubes grid resolution")
+    args = parser.parse_args()
+    
     try:
         print("🔄 Importing dependencies...")
         import torch
-        import numpy as np
         from PIL import Image
-        import rembg
         from tsr.system import TSR
+        from segmentation import rembg_pool, remove_background
+        from triposr_mesh import configure_chunk_size, extract_mesh
         
         print(f"✅ PyTorch: {torch.__version__}")
         print(f"✅ CUDA available: {torch.cuda.is_available()}")
@@ -48,19 +54,8 @@ def main():
         print("🔄 Loading and preprocessing image...")
         original_image = Image.open(test_image)
         
-        # Background removal
-        rembg_session = rembg.new_session()
-        image = rembg.remove(original_image, rembg_session)
-        
-        # Ensure RGBA
-        if image.mode == "RGB":
-            image = image.convert("RGBA")
-        
-        # Resize and composite (simplified version)
-        if image.mode == "RGBA":
-            image_np = np.array(image).astype(np.float32) / 255.0
-            image = image_np[:, :, :3] * image_np[:, :, 3:4] + (1 - image_np[:, :, 3:4]) * 0.5
-            image = Image.fromarray((image * 255.0).astype(np.uint8))
+        # Background removal, composited onto grey
+        image = remove_background(original_image, rembg_pool())
         
         print("✅ Image preprocessed")
         
@@ -68,7 +63,6 @@ def main():
         print("🔄 Loading TripoSR model...")
         t0 = time.time()
         model = TSR.from_pretrained("stabilityai/TripoSR", config_name="config.yaml", weight_name="model.ckpt")
-        model.renderer.set_chunk_size(8192)
         
         # Device selection
         if torch.cuda.is_available():
@@ -79,8 +73,9 @@ def main():
             device = "cpu"
             
         model.to(device)
+        chunk_size = configure_chunk_size(model, args.chunk_size)
         dt_load = time.time() - t0
-        print(f"✅ Model loaded on {device} in {dt_load:.1f}s")
+        print(f"✅ Model loaded on {device} in {dt_load:.1f}s (chunk size {chunk_size})")
         
         # Run inference
         print("🔄 Running TripoSR inference...")
@@ -94,48 +89,23 @@ def main():
         print("🔄 Extracting and exporting mesh...")
         t0 = time.time()
         
-        # For MPS compatibility, move entire model to CPU for mesh extraction
-        original_device = device
-        if device != 'cpu':
-            print("🔄 Moving model to CPU for mesh extraction...")
-            model.to('cpu')
-            if hasattr(scene_codes, 'to'):
-                scene_codes = scene_codes.to('cpu')
-            elif isinstance(scene_codes, (list, tuple)):
-                scene_codes = [sc.to('cpu') if hasattr(sc, 'to') else sc for sc in scene_codes]
-        
-        try:
-            meshes = model.extract_mesh(scene_codes, has_vertex_color=True)
-            
-            # Save OBJ file
-            output_dir = root / "output"
-            output_dir.mkdir(exist_ok=True)
-            obj_path = output_dir / "test_mesh.obj"
-            meshes[0].export(str(obj_path))
-            
-            dt_export = time.time() - t0
-            print(f"✅ Mesh exported in {dt_export:.1f}s")
-            
-            # File info
-            size_mb = obj_path.stat().st_size / (1024 * 1024)
-            print(f"📁 OBJ file saved: {obj_path.absolute()}")
-            print(f"📊 File size: {size_mb:.2f} MB")
-            
-            # Try to get mesh stats
-            try:
-                with open(obj_path, 'r') as f:
-                    lines = f.readlines()
-                vertices = len([l for l in lines if l.startswith('v ')])
-                faces = len([l for l in lines if l.startswith('f ')])
-                print(f"📊 Vertices: {vertices:,}, Faces: {faces:,}")
-            except:
-                pass
-                
-        finally:
-            # Restore original device
-            if original_device != 'cpu':
-                print(f"🔄 Restoring model to {original_device}...")
-                model.to(original_device)
+        # Density and colors are queried where the model lives; only the density grid is moved when needed
+        meshes = extract_mesh(model, scene_codes, has_vertex_color=True, resolution=args.mc_resolution)
+        
+        # Save OBJ file
+        output_dir = root / "output"
+        output_dir.mkdir(exist_ok=True)
+        obj_path = output_dir / "test_mesh.obj"
+        meshes[0].export(str(obj_path))
+        
+        dt_export = time.time() - t0
+        print(f"✅ Mesh exported in {dt_export:.1f}s")
+        
+        # File info
+        size_mb = obj_path.stat().st_size / (1024 * 1024)
+        print(f"📁 OBJ file saved: {obj_path.absolute()}")
+        print(f"📊 File size: {size_mb:.2f} MB")
+        print(f"📊 Vertices: {len(meshes[0].vertices):,}, Faces: {len(meshes[0].faces):,}")
         
         total_time = dt_load + dt_inference + dt_export
         print(f"🎉 Total time: {total_time:.1f}s (load: {dt_load:.1f}s, inference: {dt_inference:.1f}s, export: {dt_export:.1f}s)")
@@ -0,0 +1,113 @@
+"""
+TripoSR chunk sizing and mesh extraction against a stand-in model, so no
+TripoSR checkout or weights are needed
+
+    python -m pytest test_triposr_mesh.py
+"""
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pytest
+import torch
+
+import triposr_mesh
+from triposr_mesh import BYTES_PER_POINT, CHUNK_MEMORY_FRACTION, auto_chunk_size, configure_chunk_size, extract_mesh
+
+RADIUS = 0.5
+
+
+class Renderer:
+    def __init__(self):
+        self.cfg = SimpleNamespace(radius=RADIUS)
+        self.chunk_size = None
+        self.query_devices: List[torch.device] = []
+
+    def set_chunk_size(self, chunk_size: int):
+        self.chunk_size = chunk_size
+
+    def query_triplane(self, decoder, positions: torch.Tensor, scene_code: torch.Tensor):
+        self.query_devices.append(positions.device)
+        out = decoder(positions) + scene_code.mean()
+        return {"density_act": out[:, 0], "color": torch.sigmoid(out[:, :3])}
+
+
+class IsosurfaceHelper:
+    """One triangle where the level crosses zero, in grid coordinates [0, 1]"""
+
+    points_range = (0.0, 1.0)
+
+    def __init__(self, resolution: int = 4):
+        axis = torch.linspace(0, 1, resolution)
+        self.grid_vertices = torch.stack(torch.meshgrid(axis, axis, axis, indexing="ij"), dim=-1).reshape(-1, 3)
+        self.levels: List[torch.Tensor] = []
+
+    def __call__(self, level: torch.Tensor):
+        self.levels.append(level)
+        v_pos = torch.tensor([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 1.0, 1.0]], device=level.device)
+        return v_pos, torch.tensor([[0, 1, 2]], device=level.device)
+
+
+class Model(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.decoder = torch.nn.Linear(3, 4)
+        self.renderer = Renderer()
+        self.isosurface_helper = IsosurfaceHelper()
+        self.resolution = None
+
+    def set_marching_cubes_resolution(self, resolution: int):
+        self.resolution = resolution
+
+
+@pytest.mark.parametrize("free, expected", [
+    (0, 4096),
+    (4096 * BYTES_PER_POINT / CHUNK_MEMORY_FRACTION * 5, 16384),
+    (1 << 60, 1 << 20),
+])
+def test_chunk_size_is_the_largest_power_of_two_that_fits(monkeypatch, free, expected):
+    monkeypatch.setattr(triposr_mesh, "available_memory", lambda device: free)
+    assert auto_chunk_size(torch.device("cpu")) == expected
+
+
+def test_configure_chunk_size(monkeypatch):
+    monkeypatch.setattr(triposr_mesh, "available_memory", lambda device: 0)
+    model = Model()
+    assert configure_chunk_size(model) == model.renderer.chunk_size == 4096
+    assert configure_chunk_size(model, 1234) == model.renderer.chunk_size == 1234
+
+
+def test_extract_mesh_queries_on_the_model_device_without_moving_it(monkeypatch):
+    model = Model()
+    weight = model.decoder.weight
+    moves = []
+    monkeypatch.setattr(model, "to", lambda *args, **kwargs: moves.append(args))
+    monkeypatch.setattr(model, "cpu", lambda: moves.append("cpu"))
+
+    meshes = extract_mesh(model, torch.zeros(2, 8), resolution=4)
+    assert moves == [] and model.decoder.weight is weight
+    assert model.resolution == 4
+    assert len(meshes) == 2
+    # Density for every grid point, then colors for every vertex, once per scene
+    assert model.renderer.query_devices == [torch.device("cpu")] * 4
+
+    mesh = meshes[0]
+    # Grid coordinates are mapped onto the renderer's [-radius, radius] cube
+    assert np.allclose(mesh.vertices, [[-RADIUS, -RADIUS, -RADIUS], [RADIUS, -RADIUS, -RADIUS], [-RADIUS, RADIUS, RADIUS]])
+    assert mesh.faces.tolist() == [[0, 1, 2]]
+    assert mesh.visual.vertex_colors.shape == (3, 4)
+
+
+def test_density_grid_leaves_the_device_only_without_marching_cubes(monkeypatch):
+    model = Model()
+    extract_mesh(model, torch.zeros(1, 8), has_vertex_color=False, resolution=4)
+    level = model.isosurface_helper.levels[-1]
+
+    moved = []
+    original_cpu = torch.Tensor.cpu
+    monkeypatch.setattr(torch.Tensor, "cpu", lambda self: moved.append(self.shape) or original_cpu(self))
+    monkeypatch.setattr(triposr_mesh, "_marching_cubes_on", lambda device: False)
+    extract_mesh(model, torch.zeros(1, 8), has_vertex_color=False, resolution=4)
+    # The grid of densities (not the weights) is what gets copied
+    assert moved[0] == level.shape
+    assert model.renderer.query_devices == [torch.device("cpu")] * 2
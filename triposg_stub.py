@@ -0,0 +1,175 @@
+"""
+Stand-in for TripoSGPipeline and BriaRMBG so benchmarks run on CPU without weights
+"""
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional
+
+import numpy as np
+import torch
+import trimesh
+from PIL import Image
+
+
+class StubOutput:
+    def __init__(self, samples: List[Any]):
+        self.samples = samples
+
+
+class StubTripoSGPipeline:
+    """Mimics the TripoSGPipeline call signature with a small real workload.
+
+    Each denoising step runs an MLP over ``tokens x width`` latents for every
+    sample (doubled for classifier-free guidance) plus a fixed per-step
+    overhead, so batching behaves like it does on an accelerator: the fixed
+    cost is shared and the matmuls get wider. Images are encoded once per
+    call by a small patch-embedding encoder, like the real pipeline's DINOv2
+    ``encode_image``. Steps go through a rectified-flow Euler ``scheduler``,
+    and guidance can be switched off mid-run from the step callback, as in
+    diffusers pipelines. The output sphere is displaced by the final latents
+    as decoded by a small ``vae``, so numeric changes to the denoiser (bf16,
+    int8, samplers) show up in the mesh.
+    """
+
+    _callback_tensor_inputs = ["latents", "image_embeds"]
+
+    def __init__(
+        self, tokens: int = 1024, width: int = 512, step_overhead: float = 0.002, subdivisions: int = 5, vae_width: int = 256
+    ):
+        self.device = torch.device("cpu")
+        self.dtype = torch.float32
+        self.tokens = tokens
+        self.width = width
+        self.step_overhead = step_overhead
+        weights = torch.Generator().manual_seed(0)
+        # The denoiser, named like the real pipeline's component
+        self.transformer = torch.nn.Sequential(
+            torch.nn.Linear(64, width, bias=False), torch.nn.GELU(), torch.nn.Linear(width, 64, bias=False)
+        ).eval()
+        with torch.no_grad():
+            self.transformer[0].weight.copy_(torch.randn(width, 64, generator=weights) / 8)
+            self.transformer[2].weight.copy_(torch.randn(64, width, generator=weights) / width ** 0.5)
+        self.image_encoder = torch.nn.Sequential(
+            torch.nn.Conv2d(3, 256, kernel_size=14, stride=14), torch.nn.Flatten(2),
+        ).eval()
+        self.image_projection = torch.nn.Sequential(
+            torch.nn.Linear(256, 256), torch.nn.GELU(), torch.nn.Linear(256, 64)
+        ).eval()
+        self.vae = StubVAE(vae_width)
+        self.scheduler = StubFlowScheduler()
+        self._guidance_scale = 7.0
+        sphere = trimesh.creation.icosphere(subdivisions=subdivisions)
+        self.vertices = np.asarray(sphere.vertices, dtype=np.float64)
+        self.faces = np.asarray(sphere.faces, dtype=np.int64)
+
+    def to(self, *args, **kwargs):
+        return self
+
+    @property
+    def do_classifier_free_guidance(self) -> bool:
+        return self._guidance_scale > 1
+
+    @torch.no_grad()
+    def encode_image(self, image: Any, device: Any, num_images_per_prompt: int):
+        images = image if isinstance(image, list) else [image]
+        pixels = [Image.fromarray(np.asarray(im)).convert("RGB").resize((518, 518)) for im in images]
+        pixels = torch.from_numpy(np.stack([np.array(im) for im in pixels])).permute(0, 3, 1, 2).float() / 255
+        image_embeds = self.image_projection(self.image_encoder(pixels).transpose(1, 2))
+        image_embeds = image_embeds.repeat_interleave(num_images_per_prompt, dim=0)
+        return image_embeds, torch.zeros_like(image_embeds)
+
+    @torch.no_grad()
+    def __call__(
+        self,
+        image: Any,
+        generator: Optional[Any] = None,
+        num_inference_steps: int = 50,
+        guidance_scale: float = 7.0,
+        callback_on_step_end: Optional[Any] = None,
+        callback_on_step_end_tensor_inputs: Optional[List[str]] = None,
+        **kwargs,
+    ) -> StubOutput:
+        callback_on_step_end_tensor_inputs = callback_on_step_end_tensor_inputs or ["latents"]
+        images = image if isinstance(image, list) else [image]
+        generators = generator if isinstance(generator, list) else [generator] * len(images)
+        latents = torch.stack([
+            torch.randn(self.tokens, 64, generator=g) for g in generators
+        ])
+        self._guidance_scale = guidance_scale
+        image_embeds, negative_image_embeds = self.encode_image(images, self.device, 1)
+        if self.do_classifier_free_guidance:
+            image_embeds = torch.cat([negative_image_embeds, image_embeds])
+        self.scheduler.set_timesteps(num_inference_steps, device=self.device)
+
+        for i, t in enumerate(self.scheduler.timesteps):
+            time.sleep(self.step_overhead)
+            model_input = torch.cat([latents] * 2) if self.do_classifier_free_guidance else latents
+            noise_pred = self.transformer(model_input + image_embeds.mean(dim=1, keepdim=True)).float()
+            if self.do_classifier_free_guidance:
+                noise_uncond, noise_cond = noise_pred.chunk(2)
+                noise_pred = noise_uncond + self._guidance_scale * (noise_cond - noise_uncond)
+            latents = self.scheduler.step(noise_pred, t, latents, return_dict=False)[0]
+
+            if callback_on_step_end is not None:
+                step_locals = locals()
+                callback_kwargs = {k: step_locals[k] for k in callback_on_step_end_tensor_inputs}
+                callback_outputs = callback_on_step_end(self, i, t, callback_kwargs)
+                latents = callback_outputs.pop("latents", latents)
+                image_embeds = callback_outputs.pop("image_embeds", image_embeds)
+
+        # Displace each vertex radially by its token's decoded value
+        token = np.arange(len(self.vertices)) % self.tokens
+        samples = []
+        for sample_latents in self.vae.decode(latents).float().numpy():
+            radius = 1 + 0.05 * np.tanh(sample_latents[token, 0])
+            samples.append((self.vertices * radius[:, None], self.faces.copy()))
+        return StubOutput(samples)
+
+
+class StubFlowScheduler:
+    """Rectified-flow Euler steps from noise level 1 to 0, like TripoSG's scheduler without a shift"""
+
+    def __init__(self, num_train_timesteps: int = 1000):
+        self.config = SimpleNamespace(num_train_timesteps=num_train_timesteps)
+        self.order = 1
+
+    def set_timesteps(self, num_inference_steps: int, device: Any = None, **kwargs):
+        self.sigmas = torch.linspace(1, 0, num_inference_steps + 1, device=device)
+        self.timesteps = self.sigmas[:-1] * self.config.num_train_timesteps
+        self._index = 0
+
+    def step(self, model_output: torch.Tensor, timestep: Any, sample: torch.Tensor, return_dict: bool = True, **kwargs):
+        sigma, sigma_next = self.sigmas[self._index], self.sigmas[self._index + 1]
+        self._index += 1
+        prev_sample = sample + (sigma_next - sigma) * model_output
+        return SimpleNamespace(prev_sample=prev_sample) if return_dict else (prev_sample,)
+
+
+class StubVAE(torch.nn.Module):
+    """Decodes each latent token to one value, standing in for the real VAE's ``decode`` stage"""
+
+    def __init__(self, width: int = 256):
+        super().__init__()
+        weights = torch.Generator().manual_seed(1)
+        self.decoder = torch.nn.Sequential(
+            torch.nn.Linear(64, width, bias=False), torch.nn.GELU(), torch.nn.Linear(width, 1, bias=False)
+        ).eval()
+        with torch.no_grad():
+            self.decoder[0].weight.copy_(torch.randn(width, 64, generator=weights) / 8)
+            self.decoder[2].weight.copy_(torch.randn(1, width, generator=weights) / width ** 0.5)
+
+    def decode(self, latents: torch.Tensor) -> torch.Tensor:
+        return self.decoder(latents)
+
+
+class StubRMBG(torch.nn.Module):
+    """Returns a centred elliptical foreground mask in the BriaRMBG output layout"""
+
+    def forward(self, x: torch.Tensor):
+        h, w = x.shape[-2:]
+        ys = torch.linspace(-1, 1, h).view(h, 1)
+        xs = torch.linspace(-1, 1, w).view(1, w)
+        mask = ((xs / 0.6) ** 2 + (ys / 0.8) ** 2 <= 1).float()
+        mask = mask.expand(x.shape[0], 1, h, w)
+        # BriaRMBG returns (side outputs, decoder features); keep it traceable
+        return [mask], [mask]
@@ -0,0 +1,116 @@
+"""
+TripoSR mesh extraction that keeps the model where it is.
+
+``TSR.extract_mesh`` needs torchmcubes to run on the model's device, which
+fails on MPS, so callers used to move the whole model to the CPU and back for
+every image. Here the density grid and vertex colors are queried on the
+model's device. Only the density grid goes to the CPU, and only when
+marching cubes can't run on the device. The model itself never moves, so
+concurrent requests can keep using it.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import trimesh
+
+# Rough peak activation memory per queried point in the triplane decoder
+BYTES_PER_POINT = 4096
+
+# Fraction of free memory that one chunk of points may use
+CHUNK_MEMORY_FRACTION = 0.25
+
+# Cached grid vertices per (resolution, device)
+_grids: Dict[Tuple[int, str], torch.Tensor] = {}
+
+
+def available_memory(device: torch.device) -> int:
+    """Free memory in bytes on ``device``"""
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+    if device.type == "mps" and hasattr(torch.mps, "recommended_max_memory"):
+        return int(torch.mps.recommended_max_memory() - torch.mps.driver_allocated_memory())
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def auto_chunk_size(device: torch.device, minimum: int = 4096, maximum: int = 1 << 20) -> int:
+    """The largest power-of-two chunk of points whose decoder activations fit the memory budget"""
+    budget = available_memory(device) * CHUNK_MEMORY_FRACTION / BYTES_PER_POINT
+    size = minimum
+    while size * 2 <= min(budget, maximum):
+        size *= 2
+    return size
+
+
+def configure_chunk_size(model: Any, chunk_size: Optional[int] = None) -> int:
+    """Set the renderer's chunk size; ``None`` or ``0`` picks one from available memory"""
+    if not chunk_size:
+        chunk_size = auto_chunk_size(model_device(model))
+    model.renderer.set_chunk_size(chunk_size)
+    return chunk_size
+
+
+def model_device(model: Any) -> torch.device:
+    return next(model.parameters()).device
+
+
+def scale_tensor(data: torch.Tensor, from_range: Tuple[float, float], to_range: Tuple[float, float]) -> torch.Tensor:
+    """Map ``data`` linearly from ``from_range`` to ``to_range``, as ``tsr.utils.scale_tensor`` does"""
+    data = (data - from_range[0]) / (from_range[1] - from_range[0])
+    return data * (to_range[1] - to_range[0]) + to_range[0]
+
+
+def _grid_vertices(model: Any, resolution: int, device: torch.device) -> torch.Tensor:
+    key = (resolution, str(device))
+    if key not in _grids:
+        radius = model.renderer.cfg.radius
+        helper = model.isosurface_helper
+        _grids[key] = scale_tensor(
+            helper.grid_vertices.to(device), helper.points_range, (-radius, radius)
+        )
+    return _grids[key]
+
+
+def _marching_cubes_on(device: torch.device) -> bool:
+    """torchmcubes has CPU and CUDA kernels, nothing else"""
+    return device.type in ("cpu", "cuda")
+
+
+@torch.no_grad()
+def extract_mesh(
+    model: Any,
+    scene_codes: torch.Tensor,
+    has_vertex_color: bool = True,
+    resolution: int = 256,
+    threshold: float = 25.0,
+) -> List[trimesh.Trimesh]:
+    """Same result as ``TSR.extract_mesh``, without moving the model off its device"""
+    device = scene_codes.device
+    model.set_marching_cubes_resolution(resolution)
+    helper = model.isosurface_helper
+    radius = model.renderer.cfg.radius
+    grid = _grid_vertices(model, resolution, device)
+
+    meshes = []
+    for scene_code in scene_codes:
+        density = model.renderer.query_triplane(model.decoder, grid, scene_code)["density_act"]
+        level = -(density - threshold)
+        if not _marching_cubes_on(device):
+            # Only the density grid crosses the bus, not the weights
+            level = level.cpu()
+        v_pos, t_pos_idx = helper(level)
+        v_pos = scale_tensor(v_pos, helper.points_range, (-radius, radius))
+
+        colors = None
+        if has_vertex_color:
+            colors = model.renderer.query_triplane(model.decoder, v_pos.to(device), scene_code)["color"]
+            colors = colors.cpu().numpy()
+        meshes.append(trimesh.Trimesh(
+            vertices=v_pos.cpu().numpy(), faces=t_pos_idx.cpu().numpy(), vertex_colors=colors
+        ))
+    return meshes